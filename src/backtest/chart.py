@@ -0,0 +1,212 @@
+"""
+График бэктеста без браузера: статичный HTML/PNG для больших прогонов.
+
+Свечи и индикаторы прореживаются на сервере (OHLC бакетами, линии - LTTB),
+линии и маркеры сделок рисуются WebGL трейсами, сделки - три scatter трейса
+вместо аннотации на каждую сделку.
+"""
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from backtest.metrics import candles_to_array, trades_to_array
+
+MAX_BARS = 2000  # столько свечей браузер рисует без тормозов
+
+
+def decimate_ohlc(candles, max_bars=MAX_BARS):
+    """
+    Склеивает соседние свечи в бакеты: open первой, close последней,
+    high/low - экстремумы бакета, поэтому min/max не теряются
+    """
+    n = len(candles)
+    if n <= max_bars:
+        return candles
+
+    step = -(-n // max_bars)
+    starts = np.arange(0, n, step)
+    ends = np.minimum(starts + step, n) - 1
+
+    result = np.empty(len(starts), dtype=candles.dtype)
+    result['ts'] = candles['ts'][starts]
+    result['open'] = candles['open'][starts]
+    result['close'] = candles['close'][ends]
+    result['high'] = np.maximum.reduceat(candles['high'], starts)
+    result['low'] = np.minimum.reduceat(candles['low'], starts)
+    return result
+
+
+def lttb(x, y, threshold=MAX_BARS):
+    """
+    Largest-Triangle-Three-Buckets: из каждого бакета берем точку, образующую
+    наибольший треугольник с выбранной точкой предыдущего бакета и средним следующего.
+    NaN (разгон индикатора) выкидываются
+    """
+    finite = np.isfinite(y)
+    x = np.asarray(x, dtype=float)[finite]
+    y = np.asarray(y, dtype=float)[finite]
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # границы бакетов без первой и последней точки
+    bounds = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_end = bounds[i + 2] if i + 2 < len(bounds) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
+
+
+def _dates(ts):
+    return (np.asarray(ts, dtype=float) * 1000).astype('datetime64[ms]')
+
+
+def _deal_traces(trades):
+    """
+    Входы, выходы и уровни sl/tp сделок одним трейсом каждый
+    """
+    array = trades_to_array(trades)
+    long = array['side'] > 0
+    profitable = array['profit'] >= 0
+
+    entries = go.Scattergl(
+        x=_dates(array['entry_ts']),
+        y=array['entry_price'],
+        mode='markers',
+        name='entries',
+        marker=dict(
+            symbol=np.where(long, 'triangle-up', 'triangle-down'),
+            color=np.where(long, 'blue', 'orange'),
+            size=10,
+        ),
+        hovertext=['%s %s @ %s' % (t['side'], t['amount'], t['entry_price']) for t in trades],
+        hoverinfo='text+x',
+    )
+    exits = go.Scattergl(
+        x=_dates(array['exit_ts']),
+        y=array['exit_price'],
+        mode='markers',
+        name='exits',
+        marker=dict(symbol='x', color=np.where(profitable, 'green', 'red'), size=9),
+        hovertext=['%+.2f' % t for t in array['profit']],
+        hoverinfo='text+x',
+    )
+
+    levels = [t for t in trades if t.get('stop_loss') is not None]
+    if not levels:
+        return [entries, exits]
+
+    level_x = _dates([t['entry_ts'] for t in levels])
+    sl_tp = go.Scattergl(
+        x=np.r_[level_x, level_x],
+        y=np.r_[
+            [float(t['stop_loss']) for t in levels],
+            [float(t['take_profit']) for t in levels],
+        ],
+        mode='markers',
+        name='sl/tp',
+        marker=dict(
+            symbol='line-ew-open',
+            color=['red'] * len(levels) + ['green'] * len(levels),
+            size=12,
+        ),
+        hovertext=['sl %s' % t['stop_loss'] for t in levels] + ['tp %s' % t['take_profit'] for t in levels],
+        hoverinfo='text+x',
+    )
+    return [entries, exits, sl_tp]
+
+
+def build_figure(historical_data, trades=None, max_bars=MAX_BARS):
+    """
+    То же, что HistoricalData.get_plotly_figure, но по numpy массивам:
+    индикаторы (из общего кеша) по всем свечам, на график идет прореженная версия
+    """
+    candles = candles_to_array(historical_data.ohlc_data)
+    bars = decimate_ohlc(candles, max_bars)
+
+    fig = make_subplots(
+        rows=2,
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.2,
+        row_heights=[1000, 250],
+    )
+
+    fig.add_trace(
+        go.Candlestick(x=_dates(bars['ts']),
+                       open=bars['open'],
+                       high=bars['high'],
+                       low=bars['low'],
+                       close=bars['close'],
+                       name="candles"),
+        row=1, col=1
+    )
+
+    for sma_options in historical_data.sma:
+        x, y = lttb(candles['ts'], historical_data.get_sma(sma_options['len']), max_bars)
+        fig.add_trace(go.Scattergl(
+            x=_dates(x),
+            y=y,
+            name="SMA",
+            line=dict(color=sma_options['color'], width=sma_options['width']),
+            legendgroup="sma",
+        ), row=1, col=1)
+
+    if historical_data.rsi:
+        rsi = historical_data.rsi
+        x, y = lttb(candles['ts'], historical_data.get_rsi(length=rsi['len']), max_bars)
+        fig.add_trace(go.Scattergl(
+            x=_dates(x),
+            y=y,
+            name="RSI",
+            line=dict(color=rsi['color'], width=rsi['width']),
+            legendgroup="rsi",
+        ), row=2, col=1)
+        fig.add_hrect(y0=rsi['limits'][0], y1=rsi['limits'][1],
+                      fillcolor=rsi['color'],
+                      opacity=0.2,
+                      line_width=0, row=2, col=1)
+
+    if historical_data.day_ema:
+        fig.add_trace(go.Scattergl(
+            x=list(historical_data.day_ohlc_data.keys()),
+            y=historical_data.get_daily_ema(),
+            name="EMA",
+            line=dict(color='lightblue', width=2),
+            legendgroup="EMA",
+        ), row=1, col=1)
+
+    if trades:
+        for trace in _deal_traces(trades):
+            fig.add_trace(trace, row=1, col=1)
+
+    # rangeslider дублирует все свечи еще раз
+    fig.update_layout(xaxis_rangeslider_visible=False)
+    return fig
+
+
+def export_chart(path, historical_data, trades=None, max_bars=MAX_BARS):
+    """
+    Пишет график в файл, дисплей не нужен.
+    .html - самодостаточный файл, .png/.svg/.pdf - через kaleido (pip install kaleido)
+    """
+    fig = build_figure(historical_data, trades, max_bars)
+    if path.endswith('.html'):
+        fig.write_html(path, include_plotlyjs=True)
+    else:
+        fig.write_image(path, width=1920, height=1080)
+    return path
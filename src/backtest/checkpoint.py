@@ -0,0 +1,148 @@
+"""
+Чекпоинты бэктеста по свечам: CandleBacktest целиком (бот, открытая сделка, сделки) сохраняется
+каждые every свечей и в конце прогона, ключ - (hash свечей до этой точки, hash конфига бота).
+
+    backtest = await run_cached(config, candles)
+
+Тот же конфиг по тем же свечам - готовый результат без пересчета, новые свечи в конце истории -
+досчитываются от последнего чекпоинта. Hash свечей цепочкой по блокам из every свечей,
+поэтому чекпоинт подходит, только если совпадают все свечи до него.
+
+Код бота в ключ не входит: после правки бота чекпоинты надо удалить (cache_dir/checkpoints).
+Бот, который не сериализуется pickle (MultiBot с потоками, money manager с api),
+считается как обычно, без чекпоинтов.
+"""
+import hashlib
+import logging
+import os
+import pickle
+
+import numpy as np
+
+from backtest.engine import CandleBacktest
+
+
+def candle_values(candles) -> np.ndarray:
+    """
+    (timestamp, open, high, low, close) свечей float64 массивом - то, что входит в hash
+    """
+    return np.array([(c.timestamp, c.open, c.high, c.low, c.close) for c in candles], dtype=float).reshape(-1, 5)
+
+
+def candles_hash(candles):
+    return hashlib.sha1(candle_values(candles).tobytes()).hexdigest()
+
+
+class CandleHashes:
+    """
+    hash первых i свечей для любого i за O(every): цепочка по целым блокам плюс хвост
+    """
+
+    def __init__(self, candles, every):
+        self.every = every
+        self.data = candle_values(candles)
+        self.chain = ['']
+        for start in range(0, len(self.data) - every + 1, every):
+            self.chain.append(self._digest(self.chain[-1], start, start + every))
+
+    def _digest(self, previous, start, end):
+        return hashlib.sha1(previous.encode() + self.data[start:end].tobytes()).hexdigest()
+
+    def prefix(self, i):
+        block, tail = divmod(i, self.every)
+        if not tail:
+            return self.chain[block]
+        return self._digest(self.chain[block], block * self.every, i)
+
+
+class CheckpointStore:
+    """
+    cache_dir/checkpoints/<конфиг и первая свеча>/<номер свечи>_<hash свечей>.pkl,
+    хранятся keep последних чекпоинтов
+    """
+
+    def __init__(self, cache_dir='backtest_cache', every=1000, keep=5):
+        self.cache_dir = cache_dir
+        self.every = every
+        self.keep = keep
+
+    def get_dir(self, config, trade_from_ts, hashes):
+        key = hashlib.sha1(('%s:%s:%s' % (config.get_hash(), trade_from_ts, hashes.prefix(1))).encode())
+        return os.path.join(self.cache_dir, 'checkpoints', key.hexdigest())
+
+    @staticmethod
+    def _list(path):
+        """
+        [(номер свечи, hash, файл)] от последнего чекпоинта к первому
+        """
+        if not os.path.isdir(path):
+            return []
+        items = []
+        for name in os.listdir(path):
+            index, _, digest = name[:-len('.pkl')].partition('_')
+            if name.endswith('.pkl') and index.isdigit():
+                items.append((int(index), digest, os.path.join(path, name)))
+        return sorted(items, reverse=True)
+
+    def load(self, path, hashes, candles_count):
+        """
+        (номер свечи, CandleBacktest) последнего подходящего чекпоинта или (0, None)
+        """
+        for index, digest, filename in self._list(path):
+            if index > candles_count or hashes.prefix(index) != digest:
+                continue
+            try:
+                with open(filename, 'rb') as f:
+                    return index, pickle.load(f)
+            except Exception:
+                logging.warning('broken checkpoint %s, skip', filename, exc_info=True)
+        return 0, None
+
+    def save(self, path, index, digest, backtest):
+        """
+        False - если бэктест не сериализуется, дальше не пытаемся
+        """
+        try:
+            data = pickle.dumps(backtest, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logging.warning('%s: no checkpoints, bot is not picklable: %s', backtest.bot.name, e)
+            return False
+
+        os.makedirs(path, exist_ok=True)
+        filename = os.path.join(path, '%d_%s.pkl' % (index, digest))
+        tmp_path = filename + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filename)
+        return True
+
+    def prune(self, path):
+        for index, digest, filename in self._list(path)[self.keep:]:
+            os.remove(filename)
+
+
+async def run_cached(config, candles, trade_from_ts=None, store: CheckpointStore = None):
+    """
+    CandleBacktest по candles с продолжением от чекпоинта,
+    у результата resumed_from - с какой свечи шел пересчет (len(candles) - ничего не считали)
+    """
+    store = store or CheckpointStore()
+    candles_count = len(candles)
+    hashes = CandleHashes(candles, store.every)
+    path = store.get_dir(config, trade_from_ts, hashes)
+
+    index, backtest = store.load(path, hashes, candles_count)
+    if backtest is None:
+        backtest = CandleBacktest(config.make_bot(), trade_from_ts=trade_from_ts)
+    saving = True
+
+    for i in range(index, candles_count):
+        await backtest.on_candle(candles[i])
+        done = i + 1
+        if saving and (done % store.every == 0 or done == candles_count):
+            saving = store.save(path, done, hashes.prefix(done), backtest)
+
+    if index < candles_count:
+        store.prune(path)
+    backtest.resumed_from = index
+    return backtest
@@ -0,0 +1,116 @@
+from bots.base import CloseOpenedDeal
+
+
+class BaseBacktest:
+    """
+    Учет сделок бэктеста: открытая сделка, закрытые сделки и статистика как у Tester
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+        self.open_deal = None
+        self.open_deal_ts = None
+        self.trades = []  # закрытые сделки, время в секундах как у свечей
+        self.candles_count = 0
+
+        self.take_profit_deals = 0
+        self.stop_loss_deals = 0
+        self.profit = 0.0
+        self.loss = 0.0
+
+    def get_profit_factor(self):
+        return float(self.profit / self.loss) if self.loss else 0
+
+    def get_total_profit(self):
+        return self.profit - self.loss
+
+    def _open(self, deal, ts):
+        self.open_deal = deal
+        self.open_deal_ts = ts
+
+    def _close_deal(self, profit, ts):
+        deal = self.open_deal
+        self.trades.append({
+            "entry_ts": self.open_deal_ts,
+            "exit_ts": ts,
+            "side": deal.side,
+            "amount": deal.amount,
+            "entry_price": deal.price,
+            "exit_price": deal.close_price,
+            "profit": profit,
+            "stop_loss": deal.stop_loss,
+            "take_profit": deal.take_profit,
+        })
+
+        if profit >= 0:
+            self.take_profit_deals += 1
+            self.profit += profit
+        else:
+            self.stop_loss_deals += 1
+            self.loss += abs(profit)
+
+        self.open_deal = None
+        self.open_deal_ts = None
+
+
+class CandleBacktest(BaseBacktest):
+    """
+    Прогон бота по готовым свечам, та же логика что в Tester.do из tester_*.py, но без графика.
+
+    trade_from_ts - свечи раньше этого времени только прогревают бота,
+    сигналы по ним не исполняются (нужно для окон walk-forward)
+    """
+
+    def __init__(self, bot, trade_from_ts=None):
+        super().__init__(bot)
+        self.trade_from_ts = trade_from_ts
+
+    async def run(self, candles):
+        for candle in candles:
+            await self.on_candle(candle)
+
+        return self
+
+    async def on_candle(self, candle):
+        self.candles_count += 1
+        price = candle.close
+        ts = candle.timestamp
+
+        # проверяем открытую сделку
+        if self.open_deal:
+            profit = self.open_deal.check(candle)
+            if profit is not None:
+                self._close_deal(profit, ts)
+
+        # добавляем свечку к историческим данным
+        self.bot.add_candle(candle)
+
+        can_trade = self.trade_from_ts is None or ts >= self.trade_from_ts
+
+        # проверяем есть ли сигнал на сделку
+        try:
+            possible_deal = await self.bot.check_price(price)
+        except CloseOpenedDeal:
+            if self.open_deal:
+                self._close_deal(self.open_deal.close(price), ts)
+            return
+
+        if not possible_deal or not can_trade:
+            return
+
+        if self.open_deal:
+            if self.open_deal.side == possible_deal.side:
+                # сделка в ту же сторону что и уже открытая
+                return
+            # то закрываем старую сделку и открываем новую
+            self._close_deal(self.open_deal.close(price), ts)
+
+        self._open(possible_deal, ts)
+
+    def close_open_deal(self, candle):
+        """
+        Закрыть висящую сделку по закрытию последней свечи окна
+        """
+        if self.open_deal:
+            self._close_deal(self.open_deal.close(candle.close), candle.timestamp)
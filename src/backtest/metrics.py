@@ -0,0 +1,333 @@
+"""
+Метрики бэктеста на NumPy массивах сделок и свечей.
+
+Сделки - list[dict] как в BaseBacktest.trades / TradeLog.trades
+(entry_ts, exit_ts, side, amount, entry_price, exit_price, profit),
+время в секундах. Все считается векторно, без прохода по списку сделок в python.
+"""
+import numpy as np
+
+from bots.base import Signal
+
+TRADE_DTYPE = np.dtype([
+    ('entry_ts', '<f8'),
+    ('exit_ts', '<f8'),
+    ('side', '<i1'),  # 1 - long, -1 - short
+    ('amount', '<f8'),
+    ('entry_price', '<f8'),
+    ('exit_price', '<f8'),
+    ('profit', '<f8'),
+])
+
+CANDLE_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+])
+
+SECONDS_IN_DAY = 24 * 60 * 60
+TRADING_DAYS = 252
+
+
+class TradeLog:
+    """
+    Журнал сделок для Tester из tester_*.py
+    """
+
+    def __init__(self):
+        self.trades = []
+        self._open = None
+
+    def open(self, deal, ts):
+        self._open = (deal, ts)
+
+    def close(self, profit, ts, price):
+        if self._open is None:
+            return
+        deal, entry_ts = self._open
+        self.trades.append({
+            "entry_ts": entry_ts,
+            "exit_ts": ts,
+            "side": deal.side,
+            "amount": deal.amount,
+            "entry_price": deal.price,
+            "exit_price": deal.close_price if deal.close_price is not None else price,
+            "profit": profit,
+            "stop_loss": deal.stop_loss,
+            "take_profit": deal.take_profit,
+        })
+        self._open = None
+
+    def to_array(self):
+        return trades_to_array(self.trades)
+
+
+def trades_to_array(trades) -> np.ndarray:
+    return np.array([
+        (
+            t['entry_ts'],
+            t['exit_ts'],
+            1 if t['side'] == Signal.BUY.value else -1,
+            t['amount'],
+            t['entry_price'],
+            t['exit_price'],
+            t['profit'],
+        )
+        for t in trades
+    ], dtype=TRADE_DTYPE)
+
+
+def candles_to_array(candles) -> np.ndarray:
+    """
+    Из list[CandleStick] или HistoricalData.ohlc_data
+    """
+    if isinstance(candles, dict):
+        rows = [(ts, row['open'], row['high'], row['low'], row['close']) for ts, row in candles.items()]
+    else:
+        rows = [(c.timestamp, c.open, c.high, c.low, c.close) for c in candles]
+    return np.array(rows, dtype=CANDLE_DTYPE)
+
+
+def _trade_indexes(trades, candles):
+    """
+    Индексы свечей входа и выхода каждой сделки
+    """
+    ts = candles['ts']
+    entry = np.searchsorted(ts, trades['entry_ts'], side='left')
+    exit = np.searchsorted(ts, trades['exit_ts'], side='left')
+    return np.minimum(entry, len(ts) - 1), np.minimum(exit, len(ts) - 1)
+
+
+def position_curve(trades, candles):
+    """
+    (позиция, стоимость входа) на закрытии каждой свечи: сумма side * amount
+    и side * amount * entry_price по сделкам, открытым на этой свече
+    """
+    n = len(candles)
+    entry, exit = _trade_indexes(trades, candles)
+    signed_amount = trades['side'] * trades['amount']
+
+    quantity = np.zeros(n + 1)
+    cost = np.zeros(n + 1)
+    np.add.at(quantity, entry, signed_amount)
+    np.add.at(quantity, exit, -signed_amount)
+    np.add.at(cost, entry, signed_amount * trades['entry_price'])
+    np.add.at(cost, exit, -signed_amount * trades['entry_price'])
+
+    return np.cumsum(quantity)[:n], np.cumsum(cost)[:n]
+
+
+def equity_curve(trades, candles):
+    """
+    Mark-to-market equity: закрытый результат плюс плавающий по close каждой свечи
+    """
+    n = len(candles)
+    if not n:
+        return np.zeros(0)
+
+    realized = np.zeros(n + 1)
+    if len(trades):
+        entry, exit = _trade_indexes(trades, candles)
+        np.add.at(realized, exit, trades['profit'])
+    realized = np.cumsum(realized)[:n]
+
+    if not len(trades):
+        return realized
+
+    quantity, cost = position_curve(trades, candles)
+    return realized + quantity * candles['close'] - cost
+
+
+def drawdown(equity, initial_capital=0):
+    """
+    Просадка от пика на каждой точке: абсолютная и в долях капитала на пике
+    """
+    if not len(equity):
+        return np.zeros(0), np.zeros(0)
+
+    capital = equity + initial_capital
+    peak = np.maximum.accumulate(np.maximum(capital, initial_capital))
+    absolute = peak - capital
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(peak > 0, absolute / peak, 0)
+    return absolute, relative
+
+
+def max_drawdown(equity, initial_capital=0):
+    absolute, relative = drawdown(equity, initial_capital)
+    if not len(absolute):
+        return 0.0, 0.0
+    return float(absolute.max()), float(relative.max())
+
+
+def daily_returns(equity, ts, initial_capital=0):
+    """
+    Доходности по последней точке каждого дня.
+    Без initial_capital - дневной PnL, для sharpe/sortino при фиксированном
+    объеме сделки это то же самое с точностью до масштаба
+    """
+    if not len(equity):
+        return np.zeros(0)
+
+    days = (ts // SECONDS_IN_DAY).astype(np.int64)
+    last_of_day = np.r_[np.nonzero(np.diff(days))[0], len(days) - 1]
+    capital = np.r_[0, equity[last_of_day]] + initial_capital
+    if not initial_capital:
+        return np.diff(capital)
+    return np.diff(capital) / capital[:-1]
+
+
+def sharpe(returns, periods=TRADING_DAYS):
+    if len(returns) < 2:
+        return 0.0
+    std = returns.std(ddof=1)
+    return float(returns.mean() / std * np.sqrt(periods)) if std else 0.0
+
+
+def sortino(returns, periods=TRADING_DAYS):
+    if len(returns) < 2:
+        return 0.0
+    downside = np.minimum(returns, 0)
+    downside_std = np.sqrt((downside ** 2).mean())
+    return float(returns.mean() / downside_std * np.sqrt(periods)) if downside_std else 0.0
+
+
+def exposure(trades, candles):
+    """
+    Доля свечей, на которых была открыта позиция
+    """
+    if not len(candles) or not len(trades):
+        return 0.0
+
+    in_market = np.zeros(len(candles) + 1, dtype=np.int64)
+    entry, exit = _trade_indexes(trades, candles)
+    np.add.at(in_market, entry, 1)
+    np.add.at(in_market, exit, -1)
+    return float((np.cumsum(in_market)[:len(candles)] > 0).mean())
+
+
+def time_exposure(trades, start_ts, end_ts):
+    """
+    Доля времени [start_ts, end_ts], когда была открыта хотя бы одна позиция
+    (сделки могут пересекаться - считаем объединение интервалов)
+    """
+    if not len(trades) or end_ts <= start_ts:
+        return 0.0
+
+    order = np.argsort(trades['entry_ts'], kind='stable')
+    entry = trades['entry_ts'][order]
+    exit = np.maximum.accumulate(trades['exit_ts'][order])
+    # новый интервал начинается, если вход позже всех предыдущих выходов
+    starts = np.r_[True, entry[1:] > exit[:-1]]
+    ends = np.r_[starts[1:], True]
+    in_market = (exit[ends] - entry[starts]).sum()
+    return float(in_market / (end_ts - start_ts))
+
+
+def durations(trades):
+    return trades['exit_ts'] - trades['entry_ts']
+
+
+def excursions(trades, candles):
+    """
+    MAE/MFE каждой сделки в деньгах: худший и лучший плавающий результат
+    между свечой входа и свечой выхода включительно
+    """
+    if not len(trades):
+        return np.zeros(0), np.zeros(0)
+
+    entry, exit = _trade_indexes(trades, candles)
+    # reduceat по парам [entry, exit + 1), последний элемент - заглушка для exit + 1 == n
+    low = np.r_[candles['low'], 0]
+    high = np.r_[candles['high'], 0]
+    bounds = np.empty(len(trades) * 2, dtype=np.int64)
+    bounds[0::2] = entry
+    bounds[1::2] = exit + 1
+    lowest = np.minimum.reduceat(low, bounds)[0::2]
+    highest = np.maximum.reduceat(high, bounds)[0::2]
+
+    long = trades['side'] > 0
+    worst = np.where(long, lowest - trades['entry_price'], trades['entry_price'] - highest)
+    best = np.where(long, highest - trades['entry_price'], trades['entry_price'] - lowest)
+    return worst * trades['amount'], best * trades['amount']
+
+
+def report(trades, candles=None, initial_capital=0):
+    """
+    Сводка по сделкам, если есть свечи - еще и mark-to-market метрики.
+    Без initial_capital просадка только в деньгах: доля от пика PnL ничего не значит, max_drawdown_pct = None
+    """
+    profit = trades['profit']
+    gross_profit = float(profit[profit >= 0].sum())
+    gross_loss = float(np.abs(profit[profit < 0]).sum())
+
+    # просадка по закрытым сделкам, если свечей нет
+    realized_equity = np.cumsum(profit[np.argsort(trades['exit_ts'], kind='stable')])
+    drawdown_abs, drawdown_pct = max_drawdown(realized_equity, initial_capital)
+    result = {
+        "trades": len(trades),
+        "wins": int((profit >= 0).sum()),
+        "losses": int((profit < 0).sum()),
+        "profit": gross_profit,
+        "loss": gross_loss,
+        "total_profit": gross_profit - gross_loss,
+        "profit_factor": gross_profit / gross_loss if gross_loss else 0.0,
+        "max_drawdown": drawdown_abs,
+        "max_drawdown_pct": drawdown_pct,
+        "sharpe": 0.0,
+        "sortino": 0.0,
+        "exposure": 0.0,
+        "duration_mean": 0.0,
+        "duration_median": 0.0,
+        "duration_p90": 0.0,
+        "duration_max": 0.0,
+        "mae_mean": 0.0,
+        "mfe_mean": 0.0,
+    }
+
+    if len(trades):
+        d = durations(trades)
+        result.update({
+            "duration_mean": float(d.mean()),
+            "duration_median": float(np.median(d)),
+            "duration_p90": float(np.percentile(d, 90)),
+            "duration_max": float(d.max()),
+        })
+
+    if candles is not None and len(candles):
+        equity = equity_curve(trades, candles)
+        result['max_drawdown'], result['max_drawdown_pct'] = max_drawdown(equity, initial_capital)
+        returns = daily_returns(equity, candles['ts'], initial_capital)
+        result['sharpe'] = sharpe(returns)
+        result['sortino'] = sortino(returns)
+        result['exposure'] = exposure(trades, candles)
+
+        if len(trades):
+            mae, mfe = excursions(trades, candles)
+            result['mae_mean'] = float(mae.mean())
+            result['mfe_mean'] = float(mfe.mean())
+
+    if not initial_capital:
+        result['max_drawdown_pct'] = None
+    return result
+
+
+def format_report(stats):
+    return """
+    sharpe: {sharpe:.2f}
+    sortino: {sortino:.2f}
+    max_drawdown (mark-to-market): {max_drawdown:.2f}{max_drawdown_pct_text}
+    exposure: {exposure:.1%}
+    trade duration, h: mean={duration_mean_h:.1f} median={duration_median_h:.1f} p90={duration_p90_h:.1f} max={duration_max_h:.1f}
+    mae/mfe mean: {mae_mean:.2f} / {mfe_mean:.2f}
+    """.format(
+        duration_mean_h=stats['duration_mean'] / 3600,
+        duration_median_h=stats['duration_median'] / 3600,
+        duration_p90_h=stats['duration_p90'] / 3600,
+        duration_max_h=stats['duration_max'] / 3600,
+        max_drawdown_pct_text=' (%.1f%%)' % (stats['max_drawdown_pct'] * 100)
+        if stats['max_drawdown_pct'] is not None else '',
+        **stats
+    )
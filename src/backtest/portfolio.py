@@ -0,0 +1,263 @@
+"""
+Бэктест одного конфига бота по вселенной инструментов и окнам walk-forward.
+
+Каждая пара (symbol, окно) считается в отдельном процессе, результат
+кешируется на диске по ключу (symbol, окно, hash свечей окна, hash параметров бота),
+поэтому повторный запуск пересчитывает только то, что поменялось.
+"""
+import asyncio
+import dataclasses
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+from backtest.checkpoint import candles_hash
+from backtest.engine import CandleBacktest
+from backtest.metrics import report, time_exposure, trades_to_array
+from bots.stupid_bot.money_manager import SimpleMoneyManager
+from exante_api import HistoricalData
+
+
+@dataclass
+class BotConfig:
+    bot_class: type
+    money_manager: dict  # параметры money_manager_class
+    bot_params: dict = field(default_factory=dict)
+    money_manager_class: type = SimpleMoneyManager
+
+    def make_bot(self):
+        return self.bot_class(
+            money_manager=self.money_manager_class(**self.money_manager),
+            historical_ohlcv=[],
+            **self.bot_params
+        )
+
+    def with_params(self, **params):
+        return dataclasses.replace(self, bot_params={**self.bot_params, **params})
+
+    def get_hash(self):
+        data = {
+            "bot_class": '%s.%s' % (self.bot_class.__module__, self.bot_class.__qualname__),
+            "money_manager_class": '%s.%s' % (self.money_manager_class.__module__,
+                                              self.money_manager_class.__qualname__),
+            "money_manager": self.money_manager,
+            "bot_params": self.bot_params,
+        }
+        raw = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class Window:
+    warmup_start: int  # индексы свечей
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class Job:
+    symbol: str
+    time_interval: int
+    config: BotConfig
+    window: Window
+    data_dir: str
+    cache_dir: str
+
+
+def history_path(data_dir, symbol):
+    # тот же файл, что пишут tester_*.py при update_file = True
+    return os.path.join(data_dir, 'history_%s' % symbol.replace('/', '_'))
+
+
+def merge_history(path, data):
+    """
+    Свежий ответ get_ohlcv дописывается в файл истории: старые свечи остаются, свечи с тем же
+    временем заменяются новыми. История только растет с конца, поэтому чекпоинты бэктеста
+    по ней продолжаются (см. backtest/checkpoint.py). Формат как у get_ohlcv - от новых к старым
+    """
+    if not isinstance(data, list):
+        raise ValueError('get_ohlcv error: %s' % data)
+
+    rows = {}
+    if os.path.exists(path):
+        with open(path, 'r') as json_file:
+            rows = {row['timestamp']: row for row in json.load(json_file)}
+    rows.update((row['timestamp'], row) for row in data)
+    merged = sorted(rows.values(), key=lambda row: row['timestamp'], reverse=True)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as output_file:
+        json.dump(merged, output_file)
+    os.replace(tmp_path, path)
+    return merged
+
+
+@lru_cache(maxsize=32)
+def load_candles(data_dir, symbol, time_interval):
+    """
+    Свечи инструмента в хронологическом порядке, кешируются в каждом процессе пула
+    """
+    with open(history_path(data_dir, symbol), 'r') as json_file:
+        data = json.load(json_file)
+    return HistoricalData(time_interval, data).get_list()
+
+
+def walk_forward_windows(candles_count, train_size, test_size, step=None):
+    """
+    Скользящие окна: train_size свечей истории (прогрев или подбор параметров),
+    за ними test_size свечей, на которых считаем результат
+    """
+    step = step or test_size
+    windows = []
+    start = train_size
+    while start + test_size <= candles_count:
+        windows.append(Window(warmup_start=start - train_size, start=start, end=start + test_size))
+        start += step
+    return windows
+
+
+def _to_float(trade):
+    return {k: float(v) if v is not None and not isinstance(v, str) else v for k, v in trade.items()}
+
+
+def run_job(job: Job):
+    """
+    Выполняется в процессе пула, поэтому функция модуля, а не метод
+    """
+    candles = load_candles(job.data_dir, job.symbol, job.time_interval)
+    window = job.window
+    window_candles = candles[window.warmup_start:window.end]
+    start_ts = candles[window.start].timestamp
+
+    key = hashlib.sha1(json.dumps([
+        job.symbol,
+        job.time_interval,
+        window_candles[0].timestamp,
+        start_ts,
+        window_candles[-1].timestamp,
+        # последняя свеча из get_ohlcv часто еще формируется, после обновления файла OHLC другие
+        candles_hash(window_candles),
+        job.config.get_hash(),
+    ]).encode()).hexdigest()
+    cache_path = os.path.join(job.cache_dir, '%s.json' % key)
+
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            result = json.load(f)
+        result['cached'] = True
+        return result
+
+    async def run():
+        backtest = CandleBacktest(job.config.make_bot(), trade_from_ts=start_ts)
+        await backtest.run(window_candles)
+        backtest.close_open_deal(window_candles[-1])
+        return backtest
+
+    backtest = asyncio.run(run())
+    result = {
+        "symbol": job.symbol,
+        "start_ts": start_ts,
+        "end_ts": window_candles[-1].timestamp,
+        "config_hash": job.config.get_hash(),
+        "bot_params": json.loads(json.dumps(job.config.bot_params, default=str)),
+        "trades": [_to_float(t) for t in backtest.trades],
+        "profit": float(backtest.profit),
+        "loss": float(backtest.loss),
+    }
+
+    os.makedirs(job.cache_dir, exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, cache_path)
+
+    result['cached'] = False
+    return result
+
+
+def param_variants(param_grid):
+    names = sorted(param_grid)
+    for values in itertools.product(*(param_grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def _score(result):
+    # профит фактор, без убытков - просто профит
+    stats = report(trades_to_array(result['trades']))
+    return stats['profit_factor'] if stats['loss'] else stats['profit']
+
+
+def run_portfolio(symbols, config: BotConfig, time_interval, train_size, test_size, step=None,
+                  param_grid=None, processes=None, data_dir='.', cache_dir='backtest_cache'):
+    """
+    Без param_grid окна train только прогревают бота.
+    С param_grid на каждом train окне выбираются лучшие параметры по профит фактору
+    и уже с ними считается следующее test окно (классический walk-forward)
+
+    Возвращает результаты test окон всех инструментов
+    """
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        windows = {}
+        for symbol in symbols:
+            candles_count = len(load_candles(data_dir, symbol, time_interval))
+            windows[symbol] = walk_forward_windows(candles_count, train_size, test_size, step)
+
+        test_configs = {}
+        if param_grid:
+            train_jobs = []
+            for symbol in symbols:
+                for window in windows[symbol]:
+                    train_window = Window(warmup_start=window.warmup_start, start=window.warmup_start,
+                                          end=window.start)
+                    for variant in param_variants(param_grid):
+                        train_jobs.append(Job(symbol, time_interval, config.with_params(**variant),
+                                              train_window, data_dir, cache_dir))
+
+            best = {}
+            for job, result in zip(train_jobs, pool.map(run_job, train_jobs)):
+                key = (job.symbol, job.window.end)
+                if key not in best or _score(result) > _score(best[key][1]):
+                    best[key] = (job.config, result)
+
+            test_configs = {key: best_config for key, (best_config, result) in best.items()}
+
+        test_jobs = [
+            Job(symbol, time_interval, test_configs.get((symbol, window.start), config),
+                window, data_dir, cache_dir)
+            for symbol in symbols
+            for window in windows[symbol]
+        ]
+        return list(pool.map(run_job, test_jobs))
+
+
+def aggregate(results):
+    """
+    Портфельная статистика по всем test окнам всех инструментов
+    """
+    trades = trades_to_array([t for r in results for t in r['trades']])
+    trades = trades[np.argsort(trades['exit_ts'], kind='stable')]
+    stats = report(trades)
+
+    exposure = 0.0
+    if results:
+        exposure = time_exposure(trades, min(r['start_ts'] for r in results),
+                                 max(r['end_ts'] for r in results))
+
+    per_symbol = {}
+    for r in results:
+        per_symbol.setdefault(r['symbol'], 0)
+        per_symbol[r['symbol']] += r['profit'] - r['loss']
+
+    return {
+        **stats,
+        "exposure": exposure,
+        "per_symbol": per_symbol,
+        "equity_curve": list(zip(trades['exit_ts'].tolist(), np.cumsum(trades['profit']).tolist())),
+        "cached": sum(1 for r in results if r['cached']),
+    }
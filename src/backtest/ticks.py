@@ -0,0 +1,141 @@
+import json
+
+import numpy as np
+
+from backtest.engine import BaseBacktest
+from bots.base import CloseOpenedDeal, Signal
+from exante_api.journal import STREAM, read_journal
+
+# компактный формат тиков: 24 байта на котировку
+TICK_DTYPE = np.dtype([
+    ('ts', '<i8'),  # timestamp в мс, как в стриме
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+])
+
+
+def save_ticks(path, ticks: np.ndarray):
+    np.save(path, ticks.astype(TICK_DTYPE, copy=False))
+
+
+def load_ticks(path) -> np.ndarray:
+    # mmap, чтобы не читать в память файл на сотни миллионов тиков целиком
+    return np.load(path, mmap_mode='r')
+
+
+def ticks_from_events(events) -> np.ndarray:
+    """
+    Тики из событий стрима (dict как в ExanteApi.parse_stream_lines)
+    """
+    rows = [
+        (e['timestamp'], float(e['bid'][0]['price']), float(e['ask'][0]['price']))
+        for e in events
+        if e.get('bid') and e.get('ask')
+    ]
+    return np.array(rows, dtype=TICK_DTYPE)
+
+
+def ticks_from_journal(path) -> np.ndarray:
+    """
+    Тики из журнала трейдера, см. exante_api.journal
+    """
+    def events():
+        for record_type, ts, payload in read_journal(path):
+            if record_type != STREAM:
+                continue
+            for line in payload.split(b'\n'):
+                if line.strip():
+                    yield json.loads(line)
+
+    return ticks_from_events(events())
+
+
+class TickBacktest(BaseBacktest):
+    """
+    Бэктест по bid/ask котировкам через тот же HistoricalData.add_data, что и у трейдеров.
+
+    На закрытии свечи бот получает historical_data.get_last_candle() и mid цену тика,
+    рыночные ордера исполняются по противоположной стороне плюс slippage,
+    SL/TP проверяются на каждом тике, см. Deal.check_tick.
+    trailing - TrailingStops без api, двигает стоп открытой сделки так же, как в торговле
+    """
+
+    def __init__(self, bot, historical_data, slippage=0, trailing=None):
+        super().__init__(bot)
+        self.historical_data = historical_data
+        self.slippage = float(slippage)
+        self.trailing = trailing
+        self.ticks_count = 0
+
+    def _fill_price(self, side, bid, ask):
+        # рыночный ордер: покупаем по ask, продаем по bid и проскальзываем против себя
+        if side == Signal.BUY.value:
+            return ask + self.slippage
+        return bid - self.slippage
+
+    def _close_by_market(self, ts, bid, ask):
+        deal = self.open_deal
+        closing_side = Signal.SELL.value if deal.side == Signal.BUY.value else Signal.BUY.value
+        self._close_deal(deal.close(self._fill_price(closing_side, bid, ask)), ts)
+
+    def _open_by_market(self, deal, ts, bid, ask):
+        # SL/TP бот посчитал от mid цены, исполняемся по рынку
+        deal.price = self._fill_price(deal.side, bid, ask)
+        self._open(deal, ts)
+        if self.trailing is not None:
+            self.trailing.track_deal(self.bot.name, deal)
+
+    def _close_deal(self, profit, ts):
+        if self.trailing is not None:
+            self.trailing.untrack(self.bot.name)
+        super()._close_deal(profit, ts)
+
+    async def on_candle(self, ts, bid, ask):
+        self.candles_count += 1
+        self.bot.add_candle(self.historical_data.get_last_candle())
+        price = (bid + ask) / 2
+
+        try:
+            possible_deal = await self.bot.check_price(price)
+        except CloseOpenedDeal:
+            if self.open_deal:
+                self._close_by_market(ts, bid, ask)
+            return
+
+        if not possible_deal:
+            return
+
+        if self.open_deal:
+            if self.open_deal.side == possible_deal.side:
+                # сделка в ту же сторону что и уже открытая
+                return
+            # разворот
+            self._close_by_market(ts, bid, ask)
+
+        self._open_by_market(possible_deal, ts, bid, ask)
+
+    async def run(self, ticks: np.ndarray):
+        historical_data = self.historical_data
+        # итерация по python спискам в разы быстрее, чем по элементам numpy
+        ts_list = ticks['ts'].tolist()
+        bid_list = ticks['bid'].tolist()
+        ask_list = ticks['ask'].tolist()
+
+        for ts, bid, ask in zip(ts_list, bid_list, ask_list):
+            self.ticks_count += 1
+
+            deal = self.open_deal
+            if deal is not None:
+                profit = deal.check_tick(bid, ask, self.slippage)
+                if profit is not None:
+                    self._close_deal(profit, ts / 1000)
+                elif self.trailing is not None:
+                    self.trailing.on_tick(self.bot.name, bid, ask, ts / 1000)
+
+            last_ts = historical_data.last_ts
+            historical_data.add_data(ts, bid, ask)
+
+            if last_ts and last_ts != historical_data.last_ts and len(historical_data.ohlc_data) > 1:
+                await self.on_candle(ts / 1000, bid, ask)
+
+        return self
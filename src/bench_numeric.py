@@ -0,0 +1,183 @@
+"""
+Сколько стоит Decimal в горячих путях: тик трейдера (Event + HistoricalData.add_data),
+свеча (CandleStick, пинбар, Deal.check) и бэктест целиком.
+
+python bench_numeric.py --ticks 200000 --candles 50000
+
+Прежний путь на Decimal (Legacy*) - те же классы с Decimal полями и getcontext().prec = 6
+на каждом тике, как было до перехода на float, текущий - код бота как есть.
+Экономия на бэктест = разница на тик/свечу * число тиков/свечей.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from decimal import Decimal, getcontext
+
+import numpy as np
+
+from backtest.engine import CandleBacktest
+from backtest.ticks import TickBacktest, TICK_DTYPE
+from bots.base import CandleStick, Deal
+from bots.rsi_bot.bot import RsiBot
+from bots.stupid_bot.money_manager import SimpleMoneyManager
+from exante_api import Event, HistoricalData
+
+time_interval = 60
+start_price = 1.2
+spread = 0.0002
+digits = 5
+seed = 1
+
+parser = argparse.ArgumentParser(description='Decimal vs float benchmark')
+parser.add_argument('--ticks', dest='ticks', action='store', type=int, default=200000)
+parser.add_argument('--candles', dest='candles', action='store', type=int, default=50000)
+
+
+def make_ticks(n):
+    rnd = np.random.default_rng(seed)
+    mid = start_price * np.exp(np.cumsum(rnd.normal(0, 0.00005, n)))
+    ticks = np.empty(n, dtype=TICK_DTYPE)
+    ticks['ts'] = 1_600_000_000_000 + np.arange(n) * 250
+    ticks['bid'] = np.round(mid - spread / 2, digits)
+    ticks['ask'] = np.round(mid + spread / 2, digits)
+    return ticks
+
+
+def make_events(ticks):
+    # как строки стрима: цены строками
+    fmt = '%.' + str(digits) + 'f'
+    return [
+        {"timestamp": ts, "bid": [{"price": fmt % bid}], "ask": [{"price": fmt % ask}]}
+        for ts, bid, ask in zip(ticks['ts'].tolist(), ticks['bid'].tolist(), ticks['ask'].tolist())
+    ]
+
+
+class LegacyEvent(Event):
+    def __init__(self, data):
+        self.type = data.get('event')
+        self.ts = data.get('timestamp')
+
+        if not self.type:
+            self.type = 'undefined'
+
+        if data.get('ask') and data.get('bid'):
+            self.type = 'new_price'
+            self.bid = Decimal(data.get('bid')[0]['price'])
+            self.ask = Decimal(data.get('ask')[0]['price'])
+            self.spread = self.ask - self.bid
+
+
+class LegacyHistoricalData(HistoricalData):
+    def add_data(self, ts, bid, ask):
+        getcontext().prec = 6
+        super().add_data(ts, bid, ask)
+
+
+class LegacyCandleStick(CandleStick):
+    def __init__(self, timestamp, open, high, low, close):
+        self.timestamp = timestamp
+        self.formatted_date = datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')
+        self.datetime = datetime.fromtimestamp(self.timestamp)
+        self.open = Decimal(open)
+        self.high = Decimal(high)
+        self.low = Decimal(low)
+        self.close = Decimal(close)
+        self.raw_data = [self.open, self.high, self.low, self.close]
+
+    def is_long_pinbar(self, coef=2) -> bool:
+        return Decimal(self.shadow) > (Decimal(self.body_size + self.tail) * Decimal(coef))
+
+
+def check_candle(candle_class, stop_distance):
+    def check(item):
+        candle = candle_class(*item)
+        deal = Deal(amount=1, price=candle.close, stop_loss=candle.close - stop_distance, take_profit=None,
+                    status='open', side='buy')
+        return candle.is_long_pinbar(2), deal.check(candle)
+    return check
+
+
+def tick_path(event_class, historical_data):
+    def on_event(data):
+        e = event_class(data)
+        historical_data.add_data(e.ts, e.bid, e.ask)
+    return on_event
+
+
+def measure(func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def make_bot(candles=None):
+    money_manager = SimpleMoneyManager(order_amount=1, diff=0.001, stop_loss_factor=2, take_profit_factor=4)
+    return RsiBot(money_manager=money_manager, historical_ohlcv=candles or [], upper_band=70, lower_band=30)
+
+
+async def main(ticks, candles):
+    tick_array = make_ticks(ticks)
+    events = make_events(tick_array)
+
+    # тик
+    prec = getcontext().prec
+    try:
+        legacy_tick = measure(tick_path(LegacyEvent, LegacyHistoricalData(time_interval, [])), events)
+        float_tick = measure(tick_path(Event, HistoricalData(time_interval, [])), events)
+    finally:
+        getcontext().prec = prec
+
+    # свеча
+    candle_array = make_ticks(candles)
+    rows = [
+        (ts // 1000, '%.5f' % bid, '%.5f' % (ask + spread), '%.5f' % (bid - spread), '%.5f' % ask)
+        for ts, bid, ask in zip(candle_array['ts'].tolist(), candle_array['bid'].tolist(),
+                                candle_array['ask'].tolist())
+    ]
+    legacy_per_candle = measure(check_candle(LegacyCandleStick, Decimal('0.002')), rows)
+    float_per_candle = measure(check_candle(CandleStick, 0.002), rows)
+
+    # бэктесты на текущем коде
+    started = time.perf_counter()
+    tick_backtest = await TickBacktest(make_bot(), HistoricalData(time_interval, []), slippage=0.00001) \
+        .run(tick_array)
+    tick_backtest_time = time.perf_counter() - started
+
+    candle_list = [CandleStick(*row) for row in rows]
+    started = time.perf_counter()
+    await CandleBacktest(make_bot()).run(candle_list)
+    candle_backtest_time = time.perf_counter() - started
+
+    print("""
+    tick (Event + add_data): decimal {legacy_tick:.2f} us, float {float_tick:.2f} us, x{tick_speedup:.2f}
+    candle (CandleStick + pinbar + Deal.check): decimal {legacy_candle:.2f} us, float {float_candle:.2f} us, \
+x{candle_speedup:.2f}
+
+    tick backtest: {ticks} ticks, {candles_count} candles, {tick_backtest:.2f}s ({per_tick:.2f} us/tick)
+        saved vs decimal: {tick_saved:.2f}s
+    candle backtest: {candles} candles, {candle_backtest:.2f}s ({per_candle:.2f} us/candle)
+        saved vs decimal: {candle_saved:.2f}s
+    """.format(
+        legacy_tick=legacy_tick,
+        float_tick=float_tick,
+        tick_speedup=legacy_tick / float_tick if float_tick else 0,
+        legacy_candle=legacy_per_candle,
+        float_candle=float_per_candle,
+        candle_speedup=legacy_per_candle / float_per_candle if float_per_candle else 0,
+        ticks=ticks,
+        candles_count=tick_backtest.candles_count,
+        tick_backtest=tick_backtest_time,
+        per_tick=tick_backtest_time / ticks * 1e6,
+        tick_saved=(legacy_tick - float_tick) * ticks / 1e6,
+        candles=candles,
+        candle_backtest=candle_backtest_time,
+        per_candle=candle_backtest_time / candles * 1e6,
+        candle_saved=(legacy_per_candle - float_per_candle) * candles / 1e6,
+    ))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    asyncio.run(main(**vars(args)))
@@ -0,0 +1,354 @@
+"""
+Бенчмарки горячих путей на синтетических данных, с сохраненным baseline и порогом регрессии.
+
+python bench_suite.py                        # сравнить с bench_baseline.json, код выхода 1 при регрессии
+python bench_suite.py --filter 'check_price[rsi_bot' --threshold 0.3
+python bench_suite.py --save                 # записать baseline
+
+Порядок работы: bench_baseline.json лежит в репозитории рядом со скриптом. Перед изменением
+горячего пути - прогнать сравнение, после - еще раз; если код стал быстрее или медленнее
+сознательно, --save и закоммитить baseline вместе с изменением. На другой машине сначала
+--save на чистом master, иначе сравнивать не с чем.
+
+Бенчмарки меряются кругами (--repeat кругов по --min-time / repeat секунд на бенчмарк),
+в круге - лучший прогон, в отчете min и медиана по кругам. Что меряем (время на одну операцию):
+- parse_stream_lines - тик, пачками по 1/10/100 котировок в чанке стрима;
+- HistoricalData.add_data - тик;
+- HistoricalData.get_list / get_last_candle - вызов при истории 100/1000/5000 свечей;
+- check_price ботов из settings/traders.json (и StrategyBot) - новая свеча (add_candle + check_price)
+  после истории 100/1000/5000 свечей;
+- Deal.check - свеча;
+- backtest - прогон бота по 5000 свечам, как Tester.do в tester_*.py без графика.
+
+Регрессия - min хуже min из baseline больше чем на threshold. Baseline с другой машины
+или другого python сравнивается с предупреждением: абсолютные цифры там не сопоставимы.
+"""
+import argparse
+import asyncio
+import fnmatch
+import gc
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from backtest.engine import CandleBacktest
+from bots import indicators
+from bots.base import CloseOpenedDeal, Deal
+from bots.registry import make_bot
+from exante_api import ExanteApi, HistoricalData
+from exante_api.models import OHLCV_DTYPE
+from trader import load_config
+
+import settings
+
+time_interval = 300
+start_price = 100.0
+seed = 1
+history_sizes = (100, 1000, 5000)
+ticks_per_chunk = (1, 10, 100)
+stream_ticks = 20000
+new_candles = 200  # свечей на прогон check_price
+backtest_candles = 5000
+# бот, которого нет в traders.json
+extra_bots = {
+    "strategy_bot": {
+        "class": "strategy_bot",
+        "spec": "rsi_bot",
+        "params": {"upper_band": 80, "lower_band": 20},
+        "money_manager": {"class": "simple", "order_amount": 100, "diff": 0.2,
+                          "stop_loss_factor": 2, "take_profit_factor": 10},
+    },
+}
+
+parser = argparse.ArgumentParser(description='benchmark suite')
+parser.add_argument('--baseline', dest='baseline', action='store',
+                    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json'))
+parser.add_argument('--save', dest='save', action='store_true', help='write results as new baseline')
+parser.add_argument('--threshold', dest='threshold', action='store', type=float, default=0.2,
+                    help='allowed slowdown of min vs baseline min, 0.2 = 20%%')
+parser.add_argument('--repeat', dest='repeat', action='store', type=int, default=10,
+                    help='rounds over all benchmarks')
+parser.add_argument('--min-time', dest='min_time', action='store', type=float, default=1.0,
+                    help='seconds of runs per benchmark, split between rounds')
+parser.add_argument('--filter', dest='pattern', action='store', default='',
+                    help='substring or glob of benchmark name, e.g. "check_price[rsi_bot" or "check_price*5000"')
+parser.add_argument('--config', dest='config', action='store', default=settings.TRADERS_CONFIG)
+
+
+class Case:
+    """
+    setup() - не меряется, run(state) - меряется, ops - операций в одном run
+    """
+
+    def __init__(self, name, run, ops, setup=None):
+        self.name = name
+        self.run = run
+        self.ops = ops
+        self.setup = setup or (lambda: None)
+
+    def measure(self, min_time):
+        """
+        Лучший прогон (us/op) за min_time секунд, хотя бы один. Каждый прогон меряется отдельно
+        и без gc, как в timeit: соседи по машине и gc только замедляют
+        """
+        best = math.inf
+        total = 0
+        while total < min_time or best == math.inf:
+            state = self.setup()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                self.run(state)
+                elapsed = time.perf_counter() - started
+            finally:
+                gc.enable()
+            total += elapsed
+            best = min(best, elapsed / self.ops * 1e6)
+        return best
+
+
+def make_ohlcv(n):
+    """
+    Случайное блуждание, свечи по time_interval подряд, как из get_ohlcv_arrays
+    """
+    rnd = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rnd.normal(0, 0.002, n)))
+    open = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rnd.normal(0, 0.001, n)) * close
+    ohlcv = np.empty(n, dtype=OHLCV_DTYPE)
+    ohlcv['timestamp'] = (1_600_000_000 + np.arange(n) * time_interval) * 1000
+    ohlcv['open'] = np.round(open, 2)
+    ohlcv['close'] = np.round(close, 2)
+    ohlcv['high'] = np.round(np.maximum(open, close) + spread, 2)
+    ohlcv['low'] = np.round(np.minimum(open, close) - spread, 2)
+    ohlcv['volume'] = 1
+    return ohlcv
+
+
+def make_candles(n):
+    return HistoricalData(time_interval, make_ohlcv(n)).get_list()
+
+
+def make_stream_chunks(per_chunk):
+    rnd = np.random.default_rng(seed)
+    mid = start_price * np.exp(np.cumsum(rnd.normal(0, 0.0001, stream_ticks)))
+    lines = [
+        json.dumps({
+            "symbolId": "BENCH.TEST",
+            "timestamp": 1_600_000_000_000 + i * 250,
+            "bid": [{"price": '%.2f' % (price - 0.01), "size": "100"}],
+            "ask": [{"price": '%.2f' % (price + 0.01), "size": "100"}],
+        })
+        for i, price in enumerate(mid.tolist())
+    ]
+    return [
+        ('\n'.join(lines[i:i + per_chunk]) + '\n').encode()
+        for i in range(0, len(lines), per_chunk)
+    ]
+
+
+def stream_cases():
+    api = ExanteApi(application_id='bench', access_key='bench', demo=True, account_id='bench', currency='USD')
+    for per_chunk in ticks_per_chunk:
+        chunks = make_stream_chunks(per_chunk)
+
+        def run(state, chunks=chunks):
+            for chunk in chunks:
+                api.parse_stream_lines(chunk)
+
+        yield Case('parse_stream_lines[%d/chunk]' % per_chunk, run, stream_ticks)
+
+
+def historical_data_cases():
+    rnd = np.random.default_rng(seed)
+    mid = (start_price * np.exp(np.cumsum(rnd.normal(0, 0.0001, stream_ticks)))).tolist()
+    # 4 котировки в секунду, новая свеча каждые time_interval секунд
+    ticks = [(1_600_000_000_000 + i * 250, price - 0.01, price + 0.01) for i, price in enumerate(mid)]
+
+    def add_data(historical_data):
+        for ts, bid, ask in ticks:
+            historical_data.add_data(ts, bid, ask)
+
+    yield Case('HistoricalData.add_data', add_data, len(ticks),
+               setup=lambda: HistoricalData(time_interval, []))
+
+    calls = 100
+    for size in history_sizes:
+        historical_data = HistoricalData(time_interval, make_ohlcv(size))
+
+        def get_list(state, historical_data=historical_data):
+            for _ in range(calls):
+                historical_data.get_list()
+
+        def get_last_candle(state, historical_data=historical_data):
+            for _ in range(calls * 10):
+                historical_data.get_last_candle()
+
+        yield Case('HistoricalData.get_list[%d]' % size, get_list, calls)
+        yield Case('HistoricalData.get_last_candle[%d]' % size, get_last_candle, calls * 10)
+
+
+def bot_configs(path):
+    configs = {name: trader['bot'] for name, trader in load_config(path).items()}
+    configs.update(extra_bots)
+    return configs
+
+
+def run_async(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def feed(bot, candles):
+    for candle in candles:
+        bot.add_candle(candle)
+        try:
+            await bot.check_price(candle.close)
+        except CloseOpenedDeal:
+            pass
+
+
+def bot_cases(configs):
+    candles = make_candles(max(history_sizes) + new_candles)
+    for name, config in configs.items():
+        for size in history_sizes:
+            history, tail = candles[:size], candles[size:size + new_candles]
+
+            def setup(config=config, history=history):
+                # холодный кеш индикаторов: иначе попадание зависит от того, совпал ли id бота с прошлым
+                indicators.cache.clear()
+                return make_bot(config, list(history))
+
+            def run(bot, tail=tail):
+                run_async(feed(bot, tail))
+
+            yield Case('check_price[%s, %d]' % (name, size), run, new_candles, setup=setup)
+
+
+def deal_cases():
+    candles = make_candles(10000)
+
+    def run(deal):
+        for candle in candles:
+            deal.check(candle)
+
+    # стоп и тейк далеко - сделка проверяется на каждой свече и не закрывается
+    yield Case('Deal.check', run, len(candles),
+               setup=lambda: Deal(amount=1, price=start_price, stop_loss=0.01, take_profit=start_price * 1000,
+                                  status='open', side='buy'))
+
+
+def backtest_cases(configs):
+    candles = make_candles(backtest_candles)
+    for name, config in configs.items():
+        def setup(config=config):
+            indicators.cache.clear()
+            return CandleBacktest(make_bot(config, []))
+
+        def run(backtest):
+            run_async(backtest.run(candles))
+
+        yield Case('backtest[%s]' % name, run, len(candles), setup=setup)
+
+
+def get_cases(config_path):
+    configs = bot_configs(config_path)
+    yield from stream_cases()
+    yield from historical_data_cases()
+    yield from bot_cases(configs)
+    yield from deal_cases()
+    yield from backtest_cases(configs)
+
+
+def get_machine():
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def matches(name, pattern):
+    """
+    --filter - подстрока или glob по имени, [ ] в именах бенчмарков - обычные символы
+    """
+    return fnmatch.fnmatchcase(name, '*%s*' % pattern.replace('[', '[[]'))
+
+
+def compare(name, result, baseline, threshold):
+    """
+    (строка отчета, регрессия ли)
+    """
+    line = '%-45s %12.2f %12.2f' % (name, result['min'], result['median'])
+    old = (baseline or {}).get('results', {}).get(name)
+    if not old:
+        return line + '%12s' % 'new', False
+    # min устойчивее медианы к соседям по машине: шум только замедляет
+    change = result['min'] / old['min'] - 1 if old['min'] else 0
+    regression = change > threshold
+    return line + '%12.2f %+7.1f%%%s' % (old['min'], change * 100, ' SLOWER' if regression else ''), regression
+
+
+def main(baseline, save, threshold, repeat, min_time, pattern, config):
+    previous = load_baseline(baseline)
+    if previous and previous.get('machine') != get_machine():
+        print('baseline %s is from other machine %s, compare with care' % (baseline, previous.get('machine')))
+
+    cases = [case for case in get_cases(config) if matches(case.name, pattern)]
+    if not cases:
+        print('no benchmarks match --filter %r' % pattern)
+        return 2
+
+    # кругами по всем бенчмаркам: замедление машины на несколько секунд портит один круг, а не весь бенчмарк
+    rounds = {case.name: [] for case in cases}
+    for i in range(repeat):
+        print('round %d/%d' % (i + 1, repeat), file=sys.stderr, flush=True)
+        for case in cases:
+            rounds[case.name].append(case.measure(min_time / repeat))
+
+    print('%-45s %12s %12s %12s' % ('us/op', 'min', 'median', 'baseline'))
+    results = {}
+    regressions = []
+    for case in cases:
+        times = rounds[case.name]
+        results[case.name] = {"min": min(times), "median": statistics.median(times)}
+        line, regression = compare(case.name, results[case.name], previous, threshold)
+        print(line)
+        if regression:
+            regressions.append(case.name)
+
+    if save:
+        data = {"machine": get_machine(), "results": {}}
+        if previous and previous.get('machine') == data['machine']:
+            # --filter перезаписывает только свои бенчмарки
+            data['results'].update(previous.get('results', {}))
+        data['results'].update(results)
+        with open(baseline, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        print('baseline saved: %s' % baseline)
+    elif regressions:
+        print('regressions over %.0f%%: %s' % (threshold * 100, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    sys.exit(main(**vars(args)))
@@ -1,10 +1,13 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
-from decimal import Decimal
 from enum import Enum
 from typing import Literal
 
+import numpy as np
+
+from bots.patterns import EPSILON
+
 
 class CloseOpenedDeal(Exception):
     pass
@@ -19,7 +22,7 @@ class Signal(Enum):
 @dataclass
 class Result:
     signal: Signal  # покупать или продавать
-    price: Decimal  # по какой цене
+    price: float  # по какой цене
 
     def __str__(self):
         return '%s: %s' % (self.signal.value, self.price)
@@ -30,10 +33,10 @@ class CandleStick:
         self.timestamp = timestamp
         self.formatted_date = datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')
         self.datetime = datetime.fromtimestamp(self.timestamp)
-        self.open = Decimal(open)
-        self.high = Decimal(high)
-        self.low = Decimal(low)
-        self.close = Decimal(close)
+        self.open = float(open)
+        self.high = float(high)
+        self.low = float(low)
+        self.close = float(close)
 
         # стандартное представление для рисования графиков
         self.raw_data = [self.open, self.high, self.low, self.close]
@@ -62,7 +65,7 @@ class CandleStick:
         if self.body_type < 0:
             return self.high - self.open
 
-        return 0  # нет тела - нет хвоста
+        return 0.0  # нет тела - нет хвоста
 
     @property
     def lower_shadow(self):
@@ -75,7 +78,7 @@ class CandleStick:
         if self.body_type < 0:
             return self.close - self.low
 
-        return 0
+        return 0.0
 
     @property
     def shadow(self):
@@ -109,16 +112,17 @@ class CandleStick:
         if self.body_type < 0:
             return self.open - self.close
 
-        return 0
+        return 0.0
 
+    # сравнения с допуском, как в bots/patterns.py: цены float
     def is_pinbar(self) -> bool:
-        return self.shadow > self.body_size
+        return self.shadow - self.body_size > EPSILON
 
     def is_long_pinbar(self, coef = 2) -> bool:
-        return Decimal(self.shadow) > (Decimal(self.body_size+self.tail) * Decimal(coef))
+        return self.shadow - (self.body_size + self.tail) * coef > EPSILON
 
     def pinbar_direction(self):
-        if self.upper_shadow > self.lower_shadow:
+        if self.upper_shadow - self.lower_shadow > EPSILON:
             return Signal.SELL
         return Signal.BUY
 
@@ -127,6 +131,65 @@ class CandleStick:
         return [min(self.raw_data), max(self.raw_data)]
 
 
+class CandleArrays:
+    """
+    float64 массивы окна свечей, каждый строится при первом обращении.
+    MultiBot строит снимок один раз на свечу и отдает всем под-ботам,
+    у которых окно - хвост этого снимка
+    """
+    __slots__ = ('_candles', '_parent', '_arrays')
+
+    def __init__(self, candles, parent=None):
+        self._candles = candles
+        self._parent = parent
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self._candles)
+
+    def _get(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            if self._parent is not None:
+                array = self._parent._get(name)[len(self._parent) - len(self):]
+            else:
+                array = np.fromiter((getattr(c, name) for c in self._candles), dtype=float,
+                                    count=len(self._candles))
+            self._arrays[name] = array
+        return array
+
+    @property
+    def timestamp(self):
+        return self._get('timestamp')
+
+    @property
+    def open(self):
+        return self._get('open')
+
+    @property
+    def high(self):
+        return self._get('high')
+
+    @property
+    def low(self):
+        return self._get('low')
+
+    @property
+    def close(self):
+        return self._get('close')
+
+    def tail(self, candles):
+        """
+        Срез под окно candles или None, если это окно не из этого снимка
+        """
+        n = len(candles)
+        if not n or n > len(self) \
+                or self._candles[-1].timestamp != candles[-1].timestamp \
+                or self._candles[-n].timestamp != candles[0].timestamp:
+            return None
+        return CandleArrays(candles, parent=self)
+
+
 class BaseBot(ABC):
     """
     Методы надо вызывать один за другим
@@ -137,6 +200,8 @@ class BaseBot(ABC):
     name = '¯\_(ツ)_/¯'
     historical_ohlcv = []
     last_price = []
+    candle_arrays = None  # общий снимок свечей, выставляет MultiBot
+    indicator_series = None  # ключ серии в кеше индикаторов, у ботов MultiBot общий
 
     @abstractmethod
     def add_candle(self, candle: CandleStick):
@@ -168,15 +233,36 @@ class BaseBot(ABC):
         """
         raise NotImplemented
 
+    def close(self):
+        """
+        Освободить ресурсы бота (пул потоков MultiBot), вызывается когда бот больше не нужен
+        """
+
+    def get_indicator_series(self):
+        """
+        series_id для bots.indicators: у каждого бота свои слоты кеша
+        """
+        if self.indicator_series is None:
+            self.indicator_series = ('bot', id(self))
+        return self.indicator_series
+
+    def get_candle_arrays(self) -> CandleArrays:
+        if self.candle_arrays is not None:
+            arrays = self.candle_arrays.tail(self.historical_ohlcv)
+            if arrays is not None:
+                return arrays
+        return CandleArrays(self.historical_ohlcv)
+
 
 @dataclass
 class Deal:
-    amount: Decimal
-    price: Decimal
-    stop_loss: Decimal
-    take_profit: Decimal
+    amount: float
+    price: float
+    stop_loss: float
+    take_profit: float
     status: Literal['open', 'closed']
     side: Literal['buy', 'sell']
+    close_price: float = None
 
     def check(self, candle: CandleStick):
         if not self.is_open():
@@ -191,18 +277,39 @@ class Deal:
             if candle.price_range[0] <= self.take_profit <= candle.price_range[1]:
                 return self.close(self.take_profit)
 
+    def check_tick(self, bid, ask, slippage=0):
+        """
+        Проверка SL/TP по котировке, а не по свече:
+        long закрывается по bid, short по ask.
+        Стоп исполняется по рынку с проскальзыванием, тейк - по своей цене
+        """
+        if not self.is_open():
+            return
+
+        if self.side == Signal.BUY.value:
+            if self.stop_loss and bid <= self.stop_loss:
+                return self.close(bid - slippage)
+            if self.take_profit and bid >= self.take_profit:
+                return self.close(self.take_profit)
+        else:
+            if self.stop_loss and ask >= self.stop_loss:
+                return self.close(ask + slippage)
+            if self.take_profit and ask <= self.take_profit:
+                return self.close(self.take_profit)
+
     def is_open(self):
         return self.status == 'open'
 
     def close(self, price):
         self.status = 'closed'
+        self.close_price = price
 
         if self.side == Signal.BUY.value:
             profit = price - self.price
         else:
             profit = self.price - price
 
-        return Decimal(profit) * Decimal(self.amount)
+        return profit * float(self.amount)
 
     def __str__(self):
         return str(self.side)
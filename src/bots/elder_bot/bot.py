@@ -1,12 +1,10 @@
 import logging
-from datetime import date
-from decimal import Decimal
+import math
 from typing import Union, List
 
-import numpy as np
-from talib import RSI, SMA, EMA
-
+from bots import indicators
 from bots.base import Result, BaseBot, Signal, Deal
+from bots.resample import DAY, Resampler, StreamingEma, hlc3
 
 
 class ElderBot(BaseBot):
@@ -20,23 +18,15 @@ class ElderBot(BaseBot):
         """
         # прошедшие данные
         self.historical_ohlcv = historical_ohlcv or []
-        self.day_ohlc_data = {}
+        # дневные свечи и EMA(14) по hlc3 дня обновляются на каждой свече за O(1)
+        self.days = Resampler(DAY)
+        self.day_ohlc_data = self.days.bars
+        self.day_ema = self.days.add_indicator(StreamingEma(14), source=hlc3)
         for candle in self.historical_ohlcv:
-            ts = candle.timestamp
-            d = date.fromtimestamp(ts)
-            self.day_ohlc_data.setdefault(d,
-                {
-                    "open": candle.open,
-                    "high": candle.high,
-                    "low": candle.low,
-                    "close": candle.close
-                }
-            )
-            self.day_ohlc_data[d]['high'] = max(self.day_ohlc_data[d]['high'], candle.high)
-            self.day_ohlc_data[d]['low'] = min(self.day_ohlc_data[d]['low'], candle.low)
-            self.day_ohlc_data[d]['close'] = candle.close
+            self.days.add_candle(candle)
 
         self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
         self.params = params
 
         self.lower = False
@@ -57,21 +47,20 @@ class ElderBot(BaseBot):
                     or (last_candle.datetime.hour == 16 and last_candle.datetime.minute < 30) \
                     or last_candle.datetime.hour >= 23:
                 # торгуем только в основную сессию
-                logging.info('%s не основное время %s-%s' % (self.name, last_candle.datetime.hour, last_candle.datetime.minute))
+                logging.info('%s не основное время %s-%s', self.name, last_candle.datetime.hour, last_candle.datetime.minute)
                 return
 
-        close_array = [float(c.close) for c in self.historical_ohlcv]
-        hlc3_array = [(float(c['high']) + float(c['low']) + float(c['close'])) / 3 for c in self.day_ohlc_data.values()]
+        close_array = self.get_candle_arrays().close
 
-        rsi = RSI(np.array(close_array), rsi_length)
-        sma = SMA(np.array(close_array), 14)
-        ema = EMA(np.array(hlc3_array), 14)
+        series = self.get_indicator_series()
+        rsi = indicators.rsi(close_array, rsi_length, series)
+        sma = indicators.sma(close_array, 14, series)
 
-        last_sma = Decimal(sma[-1])
-        last_ema = Decimal(ema[-1])
-        last_rsi = Decimal(rsi[-1])
+        last_sma = float(sma[-1])
+        last_ema = float(self.day_ema.value)
+        last_rsi = float(rsi[-1])
 
-        if last_sma.is_nan() or last_ema.is_nan() or last_rsi.is_nan():
+        if math.isnan(last_sma) or math.isnan(last_ema) or math.isnan(last_rsi):
             return
 
         if last_sma > last_ema:
@@ -95,22 +84,11 @@ class ElderBot(BaseBot):
         """
         # прибавляем новую свечку
         self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
         # храним только последние
         self.historical_ohlcv = self.historical_ohlcv[-5000:]
 
-        ts = candle.timestamp
-        d = date.fromtimestamp(ts)
-        self.day_ohlc_data.setdefault(d,
-              {
-                  "open": candle.open,
-                  "high": candle.high,
-                  "low": candle.low,
-                  "close": candle.close
-              }
-        )
-        self.day_ohlc_data[d]['high'] = max(self.day_ohlc_data[d]['high'], candle.high)
-        self.day_ohlc_data[d]['low'] = min(self.day_ohlc_data[d]['low'], candle.low)
-        self.day_ohlc_data[d]['close'] = candle.close
+        self.days.add_candle(candle)
 
     async def check_price(self, price):
         """
@@ -0,0 +1,164 @@
+"""
+Кеш индикаторов TA-Lib, общий для HistoricalData и ботов.
+
+Результат хранится по ключу (серия, индикатор, период) вместе с версией серии
+и входным массивом. Если у серии поменялась только последняя свеча, добавилась
+новая или окно сдвинулось на одну свечу (бот хранит последние 1000), пересчитываются
+только изменившиеся значения, а не весь массив.
+
+Серия без version определяется по содержимому: массивы одинаковой длины с одним series_id
+делят слот и сравниваются целиком, поэтому SMA(100) у ботов одного MultiBot по одним и тем же
+свечам считается один раз. series_id тут - пространство слотов (бот, инструмент): без него
+инструменты с одинаковой длиной истории вытесняли бы друг друга из общего слота.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from talib import EMA, RSI, SMA
+
+
+def _sma_update(values, result, start, length):
+    for i in range(max(start, length - 1), len(values)):
+        result[i] = values[i - length + 1:i + 1].sum() / length
+
+
+def _ema_update(values, result, start, length):
+    # как в TA-Lib: prev = (x - prev) * k + prev
+    k = 2.0 / (length + 1)
+    for i in range(start, len(values)):
+        result[i] = (values[i] - result[i - 1]) * k + result[i - 1]
+
+
+# индикатор: (функция TA-Lib, пересчет хвоста или None, зависит только от окна length)
+INDICATORS = {
+    'SMA': (SMA, _sma_update, True),
+    'EMA': (EMA, _ema_update, False),
+    'RSI': (RSI, None, False),  # сглаживание Уайлдера, без внутреннего состояния TA-Lib только целиком
+}
+
+
+class _Entry:
+    __slots__ = ('version', 'values', 'result')
+
+    def __init__(self, version, values, result):
+        self.version = version
+        self.values = values
+        self.result = result
+
+
+class IndicatorCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "partial": 0, "misses": 0}
+
+    def get(self, name, values, length, series_id=None, version=None):
+        """
+        series_id/version - например id HistoricalData и счетчик его изменений,
+        тогда при совпадении версии массивы не сравниваются.
+        series_id без version - слоты по содержимому, но свои у каждой серии (BaseBot.get_indicator_series)
+        """
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        func, update, windowed = INDICATORS[name]
+
+        by_content = version is None
+        key = (('values', series_id, n) if by_content else series_id, name, length)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            # для серий по содержимому новая свеча лежит в слоте на единицу короче
+            previous = entry
+            if by_content and n:
+                previous = self._entries.get((('values', series_id, n - 1), name, length))
+
+        # считаем без блокировки: записи не меняются, TA-Lib можно звать из нескольких потоков
+        if entry is not None:
+            if by_content and np.array_equal(entry.values, values) \
+                    or not by_content and entry.version == version and len(entry.values) == n:
+                self._count('hits')
+                return entry.result
+
+        result = None
+        if update is not None:
+            result = self._update(values, previous, update, windowed, length)
+            if result is None and previous is not entry and entry is not None:
+                result = self._update(values, entry, update, windowed, length)
+
+        if result is None:
+            self._count('misses')
+            result = func(values, length)
+        else:
+            self._count('partial')
+
+        result.flags.writeable = False
+        with self._lock:
+            self._entries[key] = _Entry(version, values.copy(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return result
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _update(values, entry, update, windowed, length):
+        """
+        Пересчет только хвоста по прошлому результату, None - если так нельзя
+        """
+        if entry is None:
+            return
+
+        n = len(values)
+        old_values = entry.values
+        old_n = len(old_values)
+        # значения, которые еще не посчитаны у прошлого результата, пересчитываем целиком
+        if n <= length or old_n < length:
+            return
+
+        if old_n == n and np.array_equal(old_values[:-1], values[:-1]):
+            # поменялась последняя свеча
+            result = entry.result.copy()
+            update(values, result, n - 1, length)
+            return result
+
+        if old_n == n - 1 and np.array_equal(old_values, values[:-1]):
+            # добавилась новая свеча
+            result = np.empty(n)
+            result[:-1] = entry.result
+            update(values, result, n - 1, length)
+            return result
+
+        if windowed and old_n == n and np.array_equal(old_values[1:], values[:-1]):
+            # окно сдвинулось на одну свечу
+            result = np.empty(n)
+            result[:length - 1] = np.nan
+            result[length - 1:-1] = entry.result[length:]
+            update(values, result, n - 1, length)
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = IndicatorCache()
+
+
+def sma(values, length, series_id=None, version=None):
+    return cache.get('SMA', values, length, series_id, version)
+
+
+def ema(values, length, series_id=None, version=None):
+    return cache.get('EMA', values, length, series_id, version)
+
+
+def rsi(values, length, series_id=None, version=None):
+    return cache.get('RSI', values, length, series_id, version)
@@ -1,31 +1,170 @@
-from bots.base import BaseBot, Signal, CloseOpenedDeal
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bots.base import BaseBot, Signal, CloseOpenedDeal, CandleArrays
+
+# rule:
+#   first - как раньше: боты по очереди, первая сделка, иначе закрытие если кто-то закрывает
+#   priority - все боты сразу, побеждает первый по порядку бот с сигналом (закрытие тоже сигнал)
+#   majority - сторона, за которую больше половины веса всех ботов
+#   unanimous - все боты за одну сторону
+RULES = ('first', 'priority', 'majority', 'unanimous')
+
+
+def _check_price_sync(bot, price):
+    """
+    check_price ботов не ждет IO, поэтому корутину можно довести до конца в потоке без event loop
+    """
+    coro = bot.check_price(price)
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError('%s.check_price ждет IO, в потоке его не выполнить' % bot.name)
 
 
 class MultiBot(BaseBot):
     min_candles = 10
     name = 'rsi_bot'
 
-    def __init__(self, *bots):
+    def __init__(self, *bots, rule='first', weights=None, threads=0):
+        """
+        weights - вес голоса каждого бота для majority
+        threads - считать ботов в пуле потоков (TA-Lib отпускает GIL)
+        """
+        if rule not in RULES:
+            raise ValueError('unknown rule %s' % rule)
+
         self.bots = bots
+        self.rule = rule
+        self.weights = weights or [1] * len(bots)
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads else None
+
+        # общий список свечей у нескольких ботов удваивает свечи в add_candle
+        seen = set()
+        for bot in bots:
+            if id(bot.historical_ohlcv) in seen:
+                bot.historical_ohlcv = list(bot.historical_ohlcv)
+            seen.add(id(bot.historical_ohlcv))
+
+        # одни свечи - один кеш индикаторов на всех
+        self.indicator_series = ('multibot', id(self))
+        for bot in bots:
+            bot.indicator_series = self.indicator_series
+
+        self.labels = ['%d:%s' % (i, bot.name) for i, bot in enumerate(bots)]
+        self.timings = {label: {"calls": 0, "total": 0.0, "last": 0.0, "max": 0.0} for label in self.labels}
+        self._share_candle_arrays()
 
     def add_candle(self, candle):
         for bot in self.bots:
             bot.add_candle(candle)
+        self._share_candle_arrays()
+
+    def _share_candle_arrays(self):
+        # снимок по самому длинному окну, остальные берут из него хвост
+        longest = max(self.bots, key=lambda b: len(b.historical_ohlcv)).historical_ohlcv
+        if not longest:
+            return
+        arrays = CandleArrays(longest)
+        for bot in self.bots:
+            bot.candle_arrays = arrays
+
+    def close(self):
+        # считающие сейчас потоки доработают сами, ждать их в event loop незачем
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        for bot in self.bots:
+            bot.close()
+
+    def _track(self, label, started):
+        elapsed = time.perf_counter() - started
+        timing = self.timings[label]
+        timing['calls'] += 1
+        timing['total'] += elapsed
+        timing['last'] = elapsed
+        timing['max'] = max(timing['max'], elapsed)
+
+    async def _vote(self, label, bot, price):
+        started = time.perf_counter()
+        try:
+            if self.executor:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, _check_price_sync, bot, price)
+            return await bot.check_price(price)
+        except CloseOpenedDeal:
+            return Signal.CLOSE
+        finally:
+            self._track(label, started)
 
     async def check_price(self, price):
+        if self.rule == 'first':
+            return await self._check_first(price)
+
+        votes = await asyncio.gather(*(
+            self._vote(label, bot, price) for label, bot in zip(self.labels, self.bots)
+        ))
+
+        if self.rule == 'priority':
+            winner = next((vote for vote in votes if vote), None)
+        else:
+            winner = self._count(votes)
+
+        if winner is Signal.CLOSE:
+            raise CloseOpenedDeal()
+        return winner
+
+    async def _check_first(self, price):
         close = None
 
-        for bot in self.bots:
+        for label, bot in zip(self.labels, self.bots):
+            started = time.perf_counter()
             try:
                 deal = await bot.check_price(price)
                 if deal:
                     return deal
             except CloseOpenedDeal:
                 close = Signal.CLOSE
+            finally:
+                self._track(label, started)
 
         if close:
             raise CloseOpenedDeal()
 
+    def _count(self, votes):
+        """
+        Сделка (первая по порядку) или закрытие, за которые проголосовали по правилу
+        """
+        sides = {}
+        for vote, weight in zip(votes, self.weights):
+            if vote:
+                side = Signal.CLOSE.value if vote is Signal.CLOSE else vote.side
+                sides.setdefault(side, [0, vote])
+                sides[side][0] += weight
+
+        total = sum(self.weights)
+        for side, (weight, vote) in sides.items():
+            if self.rule == 'majority' and weight > total / 2 \
+                    or self.rule == 'unanimous' and weight == total:
+                return vote
+
+    def get_timings(self):
+        """
+        Среднее, последнее и максимальное время check_price каждого бота, мс
+        """
+        return {
+            label: {
+                "calls": t['calls'],
+                "avg_ms": t['total'] / t['calls'] * 1000 if t['calls'] else 0,
+                "last_ms": t['last'] * 1000,
+                "max_ms": t['max'] * 1000,
+            }
+            for label, t in self.timings.items()
+        }
+
     async def check_deal(self, current_price, deal):
         return False
 
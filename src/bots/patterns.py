@@ -0,0 +1,102 @@
+"""
+Свечные паттерны по numpy массивам OHLC: то же, что свойства CandleStick
+(body_type, тени, пинбары), но сразу для всех свечей.
+
+Для истории в бэктесте передаются массивы целиком, для живой проверки -
+хвост нужной длины (arrays.close[-4:] и т.п.), код один и тот же.
+"""
+import numpy as np
+
+# направление в массивах, как Signal.BUY/Signal.SELL
+UP, DOWN = 1, -1
+# допуск сравнений: цены float, и 1.23456 - 1.23454 чуть больше 0.00002
+EPSILON = 1e-9
+
+
+def body_type(open, close):
+    """
+    1 - зеленое тело, -1 - красное, 0 - нет тела
+    """
+    return np.sign(close - open).astype(np.int8)
+
+
+def body_size(open, close):
+    return np.abs(close - open)
+
+
+def upper_shadow(open, high, close):
+    # у свечи без тела нет и теней, как в CandleStick
+    return np.where(close != open, high - np.maximum(open, close), 0.0)
+
+
+def lower_shadow(open, low, close):
+    return np.where(close != open, np.minimum(open, close) - low, 0.0)
+
+
+def shadows(open, high, low, close):
+    """
+    (длинная тень, короткий хвост) каждой свечи
+    """
+    upper = upper_shadow(open, high, close)
+    lower = lower_shadow(open, low, close)
+    return np.maximum(upper, lower), np.minimum(upper, lower)
+
+
+def price_range(open, high, low, close):
+    """
+    min и max из open/high/low/close, как CandleStick.price_range
+    """
+    return np.minimum.reduce([open, high, low, close]), np.maximum.reduce([open, high, low, close])
+
+
+def full_size(open, high, low, close):
+    low, high = price_range(open, high, low, close)
+    return high - low
+
+
+def is_pinbar(open, high, low, close):
+    shadow, tail = shadows(open, high, low, close)
+    return shadow - body_size(open, close) > EPSILON
+
+
+def is_long_pinbar(open, high, low, close, coef=2):
+    shadow, tail = shadows(open, high, low, close)
+    return shadow - (body_size(open, close) + tail) * coef > EPSILON
+
+
+def pinbar_direction(open, high, low, close):
+    """
+    DOWN, если верхняя тень длиннее (пинбар смотрит вниз), иначе UP
+    """
+    upper = upper_shadow(open, high, close)
+    lower = lower_shadow(open, low, close)
+    return np.where(upper - lower > EPSILON, DOWN, UP).astype(np.int8)
+
+
+def trend(values, length):
+    """
+    Монотонность окна из length значений, заканчивающегося на каждой свече:
+    UP - не убывает, DOWN - не возрастает, 0 - нет тренда, NaN в окне или окно не набралось.
+    Как helpers.get_trend_for, но для всех окон одним проходом
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    result = np.zeros(n, dtype=np.int8)
+    if n < length or length < 1:
+        return result
+
+    diff = np.diff(values)
+    # счетчики нарушений по префиксу: падений, ростов и NaN
+    falls = np.r_[0, np.cumsum(diff < 0)]
+    rises = np.r_[0, np.cumsum(diff > 0)]
+    nans = np.r_[0, np.cumsum(np.isnan(values))]
+
+    # окно [i - length + 1, i] содержит разности с индексами i - length + 1 .. i - 1
+    end = np.arange(length - 1, n)
+    start = end - length + 1
+    no_nan = nans[end + 1] - nans[start] == 0
+    up = falls[end] - falls[start] == 0
+    down = rises[end] - rises[start] == 0
+    result[length - 1:] = np.where(no_nan & up, UP, np.where(no_nan & down, DOWN, 0))
+    return result
+
@@ -0,0 +1,99 @@
+"""
+Боты и money manager по имени, для конфига трейдеров (settings/traders.json).
+
+    "bot": {
+        "class": "stock_bot",
+        "params": {"upper_band": 73, "lower_band": 28, "close_signal": "close"},
+        "money_manager": {"class": "simple", "order_amount": 300, "diff": 0.2,
+                          "stop_loss_factor": 1, "take_profit_factor": 8}
+    }
+
+MultiBot - "class": "multibot", "bots": [...], "rule", "weights", "threads" как у MultiBot.
+StrategyBot - "class": "strategy_bot", "spec": имя из SPECS.
+Свой бот подключается через @register_bot('name').
+"""
+from bots.base import Signal
+from bots.elder_bot.bot import ElderBot
+from bots.multibot.bot import MultiBot
+from bots.rsi_bot.bot import RsiBot
+from bots.sma_trend_bot.bot import SmaTrendBot
+from bots.stock_bot.bot import StockBot
+from bots.stock_sma_bot.bot import StockSmaBot
+from bots.strategy_bot import StrategyBot
+from bots.strategy_bot.specs import SPECS
+from bots.stupid_bot import StupidBot
+from bots.stupid_bot.money_manager import SimpleMoneyManager, AtrMoneyManager
+
+BOTS = {
+    'rsi_bot': RsiBot,
+    'stock_bot': StockBot,
+    'stock_sma_bot': StockSmaBot,
+    'elder_bot': ElderBot,
+    'sma_trend_bot': SmaTrendBot,
+    'stupid_bot': StupidBot,
+    'strategy_bot': StrategyBot,
+}
+
+MONEY_MANAGERS = {
+    'simple': SimpleMoneyManager,
+    'atr': AtrMoneyManager,
+}
+
+# параметры-сигналы приходят из конфига строками
+SIGNAL_PARAMS = ('close_signal',)
+
+
+def register_bot(name):
+    def decorator(cls):
+        BOTS[name] = cls
+        return cls
+    return decorator
+
+
+def make_money_manager(config, api=None, rates=None, currency=None):
+    """
+    currency - валюта инструмента из конфига трейдера, rates - FxRates счета
+    """
+    config = dict(config)
+    cls = MONEY_MANAGERS[config.pop('class', 'simple')]
+    if cls is AtrMoneyManager:
+        if api is not None:
+            # equity из summary счета
+            config.setdefault('api', api)
+        if rates is not None:
+            # стоп в валюте инструмента переводим в валюту счета
+            config.setdefault('rates', rates)
+            config.setdefault('currency', currency)
+    return cls(**config)
+
+
+def bot_params(params):
+    params = dict(params or {})
+    for key in SIGNAL_PARAMS:
+        if isinstance(params.get(key), str):
+            params[key] = Signal(params[key])
+    return params
+
+
+def make_bot(config, historical_ohlcv=None, api=None, rates=None, currency=None):
+    """
+    Бот по секции "bot" конфига трейдера, историю получает как прежде bot_factory
+    """
+    name = config['class']
+    if name == 'multibot':
+        bots = [make_bot(bot_config, historical_ohlcv, api, rates, currency) for bot_config in config['bots']]
+        return MultiBot(*bots, rule=config.get('rule', 'first'), weights=config.get('weights'),
+                        threads=config.get('threads', 0))
+
+    if name not in BOTS:
+        raise ValueError('unknown bot %s, known: %s' % (name, ', '.join(sorted(BOTS))))
+
+    kwargs = bot_params(config.get('params'))
+    if name == 'strategy_bot':
+        kwargs['spec'] = SPECS[config.get('spec', 'rsi_bot')]
+
+    return BOTS[name](
+        money_manager=make_money_manager(config.get('money_manager', {}), api, rates, currency),
+        historical_ohlcv=historical_ohlcv,
+        **kwargs
+    )
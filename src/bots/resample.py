@@ -0,0 +1,218 @@
+"""
+Инкрементальная пересборка свечей в старший таймфрейм (5m -> 1h -> 1d)
+и потоковые индикаторы по старшим свечам.
+
+Каждая базовая свеча - O(1): границы текущей старшей свечи закешированы,
+поэтому datetime/таймзона считаются только при переходе в новую свечу,
+а индикаторы пересчитывают одно последнее значение.
+"""
+import math
+from collections import OrderedDict
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+DAY = 24 * 60 * 60
+
+
+def hlc3(bar):
+    return (float(bar['high']) + float(bar['low']) + float(bar['close'])) / 3
+
+
+def close(bar):
+    return float(bar['close'])
+
+
+def hlc(bar):
+    return float(bar['high']), float(bar['low']), float(bar['close'])
+
+
+class StreamingEma:
+    """
+    EMA как у TA-Lib (первое значение - SMA первых length), но по одному значению:
+    push - новая свеча, replace - поменялась последняя
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.k = 2.0 / (length + 1)
+        self.count = 0
+        self.value = math.nan
+        self._sum = 0.0  # сумма закрытых значений, пока копим первое SMA
+        self._prev = math.nan  # EMA на закрытии предыдущей свечи
+        self._last = None
+
+    def push(self, x):
+        if self.count:
+            if self.count < self.length:
+                self._sum += self._last
+            self._prev = self.value
+        self.count += 1
+        self.replace(x)
+
+    def replace(self, x):
+        self._last = x
+        if self.count < self.length:
+            self.value = math.nan
+        elif self.count == self.length:
+            self.value = (self._sum + x) / self.length
+        else:
+            self.value = (x - self._prev) * self.k + self._prev
+
+
+class StreamingAtr:
+    """
+    ATR как у TA-Lib (первое значение - среднее TR первых length, дальше сглаживание Уайлдера),
+    push/replace принимают (high, low, close)
+    """
+
+    def __init__(self, length=14):
+        self.length = length
+        self.count = 0
+        self.value = math.nan
+        self._sum = 0.0  # сумма закрытых TR, пока копим первое среднее
+        self._prev = math.nan  # ATR на закрытии предыдущей свечи
+        self._prev_close = None  # close предыдущей свечи
+        self._last = None  # (close, tr) текущей свечи
+
+    def push(self, bar):
+        if self._last is not None:
+            last_close, last_tr = self._last
+            # у первой свечи TR нет
+            if 1 < self.count <= self.length:
+                self._sum += last_tr
+            self._prev = self.value
+            self._prev_close = last_close
+        self.count += 1
+        self.replace(bar)
+
+    def replace(self, bar):
+        high, low, close = bar
+        tr = math.nan
+        if self._prev_close is not None:
+            tr = max(high, self._prev_close) - min(low, self._prev_close)
+        self._last = (close, tr)
+
+        if self.count <= self.length:
+            self.value = math.nan
+        elif self.count == self.length + 1:
+            self.value = (self._sum + tr) / self.length
+        else:
+            self.value = (self._prev * (self.length - 1) + tr) / self.length
+
+
+class Resampler:
+    """
+    interval - секунды старшего таймфрейма, DAY и больше - дневные свечи с ключом date.
+    tz - таймзона границ (None - локальное время, как date.fromtimestamp),
+    session_start - сдвиг начала дня в секундах (форекс день с 17:00 Нью-Йорка и т.п.)
+
+    bars - OrderedDict ключ -> {"open", "high", "low", "close"}, как day_ohlc_data
+    """
+
+    def __init__(self, interval, tz=None, session_start=0, maxlen=None):
+        self.interval = interval
+        self.tz = ZoneInfo(tz) if isinstance(tz, str) else tz
+        self.session_start = session_start
+        self.maxlen = maxlen
+        self.bars = OrderedDict()
+        self.last_key = None
+        self._key = None
+        self._start = None
+        self._end = None
+        self._indicators = []
+
+    def add_indicator(self, indicator, source=close):
+        """
+        Индикатор с push/replace, кормится source(bar) на каждой базовой свече
+        """
+        self._indicators.append((indicator, source))
+        for bar in self.bars.values():
+            indicator.push(source(bar))
+        return indicator
+
+    def _bucket(self, ts):
+        """
+        Ключ старшей свечи и ее границы [start, end) в unix time
+        """
+        if self.interval >= DAY:
+            shifted = datetime.fromtimestamp(ts - self.session_start, self.tz)
+            day = shifted.date()
+            # без tz - наивная полночь, timestamp() считает ее в локальном времени
+            start = datetime.combine(day, dt_time(), self.tz).timestamp()
+            end = datetime.combine(day + timedelta(days=1), dt_time(), self.tz).timestamp()
+            return day, start + self.session_start, end + self.session_start
+
+        # внутри дня выравниваем по местному времени, чтобы 1h у +05:30 начинался в :00
+        offset = 0
+        if self.tz is not None:
+            offset = int(datetime.fromtimestamp(ts, self.tz).utcoffset().total_seconds())
+        start = (ts + offset - self.session_start) // self.interval * self.interval - offset + self.session_start
+        return start, start, start + self.interval
+
+    def add(self, ts, open, high, low, close):
+        """
+        Базовая свеча (или ее обновление) -> True, если началась новая старшая свеча
+        """
+        if self._start is None or not self._start <= ts < self._end:
+            self._key, self._start, self._end = self._bucket(ts)
+        key = self._key
+
+        bar = self.bars.get(key)
+        is_new = bar is None
+        if is_new:
+            bar = {"open": open, "high": high, "low": low, "close": close}
+            self.bars[key] = bar
+            self.last_key = key
+            if self.maxlen and len(self.bars) > self.maxlen:
+                self.bars.popitem(last=False)
+        else:
+            if high > bar['high']:
+                bar['high'] = high
+            if low < bar['low']:
+                bar['low'] = low
+            bar['close'] = close
+
+        if key != self.last_key:
+            # поправка уже закрытой свечи, потоковые индикаторы ее не пересчитывают
+            return is_new
+
+        for indicator, source in self._indicators:
+            if is_new:
+                indicator.push(source(bar))
+            else:
+                indicator.replace(source(bar))
+
+        return is_new
+
+    def add_candle(self, candle):
+        return self.add(candle.timestamp, candle.open, candle.high, candle.low, candle.close)
+
+    @property
+    def last_bar(self):
+        if self.last_key is None:
+            return None
+        return self.bars[self.last_key]
+
+
+class MultiTimeframe:
+    """
+    Несколько старших таймфреймов от одной базовой свечи: MultiTimeframe(3600, DAY)
+    """
+
+    def __init__(self, *intervals, tz=None, session_start=0, maxlen=None):
+        self.resamplers = OrderedDict(
+            (interval, Resampler(interval, tz=tz, session_start=session_start, maxlen=maxlen))
+            for interval in intervals
+        )
+
+    def __getitem__(self, interval):
+        return self.resamplers[interval]
+
+    def add(self, ts, open, high, low, close):
+        return {
+            interval: resampler.add(ts, open, high, low, close)
+            for interval, resampler in self.resamplers.items()
+        }
+
+    def add_candle(self, candle):
+        return self.add(candle.timestamp, candle.open, candle.high, candle.low, candle.close)
@@ -1,8 +1,6 @@
 from typing import Union, List
 
-import numpy as np
-from talib import RSI, SMA
-
+from bots import indicators
 from bots.base import Result, BaseBot, Signal, Deal
 from helpers import get_trend_for, max_diff
 
@@ -20,6 +18,7 @@ class RsiBot(BaseBot):
         # прошедшие данные
         self.historical_ohlcv = historical_ohlcv or []
         self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
         self.params = params
 
         self.overbought = False
@@ -35,8 +34,8 @@ class RsiBot(BaseBot):
         upper_band = self.params.get('upper_band', 75)
         lower_band = self.params.get('lower_band', 25)
 
-        close_array = [float(c.close) for c in self.historical_ohlcv]
-        rsi = RSI(np.array(close_array), rsi_length)
+        close_array = self.get_candle_arrays().close
+        rsi = indicators.rsi(close_array, rsi_length, self.get_indicator_series())
 
         # sma = SMA(np.array(close_array))
         # sma_diff = max_diff(sma[-3:])
@@ -80,6 +79,7 @@ class RsiBot(BaseBot):
         """
         # прибавляем новую свечку
         self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
         # храним только последние 1000
         self.historical_ohlcv = self.historical_ohlcv[-1000:]
 
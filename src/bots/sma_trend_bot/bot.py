@@ -1,8 +1,6 @@
 from typing import Union, List
 
-import numpy as np
-from talib import RSI, SMA
-
+from bots import indicators
 from bots.base import Result, BaseBot, Signal, Deal, CloseOpenedDeal
 from helpers import get_trend_for, max_diff
 
@@ -20,6 +18,7 @@ class SmaTrendBot(BaseBot):
         # прошедшие данные
         self.historical_ohlcv = historical_ohlcv or []
         self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
         self.params = params
 
     async def _test_price(self, price) -> Union[Result, None]:
@@ -37,10 +36,11 @@ class SmaTrendBot(BaseBot):
                 # торгуем только в основную сессию
                 return
 
-        close_array = [float(c.close) for c in self.historical_ohlcv]
-        sma_100 = SMA(np.array(close_array), 100)
-        sma_50 = SMA(np.array(close_array), 50)
-        sma_30 = SMA(np.array(close_array), 30)
+        close_array = self.get_candle_arrays().close
+        series = self.get_indicator_series()
+        sma_100 = indicators.sma(close_array, 100, series)
+        sma_50 = indicators.sma(close_array, 50, series)
+        sma_30 = indicators.sma(close_array, 30, series)
 
         j = -trend_len - 1
         had_trend = sma_100[j] > sma_50[j] > sma_30[j] or sma_100[j] < sma_50[j] < sma_30[j]
@@ -77,6 +77,7 @@ class SmaTrendBot(BaseBot):
         """
         # прибавляем новую свечку
         self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
         # храним только последние 1000
         self.historical_ohlcv = self.historical_ohlcv[-1000:]
 
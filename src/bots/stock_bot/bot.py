@@ -1,9 +1,9 @@
 import logging
 from typing import Union, List
 
-import numpy as np
-from talib import RSI, SMA, ADX, ADXR
+from talib import ADX, ADXR
 
+from bots import indicators
 from bots.base import Result, BaseBot, Signal, Deal, CloseOpenedDeal
 
 
@@ -15,6 +15,7 @@ class StockBot(BaseBot):
         # прошедшие данные
         self.historical_ohlcv = historical_ohlcv or []
         self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
         self.params = params
 
         self.overbought = False
@@ -37,7 +38,7 @@ class StockBot(BaseBot):
 
         has_trend = False
         trend_signal = None
-        close_array = [float(c.close) for c in self.historical_ohlcv]
+        close_array = self.get_candle_arrays().close
 
         if only_main_session:
             last_candle = self.get_last_candle()
@@ -45,10 +46,10 @@ class StockBot(BaseBot):
                     or (last_candle.datetime.hour == 16 and last_candle.datetime.minute < 30) \
                     or last_candle.datetime.hour >= 23:
                 # торгуем только в основную сессию
-                logging.info('%s не основное время %s-%s' % (self.name, last_candle.datetime.hour, last_candle.datetime.minute))
+                logging.info('%s не основное время %s-%s', self.name, last_candle.datetime.hour, last_candle.datetime.minute)
                 return
 
-        rsi = RSI(np.array(close_array), rsi_length)
+        rsi = indicators.rsi(close_array, rsi_length, self.get_indicator_series())
 
         if check_trend:
             # sma_100 = SMA(np.array(close_array), 100)
@@ -64,20 +65,9 @@ class StockBot(BaseBot):
             #         if not (sma_100[-i] > sma_50[-i] > sma_30[-i] or sma_100[-i] < sma_50[-i] < sma_30[-i]):
             #             has_trend = False
             #             break
-            high_array = [float(c.high) for c in self.historical_ohlcv]
-            low_array = [float(c.low) for c in self.historical_ohlcv]
-            adx = ADX(
-                np.array(high_array),
-                np.array(low_array),
-                np.array(close_array),
-                14
-            )
-            adxr = ADXR(
-                np.array(high_array),
-                np.array(low_array),
-                np.array(close_array),
-                14
-            )
+            arrays = self.get_candle_arrays()
+            adx = ADX(arrays.high, arrays.low, arrays.close, 14)
+            adxr = ADXR(arrays.high, arrays.low, arrays.close, 14)
             last_adx = adx[-1]
             last_adxr = adxr[-1]
             if last_adx > max_adx > last_adxr:
@@ -88,7 +78,7 @@ class StockBot(BaseBot):
                 return None
 
         order_type = False
-        logging.info('%s rsi[-3] %s' % (self.name, rsi[-3]))
+        logging.info('%s rsi[-3] %s', self.name, rsi[-3])
         if not self.overbought and not self.oversold:
             # смотрим не вышел ли RSI за нужные нам пределы
             last_rsi = rsi[-3]
@@ -107,7 +97,7 @@ class StockBot(BaseBot):
         # мы уже в зоне перекупленности/перепроданности
         # ждем когда индикатор вернется обратно, чтобы открыть сделку
         current_rsi = rsi[-2]
-        logging.info('%s rsi[-2] %s' % (self.name, rsi[-2]))
+        logging.info('%s rsi[-2] %s', self.name, rsi[-2])
         if self.overbought:
             if current_rsi <= upper_band:
                 self.overbought = False
@@ -129,6 +119,7 @@ class StockBot(BaseBot):
         """
         # прибавляем новую свечку
         self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
         # храним только последние 1000
         self.historical_ohlcv = self.historical_ohlcv[-1000:]
 
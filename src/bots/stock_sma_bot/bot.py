@@ -1,9 +1,7 @@
 import logging
 from typing import Union, List
 
-import numpy as np
-from talib import RSI, SMA
-
+from bots import indicators
 from bots.base import Result, BaseBot, Signal, Deal, CloseOpenedDeal
 from helpers import get_trend_for
 
@@ -16,6 +14,7 @@ class StockSmaBot(BaseBot):
         # прошедшие данные
         self.historical_ohlcv = historical_ohlcv or []
         self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
         self.params = params
 
         self.overbought = False
@@ -24,7 +23,7 @@ class StockSmaBot(BaseBot):
     async def _test_price(self, price) -> Union[Result, None]:
         if len(self.historical_ohlcv) < self.min_candles:
             # недостаточно свечек для принятия решения
-            logging.info('%s недостаточно свечек %d' % (self.name, len(self.historical_ohlcv)))
+            logging.info('%s недостаточно свечек %d', self.name, len(self.historical_ohlcv))
             return
 
         is_short_allowed = self.params.get('is_short_allowed', False)
@@ -41,13 +40,14 @@ class StockSmaBot(BaseBot):
                     or (last_candle.datetime.hour == 16 and last_candle.datetime.minute < 30) \
                     or last_candle.datetime.hour >= 23:
                 # торгуем только в основную сессию
-                logging.info('%s не основное время %s-%s' % (self.name, last_candle.datetime.hour, last_candle.datetime.minute))
+                logging.info('%s не основное время %s-%s', self.name, last_candle.datetime.hour, last_candle.datetime.minute)
                 return
 
-        close_array = [float(c.close) for c in self.historical_ohlcv]
-        sma_high = SMA(np.array(close_array), high_sma_value)
-        sma_middle = SMA(np.array(close_array), middle_sma_value)
-        sma_low = SMA(np.array(close_array), low_sma_value)
+        close_array = self.get_candle_arrays().close
+        series = self.get_indicator_series()
+        sma_high = indicators.sma(close_array, high_sma_value, series)
+        sma_middle = indicators.sma(close_array, middle_sma_value, series)
+        sma_low = indicators.sma(close_array, low_sma_value, series)
 
         # sma_300 = SMA(np.array(close_array), 300)
         # main_trend = get_trend_for(list(sma_300[-3:]))
@@ -65,20 +65,20 @@ class StockSmaBot(BaseBot):
 
         order_type = None
         if has_trend:
-            logging.info('%s has trend' % self.name)
+            logging.info('%s has trend', self.name)
             if sma_high[-1] > sma_middle[-1] > sma_low[-1]:
                 if price > sma_low[-1] and price < sma_middle[-1]:
                     order_type = Signal.SELL if is_short_allowed else close_signal
                 else:
-                    logging.info('%s price=%s, sma_30=%s, sma_50=%s' % (self.name, price, sma_low[-1], sma_middle[-1]))
+                    logging.info('%s price=%s, sma_30=%s, sma_50=%s', self.name, price, sma_low[-1], sma_middle[-1])
             else:
                 order_type = Signal.BUY
                 if price < sma_low[-1] and price > sma_middle[-1]:
                     order_type = Signal.BUY
                 else:
-                    logging.info('%s price=%s, sma_30=%s, sma_50=%s' % (self.name, price, sma_low[-1], sma_middle[-1]))
+                    logging.info('%s price=%s, sma_30=%s, sma_50=%s', self.name, price, sma_low[-1], sma_middle[-1])
         else:
-            logging.info('%s no trend' % self.name)
+            logging.info('%s no trend', self.name)
             if not (sma_high[-1] > sma_middle[-1] > sma_low[-1] or sma_high[-1] < sma_middle[-1] < sma_low[-1]):
                 order_type = close_signal
 
@@ -94,6 +94,7 @@ class StockSmaBot(BaseBot):
         """
         # прибавляем новую свечку
         self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
         # храним только последние 1000
         self.historical_ohlcv = self.historical_ohlcv[-1000:]
 
@@ -0,0 +1 @@
+from .bot import StrategyBot
@@ -0,0 +1,108 @@
+import logging
+from typing import Union, List
+
+import numpy as np
+
+from bots.base import Result, BaseBot, Signal, Deal, CloseOpenedDeal, CandleArrays
+from bots.strategy_bot.specs import RSI_BOT
+from bots.strategy_bot.strategy import compile_strategy, SIGNALS
+
+
+class StrategyBot(BaseBot):
+    """
+    Бот по декларативной стратегии (bots/strategy_bot/specs.py).
+    Стратегия компилируется один раз в __init__, на свече считаются только правила
+    по хвосту индикаторов. precompute(candles) - сигналы по всем свечам бэктеста сразу
+    """
+
+    def __init__(self, money_manager, historical_ohlcv: List = None, spec=RSI_BOT, **params):
+        # прошедшие данные
+        self.historical_ohlcv = historical_ohlcv or []
+        self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
+        self.params = params
+
+        self.strategy = compile_strategy(spec, **params)
+        self.name = self.strategy.name
+        self.min_candles = self.strategy.min_candles
+        self.evaluator = self.strategy.streaming()
+        self.signals = None  # ts свечи -> код сигнала после precompute
+
+    def precompute(self, candles):
+        """
+        Сигналы по всем свечам бэктеста пакетно, цена сделки - close свечи.
+        Совпадают с потоковыми, если history_size=None (иначе RSI/EMA по обрезанной истории другие)
+        """
+        arrays = CandleArrays(candles)
+        codes = self.strategy.vectorized(arrays)
+        self.signals = dict(zip(arrays.timestamp.astype(np.int64).tolist(), codes.tolist()))
+        return codes
+
+    async def _test_price(self, price) -> Union[Result, None]:
+        if len(self.historical_ohlcv) < self.min_candles:
+            # недостаточно свечек для принятия решения
+            return
+
+        if self.signals is not None:
+            signal = SIGNALS[self.signals.get(int(self.get_last_candle().timestamp), 0)]
+        else:
+            signal = self.evaluator.step(self.get_candle_arrays(), price, self.get_last_candle().timestamp,
+                                         self.get_indicator_series())
+
+        if signal:
+            logging.info('%s %s', self.name, signal.value)
+            return Result(signal=signal, price=price)
+
+    def add_candle(self, candle):
+        """
+        Последняя свеча в OHLCV формате,
+        добавляется в конец исторических данных
+
+        self.historical_ohlcv.append(ohlcv)
+        """
+        # прибавляем новую свечку
+        self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
+        # храним только последние history_size
+        if self.strategy.history_size:
+            self.historical_ohlcv = self.historical_ohlcv[-self.strategy.history_size:]
+
+    async def check_price(self, price):
+        """
+        Проверяем текущую цену,
+        решаем входить или не входить в сделку
+
+        сохраняем в self.last_price
+        возвращает Deal
+        """
+        self.last_price = price
+
+        result = await self._test_price(price)
+
+        if result:
+            if result.signal == Signal.CLOSE:
+                raise CloseOpenedDeal()
+
+            return Deal(**{
+                "price": result.price,
+                "amount": self.money_manager.get_order_amount(),  # amount в base_currency сколько купили
+                "stop_loss": self.money_manager.get_stop_loss(result.signal, result.price),
+                "take_profit": self.money_manager.get_take_profit(result.signal, result.price),
+                "side": result.signal.value,
+                "status": "open",
+            })
+
+    async def check_deal(self, current_price, deal):
+        """
+        Проверяем ордер,
+        надо ли поменять SL или TP или закрыть по рынку
+        """
+        return await self.money_manager.trailing_stop_check(current_price, deal)
+
+    @property
+    def last_candle(self):
+        return self.get_last_candle()
+
+    def get_last_candle(self):
+        if self.historical_ohlcv:
+            return self.historical_ohlcv[-1]
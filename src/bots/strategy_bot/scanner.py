@@ -0,0 +1,226 @@
+"""
+Сканер инструментов: одна декларативная стратегия (specs.py) сразу по тысячам символов.
+
+Свечи всех инструментов лежат в матрицах (инструмент, свеча) на общей сетке времени
+с шагом interval, последняя колонка - последняя закрытая свеча. На инструмент это
+window float64 на каждое поле, которое нужно стратегии, плюс пара счетчиков
+и int8 состояния полос, поэтому тысячи инструментов помещаются в один процесс.
+
+Индикаторы считает TA-Lib по строке инструмента, правила - сразу по всем инструментам
+тем же скомпилированным кодом, что и в Strategy. Инструмент без свечи на очередном
+интервале получает плоскую свечу по прошлому close и в кандидаты не попадает.
+"""
+import numpy as np
+
+from bots.indicators import INDICATORS
+from bots.strategy_bot.strategy import compile_strategy, HLC_INDICATORS, SIGNALS, NONE, BUY, SELL, \
+    _session_minutes
+
+
+def _band_step(state, prev, cur, upper, lower):
+    """
+    strategy._band_step сразу для всех инструментов
+    """
+    state = np.where(state == 0, np.where(prev >= upper, 1, np.where(prev <= lower, -1, 0)), state)
+    sell = (state == 1) & (cur <= upper)
+    buy = (state == -1) & (cur >= lower)
+    state = np.where(sell | buy, 0, state).astype(np.int8)
+    return state, np.where(sell, SELL, np.where(buy, BUY, NONE)).astype(np.int8)
+
+
+class Scanner:
+    """
+    symbols - список инструментов, interval - секунды свечи, window - свечей в памяти на инструмент,
+    params - как у StrategyBot. Порядок работы:
+      scanner.start(last_ts); scanner.load(symbol, ohlcv) для каждого; scanner.warmup()
+      на каждой закрытой свече: scanner.push(ts, {symbol: bar}); scanner.scan()
+    """
+
+    def __init__(self, symbols, spec, interval, window=300, **params):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.interval = interval
+        self.window = window
+        self.strategy = compile_strategy(spec, **params)
+        if window < self.strategy.min_candles + self.strategy.lookback:
+            raise ValueError('window %s is shorter than min_candles + lookback' % window)
+
+        fields = set(self.strategy.fields) | {'close'}
+        if any(kind in HLC_INDICATORS for kind, length in self.strategy.indicators.values()):
+            fields |= {'high', 'low'}
+
+        n = len(self.symbols)
+        self.data = {field: np.full((n, window), np.nan) for field in sorted(fields)}
+        self.last_ts = None  # время последней колонки
+        self.bar_ts = np.zeros(n, dtype=np.int64)  # время последней настоящей свечи инструмента
+        self.rows = np.zeros(n, dtype=np.int32)  # колонок с первой свечи инструмента, не больше window
+        self.states = {}  # индекс правила band -> состояние по инструментам
+
+    @property
+    def nbytes(self):
+        return sum(m.nbytes for m in self.data.values()) + self.bar_ts.nbytes + self.rows.nbytes \
+            + sum(s.nbytes for s in self.states.values())
+
+    def start(self, last_ts):
+        """
+        last_ts - время последней закрытой свечи в секундах
+        """
+        self.last_ts = last_ts // self.interval * self.interval
+
+    def load(self, symbol, ohlcv):
+        """
+        История инструмента как ее отдает get_ohlcv, незакрытая свеча (позже last_ts) пропускается
+        """
+        i = self.index[symbol]
+        for row in ohlcv:
+            ts = row['timestamp'] // 1000
+            column = self.window - 1 - (self.last_ts - ts) // self.interval
+            if ts > self.last_ts or column < 0:
+                continue
+            for field, matrix in self.data.items():
+                matrix[i, column] = float(row[field])
+
+    def warmup(self):
+        """
+        Заполняет пропуски после load и прогоняет полосы по всему окну
+        """
+        close = self.data['close']
+        real = ~np.isnan(close)
+        columns = np.arange(self.window)
+        last_real = np.maximum.accumulate(np.where(real, columns, -1), axis=1)
+        has_data = last_real[:, -1] >= 0
+        first = np.where(has_data, np.argmax(real, axis=1), self.window)
+
+        # пропуск - плоская свеча по последнему close
+        gaps = ~real & (last_real >= 0)
+        filled = np.take_along_axis(close, np.maximum(last_real, 0), axis=1)
+        for matrix in self.data.values():
+            matrix[gaps] = filled[gaps]
+
+        self.rows = (self.window - first).astype(np.int32)
+        self.bar_ts = np.where(has_data, self.last_ts - (self.window - 1 - last_real[:, -1]) * self.interval, 0)
+
+        strategy = self.strategy
+        active = real & (columns >= first[:, None] + strategy.min_candles - 1)
+        if strategy.session is not None:
+            ts = self.last_ts - (self.window - 1 - columns) * self.interval
+            active &= strategy.session_mask(ts)[None, :]
+        self.states = {}
+        self._evaluate(self.window, active.T)
+
+    def push(self, ts, bars):
+        """
+        ts - время новой закрытой свечи, bars - {symbol: {"open", "high", "low", "close"}} на это время.
+        Тот же ts еще раз - поправка последней свечи
+        """
+        ts = ts // self.interval * self.interval
+        shift = min((ts - self.last_ts) // self.interval, self.window)
+        if shift < 0:
+            return
+        if shift:
+            close = self.data['close']
+            last_close = close[:, -1].copy()
+            for matrix in self.data.values():
+                matrix[:, :-shift] = matrix[:, shift:]
+                matrix[:, -shift:] = last_close[:, None]
+            self.rows = np.where(self.rows > 0, np.minimum(self.rows + shift, self.window), 0).astype(np.int32)
+            self.last_ts = ts
+
+        index = np.fromiter((self.index[symbol] for symbol in bars), dtype=np.int64, count=len(bars))
+        if not len(index):
+            return
+        for field, matrix in self.data.items():
+            matrix[index, -1] = np.fromiter((float(bar[field]) for bar in bars.values()), dtype=float,
+                                            count=len(bars))
+        self.bar_ts[index] = ts
+        self.rows[index] = np.maximum(self.rows[index], 1)
+
+    def _indicators(self, size):
+        """
+        Хвосты индикаторов длиной size, (инструмент, свеча). Каждый инструмент считается
+        со своей первой свечи, как у бота с такой историей
+        """
+        series = {}
+        starts = self.window - self.rows
+        for name, (kind, length) in self.strategy.indicators.items():
+            result = np.full((len(self.symbols), size), np.nan)
+            for i in np.flatnonzero(self.rows):
+                start = starts[i]
+                if kind in HLC_INDICATORS:
+                    values = HLC_INDICATORS[kind](self.data['high'][i, start:], self.data['low'][i, start:],
+                                                  self.data['close'][i, start:], length)
+                else:
+                    values = INDICATORS[kind][0](self.data['close'][i, start:], length)
+                tail = values[-size:]
+                result[i, size - len(tail):] = tail
+            series[name] = result
+        return series
+
+    def _evaluate(self, size, active):
+        """
+        Strategy._run на матрицах (свеча, инструмент) из последних size свечей
+        """
+        strategy = self.strategy
+        n = len(self.symbols)
+        ctx = {field: self.data[field][:, -size:].T for field in strategy.fields}
+        ctx['price'] = self.data['close'][:, -size:].T
+        ctx['series'] = {name: values.T for name, values in self._indicators(size).items()}
+
+        codes = np.zeros((size, n), dtype=np.int8)
+        decided = ~active
+        for index, rule in enumerate(strategy.rules):
+            if rule[0] == 'when':
+                _, func, code = rule
+                matched = np.broadcast_to(func(ctx), decided.shape) & ~decided
+                codes[matched] = code
+                decided = decided | matched
+                continue
+
+            _, name, lag, upper, lower, buy, sell = rule
+            values = ctx['series'][name]
+            state = self.states.get(index, np.zeros(n, dtype=np.int8))
+            for i in range(1 + lag, size):
+                todo = ~decided[i]
+                if not todo.any():
+                    continue
+                new_state, code = _band_step(state, values[i - 1 - lag], values[i - lag], upper, lower)
+                state = np.where(todo, new_state, state)
+                code = np.where(todo, code, NONE)
+                codes[i] = np.where(code == BUY, buy, np.where(code == SELL, sell, codes[i]))
+                decided[i] = decided[i] | (code != NONE)
+            self.states[index] = state
+
+        return codes, ctx
+
+    def scan(self):
+        """
+        Сигналы на последней свече, один раз на свечу (полосы меняют состояние) ->
+        [{"symbol", "signal", "score", "price"}] по убыванию score
+        """
+        strategy = self.strategy
+        size = strategy.lookback + 1
+        active = np.zeros((size, len(self.symbols)), dtype=bool)
+        active[-1] = (self.rows >= strategy.min_candles) & (self.bar_ts == self.last_ts)
+        if strategy.session is not None:
+            minutes = _session_minutes([self.last_ts])[0]
+            if not strategy.session[0] <= minutes < strategy.session[1]:
+                active[-1] = False
+
+        codes, ctx = self._evaluate(size, active)
+        codes = codes[-1]
+        score = np.zeros(len(self.symbols))
+        if strategy.score is not None:
+            score = np.broadcast_to(strategy.score(ctx), (size, len(codes)))[-1]
+
+        found = np.flatnonzero(codes)
+        order = found[np.argsort(-np.nan_to_num(score[found], nan=-np.inf), kind='stable')]
+        price = self.data['close'][:, -1]
+        return [
+            {
+                "symbol": self.symbols[i],
+                "signal": SIGNALS[int(codes[i])],
+                "score": float(score[i]),
+                "price": float(price[i]),
+            }
+            for i in order
+        ]
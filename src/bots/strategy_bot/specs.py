@@ -0,0 +1,110 @@
+"""
+Существующие боты в виде декларативных стратегий для StrategyBot.
+Параметры по умолчанию те же, что в params.get(...) у классов ботов,
+переопределяются так же: StrategyBot(money_manager, spec=RSI_BOT, upper_band=80)
+"""
+
+RSI_BOT = {
+    "name": "rsi_bot",
+    "min_candles": 10,
+    "params": {
+        "rsi_length": 14,
+        "upper_band": 75,
+        "lower_band": 25,
+        "is_short_allowed": True,
+        "close_signal": "close",
+    },
+    "indicators": {
+        "rsi": ["RSI", "$rsi_length"],
+    },
+    "rules": [
+        {"band": "rsi", "upper": "$upper_band", "lower": "$lower_band"},
+    ],
+}
+
+STOCK_BOT = {
+    "name": "stock_bot",
+    "min_candles": 28,
+    "params": {
+        "rsi_length": 14,
+        "upper_band": 70,
+        "lower_band": 30,
+        "is_short_allowed": False,
+        "only_main_session": False,
+        "close_signal": "close",
+        "check_trend": False,
+        "max_adx": 50,
+    },
+    "indicators": {
+        "rsi": ["RSI", "$rsi_length"],
+        "adx": ["ADX", 14],
+        "adxr": ["ADXR", 14],
+    },
+    "session": {"start": "16:30", "end": "23:00", "enabled": "$only_main_session"},
+    "rules": [
+        # очень сильный тренд, не входим в сделку
+        {"when": [">", "adx", "$max_adx", "adxr"], "signal": None, "enabled": "$check_trend"},
+        # rsi[-3] вышел за полосу, rsi[-2] вернулся
+        {"band": "rsi", "lag": 1, "upper": "$upper_band", "lower": "$lower_band"},
+    ],
+}
+
+# тренд - SMA выстроены по порядку trend_len + 1 свечей подряд
+_SMA_TREND = {
+    "down": [">", "sma_high", "sma_middle", "sma_low"],
+    "up": ["<", "sma_high", "sma_middle", "sma_low"],
+    "ordered": ["or", "down", "up"],
+    "has_trend": ["and", ["lag", "ordered", "$trend_len"], ["all", "ordered", "$trend_len"]],
+}
+
+STOCK_SMA_BOT = {
+    "name": "stock_sma_bot",
+    "min_candles": 20,
+    "params": {
+        "is_short_allowed": False,
+        "trend_len": 5,
+        "only_main_session": False,
+        "close_signal": "close",
+        "high_sma_value": 100,
+        "middle_sma_value": 50,
+        "low_sma_value": 30,
+    },
+    "indicators": {
+        "sma_high": ["SMA", "$high_sma_value"],
+        "sma_middle": ["SMA", "$middle_sma_value"],
+        "sma_low": ["SMA", "$low_sma_value"],
+    },
+    "define": _SMA_TREND,
+    "session": {"start": "16:30", "end": "23:00", "enabled": "$only_main_session"},
+    "rules": [
+        {"when": ["and", "has_trend", "down", ["<", "sma_low", "price", "sma_middle"]], "signal": "sell"},
+        {"when": ["and", "has_trend", "down"], "signal": None},
+        {"when": "has_trend", "signal": "buy"},
+        {"when": ["not", "ordered"], "signal": "close"},
+    ],
+}
+
+SMA_TREND_BOT = {
+    "name": "sma_trend_bot",
+    "min_candles": 100,
+    "params": {
+        "is_short_allowed": False,
+        "trend_len": 5,
+        "only_main_session": False,
+    },
+    "indicators": {
+        "sma_high": ["SMA", 100],
+        "sma_middle": ["SMA", 50],
+        "sma_low": ["SMA", 30],
+    },
+    "define": _SMA_TREND,
+    "session": {"start": "16:00", "end": "23:00", "enabled": "$only_main_session"},
+    "rules": [
+        {"when": ["and", "has_trend", "down"], "signal": "sell"},
+        {"when": ["and", "has_trend", ["<", "sma_middle", "price", "sma_low"]], "signal": "buy"},
+        {"when": "has_trend", "signal": None},
+        {"when": ["not", "ordered"], "signal": "close"},
+    ],
+}
+
+SPECS = {spec['name']: spec for spec in (RSI_BOT, STOCK_BOT, STOCK_SMA_BOT, SMA_TREND_BOT)}
@@ -0,0 +1,360 @@
+"""
+Компилятор декларативной стратегии (см. specs.py) в два вычислителя:
+пакетный по всем свечам сразу (бэктест) и потоковый по последней свече (торговля).
+
+Оба используют один и тот же код правил: потоковый просто считает правила
+на хвосте индикаторов длиной lookback, поэтому сигналы совпадают,
+если у бота та же история свечей.
+
+Выражения - вложенные списки:
+  "price", "open"/"high"/"low"/"close", имя индикатора или define, число, "$param"
+  [">", a, b, ...], ["<", ...], [">=", ...], ["<=", ...]  - цепочка a > b > ...
+  ["and", ...], ["or", ...], ["not", x]
+  ["+", a, b], ["-", a, b], ["*", a, b], ["/", a, b], ["abs", x]  - арифметика, например для "score"
+  ["lag", x, k]          - значение k свечей назад
+  ["all", x, n]          - x было верно на каждой из последних n свечей
+  ["cross_above", a, b], ["cross_below", a, b]
+"""
+import operator
+from datetime import datetime
+
+import numpy as np
+from talib import ADX, ADXR
+
+from bots import indicators
+from bots.base import Signal
+
+# коды сигналов в массивах
+NONE, BUY, SELL, CLOSE = 0, 1, 2, 3
+CODES = {None: NONE, Signal.BUY: BUY, Signal.SELL: SELL, Signal.CLOSE: CLOSE}
+SIGNALS = {code: signal for signal, code in CODES.items()}
+
+COMPARISONS = {'>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le}
+ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+CANDLE_FIELDS = ('open', 'high', 'low', 'close')
+
+# индикаторы по закрытию идут через общий кеш, по HLC - напрямую в TA-Lib
+CLOSE_INDICATORS = {'SMA': indicators.sma, 'EMA': indicators.ema, 'RSI': indicators.rsi}
+HLC_INDICATORS = {'ADX': ADX, 'ADXR': ADXR}
+
+
+def _resolve(value, params):
+    """
+    "$name" -> params[name] во всей структуре, один раз при компиляции
+    """
+    if isinstance(value, str) and value.startswith('$'):
+        return params[value[1:]]
+    if isinstance(value, list):
+        return [_resolve(v, params) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, params) for k, v in value.items()}
+    return value
+
+
+def _to_signal(value):
+    if value is None or isinstance(value, Signal):
+        return value
+    return Signal(value)
+
+
+def _shift(values, k):
+    if not k or np.ndim(values) == 0:
+        return values
+    result = np.empty_like(values)
+    result[:k] = False if values.dtype == bool else np.nan
+    result[k:] = values[:-k]
+    return result
+
+
+def _rolling_all(values, n):
+    # по первой оси, чтобы работало и на матрице (свечи, инструменты) сканера
+    if np.ndim(values) == 0:
+        return values
+    misses = np.cumsum(~values, axis=0)
+    misses = np.concatenate([np.zeros_like(misses[:1]), misses])
+    result = np.zeros(values.shape, dtype=bool)
+    result[n - 1:] = misses[n:] - misses[:len(values) - n + 1] == 0
+    return result
+
+
+class _Compiler:
+    def __init__(self, names, defines):
+        self.names = names  # индикаторы
+        shadowed = (set(names) | set(defines)) & {'price', *CANDLE_FIELDS}
+        if shadowed:
+            raise ValueError('reserved names %s' % ', '.join(sorted(shadowed)))
+        self.defines = defines
+        self.used = set()
+        self.fields = set()  # поля свечей, которые читают правила
+
+    def compile(self, expr):
+        """
+        -> (функция ctx -> массив или скаляр, сколько свечей назад смотрит)
+        """
+        if isinstance(expr, (int, float)):
+            return (lambda ctx: expr), 0
+
+        if isinstance(expr, str):
+            if expr == 'price':
+                return (lambda ctx: ctx['price']), 0
+            if expr in CANDLE_FIELDS:
+                self.fields.add(expr)
+                return (lambda ctx: ctx[expr]), 0
+            if expr in self.names:
+                self.used.add(expr)
+                return (lambda ctx: ctx['series'][expr]), 0
+            if expr in self.defines:
+                return self.compile(self.defines[expr])
+            raise ValueError('unknown name %s' % expr)
+
+        op, *args = expr
+        if op in COMPARISONS:
+            compare = COMPARISONS[op]
+            parts = [self.compile(arg) for arg in args]
+            funcs = [f for f, _ in parts]
+
+            def chain(ctx):
+                values = [f(ctx) for f in funcs]
+                result = compare(values[0], values[1])
+                for a, b in zip(values[1:], values[2:]):
+                    result = result & compare(a, b)
+                return result
+            return chain, max(lb for _, lb in parts)
+
+        if op in ('and', 'or'):
+            parts = [self.compile(arg) for arg in args]
+            funcs = [f for f, _ in parts]
+            combine = operator.and_ if op == 'and' else operator.or_
+
+            def logic(ctx):
+                result = funcs[0](ctx)
+                for f in funcs[1:]:
+                    result = combine(result, f(ctx))
+                return result
+            return logic, max(lb for _, lb in parts)
+
+        if op in ARITHMETIC:
+            calc = ARITHMETIC[op]
+            (a, lb_a), (b, lb_b) = self.compile(args[0]), self.compile(args[1])
+            return (lambda ctx: calc(a(ctx), b(ctx))), max(lb_a, lb_b)
+
+        if op == 'abs':
+            f, lookback = self.compile(args[0])
+            return (lambda ctx: np.abs(f(ctx))), lookback
+
+        if op == 'not':
+            f, lookback = self.compile(args[0])
+            return (lambda ctx: np.logical_not(f(ctx))), lookback
+
+        if op == 'lag':
+            f, lookback = self.compile(args[0])
+            k = int(args[1])
+            return (lambda ctx: _shift(f(ctx), k)), lookback + k
+
+        if op == 'all':
+            f, lookback = self.compile(args[0])
+            n = int(args[1])
+            return (lambda ctx: _rolling_all(f(ctx), n)), lookback + n - 1
+
+        if op in ('cross_above', 'cross_below'):
+            compare = operator.gt if op == 'cross_above' else operator.lt
+            (a, lb_a), (b, lb_b) = self.compile(args[0]), self.compile(args[1])
+
+            def cross(ctx):
+                now = compare(a(ctx), b(ctx))
+                return now & ~_shift(now, 1)
+            return cross, max(lb_a, lb_b) + 1
+
+        raise ValueError('unknown operation %s' % op)
+
+
+def _band_step(state, prev, cur, upper, lower):
+    """
+    Автомат RsiBot/StockBot: prev вышел за полосу -> ждем, когда cur вернется.
+    state: 0 - в полосе, 1 - перекупленность, -1 - перепроданность
+    """
+    if state == 0:
+        if prev >= upper:
+            state = 1
+        elif prev <= lower:
+            state = -1
+
+    if state == 1 and cur <= upper:
+        return 0, SELL
+    if state == -1 and cur >= lower:
+        return 0, BUY
+    return state, NONE
+
+
+def _session_minutes(ts):
+    """
+    Минуты от начала местных суток для каждой свечи, смещение таймзоны - раз на час
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    hours, index = np.unique(ts // 3600, return_inverse=True)
+    offsets = np.array([
+        (datetime.fromtimestamp(h * 3600) - datetime.utcfromtimestamp(h * 3600)).total_seconds()
+        for h in hours
+    ], dtype=np.int64)
+    return (ts + offsets[index]) % 86400 // 60
+
+
+def _parse_time(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class Strategy:
+    def __init__(self, spec, **params):
+        params = {**spec.get('params', {}), **params}
+        self.name = spec.get('name', 'strategy')
+        self.params = params
+        self.min_candles = spec.get('min_candles', 1)
+        self.history_size = params.get('history_size', spec.get('history_size', 1000))
+
+        is_short_allowed = params.get('is_short_allowed', False)
+        close_signal = _to_signal(params.get('close_signal', Signal.CLOSE))
+        signal_map = {
+            None: None,
+            'buy': Signal.BUY,
+            'sell': Signal.SELL if is_short_allowed else close_signal,
+            'close': close_signal,
+        }
+
+        session = _resolve(spec.get('session'), params)
+        self.session = None
+        if session and session.get('enabled', True):
+            self.session = (_parse_time(session['start']), _parse_time(session['end']))
+
+        compiler = _Compiler(spec.get('indicators', {}), _resolve(spec.get('define', {}), params))
+        self.rules = []
+        lookback = 0
+        for rule in _resolve(spec['rules'], params):
+            if not rule.get('enabled', True):
+                continue
+            if 'band' in rule:
+                compiler.used.add(rule['band'])
+                lag = rule.get('lag', 0)
+                self.rules.append(('band', rule['band'], lag, rule['upper'], rule['lower'],
+                                   CODES[signal_map[rule.get('buy', 'buy')]],
+                                   CODES[signal_map[rule.get('sell', 'sell')]]))
+                lookback = max(lookback, lag + 1)
+            else:
+                func, rule_lookback = compiler.compile(rule['when'])
+                self.rules.append(('when', func, CODES[signal_map[rule['signal']]]))
+                lookback = max(lookback, rule_lookback)
+        # чем больше, тем выше кандидат в выдаче сканера (scanner.py)
+        self.score = None
+        if spec.get('score') is not None:
+            self.score, score_lookback = compiler.compile(_resolve(spec['score'], params))
+            lookback = max(lookback, score_lookback)
+
+        self.lookback = lookback
+        self.fields = compiler.fields
+
+        # считаем только индикаторы, которые нужны включенным правилам
+        self.indicators = {
+            name: (kind, int(_resolve(length, params)))
+            for name, (kind, length) in spec.get('indicators', {}).items()
+            if name in compiler.used
+        }
+
+    def compute_indicators(self, arrays, series_id=None):
+        series = {}
+        for name, (kind, length) in self.indicators.items():
+            if kind in CLOSE_INDICATORS:
+                series[name] = CLOSE_INDICATORS[kind](arrays.close, length, series_id)
+            else:
+                series[name] = HLC_INDICATORS[kind](arrays.high, arrays.low, arrays.close, length)
+        return series
+
+    def session_mask(self, ts):
+        if self.session is None:
+            return np.ones(len(ts), dtype=bool)
+        minutes = _session_minutes(ts)
+        return (minutes >= self.session[0]) & (minutes < self.session[1])
+
+    def _run(self, ctx, active, states):
+        """
+        Правила по порядку, первое сработавшее решает. active - на каких свечах считать,
+        states - состояния автоматов band, меняются на месте
+        """
+        n = ctx['n']
+        codes = np.zeros(n, dtype=np.int8)
+        decided = ~active
+
+        for index, rule in enumerate(self.rules):
+            if rule[0] == 'when':
+                _, func, code = rule
+                matched = np.broadcast_to(func(ctx), (n,)) & ~decided
+                codes[matched] = code
+                decided = decided | matched
+                continue
+
+            _, name, lag, upper, lower, buy, sell = rule
+            values = ctx['series'][name]
+            for i in np.flatnonzero(~decided):
+                if i - 1 - lag < 0:
+                    continue
+                states[index], code = _band_step(states.get(index, 0), values[i - 1 - lag], values[i - lag],
+                                                 upper, lower)
+                if code:
+                    codes[i] = buy if code == BUY else sell
+                    decided[i] = True
+
+        return codes
+
+    def vectorized(self, arrays):
+        """
+        Коды сигналов по всем свечам сразу, цена сделки - close свечи, как в тестерах
+        """
+        n = len(arrays)
+        ctx = {field: getattr(arrays, field) for field in self.fields}
+        ctx.update(n=n, price=arrays.close, series=self.compute_indicators(arrays))
+
+        active = self.session_mask(arrays.timestamp)
+        active[:self.min_candles - 1] = False
+        return self._run(ctx, active, {})
+
+    def streaming(self):
+        return StreamingEvaluator(self)
+
+
+class StreamingEvaluator:
+    """
+    Одна свеча за вызов: индикаторы из кеша (пересчитывается хвост),
+    правила - на последних lookback + 1 значениях
+    """
+
+    def __init__(self, strategy: Strategy):
+        self.strategy = strategy
+        self.states = {}
+        self.size = strategy.lookback + 1
+
+    def step(self, arrays, price, timestamp=None, series_id=None):
+        """
+        timestamp - время последней свечи, чтобы не строить массив времени ради сессии,
+        series_id - серия в кеше индикаторов, см. BaseBot.get_indicator_series
+        """
+        strategy = self.strategy
+        if strategy.session is not None:
+            if timestamp is None:
+                timestamp = arrays.timestamp[-1]
+            minutes = _session_minutes([timestamp])[0]
+            if not strategy.session[0] <= minutes < strategy.session[1]:
+                return None
+
+        size = min(self.size, len(arrays))
+        series = strategy.compute_indicators(arrays, series_id)
+        ctx = {field: getattr(arrays, field)[-size:] for field in strategy.fields}
+        ctx['price'] = arrays.close[-size:].copy()
+        ctx['price'][-1] = float(price)
+        ctx.update(n=size, series={name: values[-size:] for name, values in series.items()})
+
+        active = np.zeros(size, dtype=bool)
+        active[-1] = True
+        return SIGNALS[int(strategy._run(ctx, active, self.states)[-1])]
+
+
+def compile_strategy(spec, **params) -> Strategy:
+    return Strategy(spec, **params)
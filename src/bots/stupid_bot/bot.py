@@ -1,10 +1,46 @@
 from typing import Union, List
 import numpy as np
 
-from talib import SMA
-
-from bots.base import Result, BaseBot, Signal, CandleStick, Deal
-from helpers import get_trend_for
+from bots import indicators, patterns
+from bots.base import Result, BaseBot, Signal, CandleStick, Deal, CandleArrays
+
+
+def get_signals(open, high, low, close, trend=None, pinbar_size=2, super_pinbar_size=None):
+    """
+    Сигналы StupidBot по каждой свече: patterns.UP - покупка, patterns.DOWN - продажа, 0 - ничего.
+    trend - patterns.trend по SMA закрытия, None - без проверки тренда (предварительный отбор)
+    """
+    n = len(close)
+    # последняя свеча должна быть пинбаром с длинным хвостом
+    signal = patterns.is_long_pinbar(open, high, low, close, pinbar_size)
+    # отключаем дополнительные проверки, если пинбар ну очень хорош
+    disable_extra_check = np.zeros(n, dtype=bool)
+    if super_pinbar_size:
+        disable_extra_check = patterns.is_long_pinbar(open, high, low, close, super_pinbar_size)
+
+    shadow, tail = patterns.shadows(open, high, low, close)
+    # короткая тень должна быть короткой
+    signal &= tail - 0.00002 <= patterns.EPSILON
+    # слишком маленькая свеча, тело ровно 0.0001 тоже мало
+    signal &= patterns.body_size(open, close) - 0.0001 > patterns.EPSILON
+    # недостаточно свечек для принятия решения
+    signal[:StupidBot.min_candles - 1] = False
+
+    direction = patterns.pinbar_direction(open, high, low, close)
+
+    # три свечи до этого выше (для покупки) или ниже (для продажи)
+    lows, highs = patterns.price_range(open, high, low, close)
+    above = np.zeros(n, dtype=bool)
+    below = np.zeros(n, dtype=bool)
+    if n >= StupidBot.min_candles:
+        above[3:] = (lows[2:-1] >= lows[3:]) & (lows[1:-2] >= lows[3:]) & (lows[:-3] >= lows[3:])
+        below[3:] = (highs[2:-1] <= highs[3:]) & (highs[1:-2] <= highs[3:]) & (highs[:-3] <= highs[3:])
+
+    checked = np.where(direction == patterns.UP, above, below)
+    if trend is not None:
+        checked &= trend == direction
+    signal &= disable_extra_check | checked
+    return np.where(signal, direction, 0).astype(np.int8)
 
 
 class StupidBot(BaseBot):
@@ -20,65 +56,50 @@ class StupidBot(BaseBot):
         # прошедшие данные
         self.historical_ohlcv = historical_ohlcv or []
         self.money_manager = money_manager
+        self.money_manager.add_candles(self.historical_ohlcv)
         self.params = params
+        self.signals = None  # ts свечи -> код сигнала после precompute
+
+    def _get_params(self):
+        return (
+            self.params.get('sma_size', 100),
+            self.params.get('trend_len', 15),
+            self.params.get('pinbar_size', 2),
+            self.params.get('super_pinbar_size', None),
+        )
+
+    def precompute(self, candles):
+        """
+        Сигналы по всем свечам бэктеста пакетно, цена сделки - close свечи
+        """
+        sma_size, trend_len, pinbar_size, super_pinbar_size = self._get_params()
+        arrays = CandleArrays(candles)
+        trend = patterns.trend(indicators.sma(arrays.close, sma_size), trend_len)
+        codes = get_signals(arrays.open, arrays.high, arrays.low, arrays.close, trend, pinbar_size, super_pinbar_size)
+        self.signals = dict(zip(arrays.timestamp.astype(np.int64).tolist(), codes.tolist()))
+        return codes
 
     async def _test_price(self, price) -> Union[Result, None]:
         if len(self.historical_ohlcv) < self.min_candles:
             # недостаточно свечек для принятия решения
             return
 
-        # конфигурируемые параметры
-        sma_size = self.params.get('sma_size', 100)
-        trend_len = self.params.get('trend_len', 15)
-        pinbar_size = self.params.get('pinbar_size', 2)
-        super_pinbar_size = self.params.get('super_pinbar_size', None)
-
-        last_candle = self.get_last_candle()
-        if not last_candle.is_long_pinbar(pinbar_size):
-            # последняя свеча должна быть пинбаром с длинным хвостом
-            return
-
-        # отключаем дополнительные проверки, если пинбар ну очень хорош
-        disable_extra_check = super_pinbar_size and last_candle.is_long_pinbar(super_pinbar_size)
-
-        if last_candle.tail > 0.00002:
-            # короткая тень должна быть короткой
-            return
-
-        if last_candle.body_size < 0.0001:
-            # слишком маленькая свеча
-            return
-
-        print(last_candle.tail)
-        # определяем тренд по SMA закрытия
-        close_array = [float(c.close) for c in self.historical_ohlcv]
-        sma = SMA(np.array(close_array), sma_size)
-        trend = get_trend_for(list(sma[-trend_len:]))
-
-        if last_candle.pinbar_direction() == Signal.BUY:  # пинбар смотрит вверх
-            order_type = Signal.BUY
-
-            if not disable_extra_check:
-                if trend != order_type:  # тренд вниз
-                    return
-
-                # три свечи до этого выше
-                for c in self.historical_ohlcv[-4:-1]:
-                    if min(c.raw_data) < min(last_candle.raw_data):
-                        return
-        else:  # пинбар смотрит вниз
-            order_type = Signal.SELL
-
-            if not disable_extra_check:
-                if trend != order_type:  # тренд вверх
-                    return
-
-                # три последних свечи ниже
-                for c in self.historical_ohlcv[-4:-1]:
-                    if max(c.raw_data) > max(last_candle.raw_data):
-                        return
-
-        return Result(signal=order_type, price=price)
+        if self.signals is not None:
+            code = self.signals.get(int(self.get_last_candle().timestamp), 0)
+        else:
+            # те же правила, что и в precompute, на последних свечах:
+            # сначала без тренда, SMA считаем только для подходящего пинбара
+            sma_size, trend_len, pinbar_size, super_pinbar_size = self._get_params()
+            candles = self.historical_ohlcv[-self.min_candles:]
+            open, high, low, close = np.array([c.raw_data for c in candles], dtype=float).T
+            code = get_signals(open, high, low, close, None, pinbar_size, super_pinbar_size)[-1]
+            if code:
+                sma = indicators.sma(self.get_candle_arrays().close, sma_size, self.get_indicator_series())
+                trend = patterns.trend(sma[-(trend_len + len(candles) - 1):], trend_len)[-len(candles):]
+                code = get_signals(open, high, low, close, trend, pinbar_size, super_pinbar_size)[-1]
+
+        if code:
+            return Result(signal=Signal.BUY if code == patterns.UP else Signal.SELL, price=price)
 
     def add_candle(self, candle):
         """
@@ -89,6 +110,7 @@ class StupidBot(BaseBot):
         """
         # прибавляем новую свечку
         self.historical_ohlcv.append(candle)
+        self.money_manager.add_candle(candle)
         # храним только последние 1000
         self.historical_ohlcv = self.historical_ohlcv[-1000:]
 
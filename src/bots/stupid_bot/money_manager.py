@@ -1,33 +1,44 @@
-from decimal import Decimal
+import asyncio
+import logging
+import math
+import time
 
 from bots.base import Signal
+from bots.resample import StreamingAtr
 
 
 class SimpleMoneyManager:
 
     def __init__(self, order_amount, diff, stop_loss_factor, take_profit_factor, trailing_stop=False):
         self.order_amount = order_amount
-        self.diff = Decimal(diff)  # базовая разницу которую умножаем на риски
+        self.diff = float(diff)  # базовая разницу которую умножаем на риски
         self.stop_loss_factor = stop_loss_factor  # размер пропорции sl
         self.take_profit_factor = take_profit_factor  # размер пропорции tp
         self.trailing_stop = trailing_stop
 
-    def get_order_amount(self) -> Decimal:
+    def get_order_amount(self) -> float:
         """
         Сумма ордера в quote currency
         """
         return self.order_amount
 
+    def add_candle(self, candle):
+        """
+        Закрытая свеча от бота, фиксированному diff не нужна
+        """
+
+    def add_candles(self, candles):
+        for candle in candles:
+            self.add_candle(candle)
+
     def get_stop_loss(self, signal, price, factor=None):
         factor = factor or self.stop_loss_factor
         if not factor:
             return
-        factor = Decimal(factor)
-
         if signal == Signal.BUY:
-            stop_loss = Decimal(price) - Decimal(self.diff * factor)
+            stop_loss = float(price) - self.diff * factor
         else:
-            stop_loss = Decimal(price) + Decimal(self.diff * factor)
+            stop_loss = float(price) + self.diff * factor
 
         return stop_loss
 
@@ -36,12 +47,10 @@ class SimpleMoneyManager:
         if not factor:
             return
 
-        factor = Decimal(factor)
-
         if signal == Signal.BUY:
-            return Decimal(price) + Decimal(self.diff * factor)
+            return float(price) + self.diff * factor
         else:
-            return Decimal(price) - Decimal(self.diff * factor)
+            return float(price) - self.diff * factor
 
     async def trailing_stop_check(self, current_price, deal):
         """
@@ -72,3 +81,126 @@ class SimpleMoneyManager:
             return price > deal.price + self.diff * 1
         else:
             return price < deal.price - self.diff * 1
+
+
+class AtrMoneyManager(SimpleMoneyManager):
+    """
+    diff = ATR закрытых свечей вместо фиксированного, объем - риск на сделку:
+    при срабатывании стопа (diff * stop_loss_factor) теряем equity * risk.
+
+    equity в валюте счета, а стоп - в валюте котировки инструмента (currency, для EUR/NZD - NZD),
+    убыток на единицу переводится по курсу rate или из таблицы rates (exante_api.pnl.FxRates).
+    currency=None - инструмент котируется в валюте счета, курс 1.
+
+    ATR считается потоково по свечам из add_candle, equity кешируется
+    и обновляется из summary счета в фоне не чаще раза в equity_ttl секунд,
+    поэтому get_order_amount/get_stop_loss - пара операций с float и годятся на каждый тик.
+    Пока ATR или equity нет, работает как SimpleMoneyManager с order_amount и diff
+    """
+
+    def __init__(self, order_amount, diff, stop_loss_factor, take_profit_factor, trailing_stop=False,
+                 atr_length=14, risk=0.01, equity=None, api=None, equity_ttl=60,
+                 lot_size=1, min_amount=None, max_amount=None, currency=None, rate=None, rates=None):
+        super().__init__(order_amount, diff, stop_loss_factor, take_profit_factor, trailing_stop)
+        if currency and rate is None and rates is None:
+            raise ValueError('%s: нужен курс к валюте счета, rate или rates' % currency)
+        self.atr = StreamingAtr(atr_length)
+        self.risk = float(risk)  # доля equity, которую теряем на стопе
+        self.equity = float(equity) if equity is not None else None
+        self.api = api
+        self.equity_ttl = equity_ttl
+        self.lot_size = float(lot_size)
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.currency = currency  # валюта котировки, None - валюта счета
+        self.rate = float(rate) if rate is not None else None
+        self.rates = rates
+
+        self._last_ts = None
+        self._atr = None  # ATR, пересчитывается раз на свечу
+        self._equity_ts = 0
+        self._equity_task = None
+
+    @property
+    def diff(self):
+        if self._atr is not None:
+            return self._atr
+        return self._diff
+
+    @diff.setter
+    def diff(self, value):
+        self._diff = value
+
+    def add_candle(self, candle):
+        # один менеджер может быть у нескольких ботов (MultiBot) - свеча приходит несколько раз
+        if self._last_ts is not None and candle.timestamp < self._last_ts:
+            return
+        bar = (float(candle.high), float(candle.low), float(candle.close))
+        if candle.timestamp == self._last_ts:
+            self.atr.replace(bar)
+        else:
+            self.atr.push(bar)
+            self._last_ts = candle.timestamp
+
+        if not math.isnan(self.atr.value):
+            self._atr = self.atr.value
+
+        self._schedule_equity_update()
+
+    def get_rate(self):
+        """
+        Курс валюты котировки к валюте счета, None - пока неизвестен
+        """
+        if self.rate is not None:
+            return self.rate
+        if self.currency is None:
+            return 1.0
+        return self.rates.get(self.currency)
+
+    def get_order_amount(self) -> float:
+        """
+        Объем, при котором стоп в diff * stop_loss_factor стоит equity * risk,
+        округленный вниз до lot_size. Пока курс неизвестен - order_amount
+        """
+        if self._atr is None or self.equity is None or not self.stop_loss_factor:
+            return self.order_amount
+
+        rate = self.get_rate()
+        # убыток на единицу объема в валюте счета
+        stop_loss = self._atr * self.stop_loss_factor * (rate or 0)
+        if not stop_loss:
+            return self.order_amount
+
+        # допуск на float, чтобы 3 лота не стали 2.9999999 -> 2
+        lots = math.floor(self.equity * self.risk / stop_loss / self.lot_size + 1e-9)
+        amount = round(lots * self.lot_size, 10)
+        if self.min_amount is not None and amount < self.min_amount:
+            amount = float(self.min_amount)
+        if self.max_amount is not None and amount > self.max_amount:
+            amount = float(self.max_amount)
+        return amount
+
+    def _schedule_equity_update(self):
+        if self.api is None or time.monotonic() - self._equity_ts < self.equity_ttl:
+            return
+        if self._equity_task is not None and not self._equity_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # бэктест без event loop, equity остается заданной
+            return
+        self._equity_task = loop.create_task(self.update_equity())
+
+    async def update_equity(self):
+        """
+        equity из summary счета, ошибки не роняют бота - остается прошлое значение
+        """
+        self._equity_ts = time.monotonic()
+        try:
+            summary = await self.api.get_account_summary()
+            if summary.net_asset_value is not None:
+                self.equity = float(summary.net_asset_value)
+        except Exception:
+            logging.exception('не удалось обновить equity')
+        return self.equity
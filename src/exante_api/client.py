@@ -1,12 +1,18 @@
 import asyncio
 import json
 import logging
+import time
 import urllib.parse
 from json import JSONDecodeError
+from typing import List, Optional
 
-from termcolor import cprint
 import aiohttp
-from aiohttp import ServerTimeoutError, ClientConnectorError
+
+import numpy as np
+
+from .prices import format_price, format_quantity
+from .stream import StreamSupervisor
+from .models import ApiResponse, Order, OHLCBar, Position, Quote, Summary, parse_list, ohlcv_array, merge_ohlcv
 
 
 class TooManyRequests(Exception):
@@ -25,16 +31,44 @@ class PositionOrdersNotFound(Exception):
     pass
 
 
+class ApiError(Exception):
+    """
+    Ответ с ошибкой там, где ее нельзя принять за пустой результат
+    """
+
+    def __init__(self, response):
+        self.status = response.status
+        super().__init__('%s %s: %s %s' % (response.method, response.url, response.status, response.body[:200]))
+
+
 class ExanteApi:
-    def __init__(self, application_id: str, access_key: str, demo: bool, account_id: str, currency: str):
+    # больше свечей api за один запрос не отдает
+    max_ohlcv_size = 5000
+
+    def __init__(self, application_id: str, access_key: str, demo: bool, account_id: str, currency: str,
+                 journal=None, endpoint_url=None, summary_ttl=1.0, ohlcv_concurrency=4):
         self.demo = demo
         self.application_id = application_id
         self.access_key = access_key
         self.account_id = account_id
         self.currency = currency.upper()
 
-        self.endpoint_url = 'https://api-demo.exante.eu' if demo else 'https://api-live.exante.eu'
+        if endpoint_url:
+            # например локальный симулятор, см. exante_simulator.py
+            self.endpoint_url = endpoint_url.rstrip('/')
+        else:
+            self.endpoint_url = 'https://api-demo.exante.eu' if demo else 'https://api-live.exante.eu'
         self._client = None
+        self.journal = journal  # exante_api.journal.Journal, пишем туда стрим и запросы
+
+        # кеш summary: (account_id, currency) -> (годен до, Summary), и запросы, которые сейчас в полете
+        self.summary_ttl = summary_ttl
+        self._summaries = {}
+        self._summary_requests = {}
+        self._summary_generation = 0
+        # одновременных запросов страниц в get_ohlcv_arrays
+        self.ohlcv_concurrency = ohlcv_concurrency
+        self.stream = None  # StreamSupervisor текущего стрима, его metrics() - здоровье фида
 
     def get_auth(self):
         return aiohttp.helpers.BasicAuth(
@@ -57,10 +91,6 @@ class ExanteApi:
     def stream_headers(self):
         return {"Accept": "application/x-json-stream"}
 
-    @property
-    def timeout(self):
-        return aiohttp.ClientTimeout(total=None, sock_read=30)
-
     def get_url(self, method, params=None, type=None, version=None):
         if not type:
             type = 'md'
@@ -90,48 +120,43 @@ class ExanteApi:
         if self.client and not self.client.closed:
             await self.client.close()
 
-    async def process_response(self, response, silent=False):
+    async def process_response(self, response, silent=False, payload=None) -> ApiResponse:
         """
-        Ловим тут известные ошибки и логируем запросы
+        Ловим тут известные ошибки и логируем запросы.
+        Тело читается сразу и соединение возвращается в пул, даже если ответ никто не разберет
         """
+        method = response.method
+        url = str(response.url)
+        try:
+            body = await response.read()
+        finally:
+            response.release()
+
+        if self.journal is not None:
+            self.journal.write_api_request(method, url, payload=payload)
+            self.journal.write_api_response(method, url, response.status, body)
+
         if not silent:
             if response.status == 429:
                 raise TooManyRequests()
 
-        return response
+        return ApiResponse(method, url, response.status, body)
 
-    async def data_stream(self, url, processor):
+    async def data_stream(self, url, processor, **supervisor_params):
         """
-        Подписка на стрим биржи.
+        Подписка на стрим биржи, соединения и переподключения ведет StreamSupervisor
         """
-        min_delay = 0.5
-        max_delay = 30
-        delay = min_delay
-        while True:
-            cprint(f"Start listening {url}", "blue")
-            try:
-                async with self.client.get(url, headers=self.stream_headers, timeout=self.timeout) as resp:
-                    async for data in resp.content.iter_any():
-                        events = self.parse_stream_lines(data)
-                        for e in events:
-                            await processor(e)
-                        delay = min_delay  # reset the delay
-            except ServerTimeoutError as e:
-                cprint(e, "yellow")
-            except ClientConnectorError as e:
-                cprint(e, "red")
-            except Exception as e:
-                logging.exception('on event error:')
-
-            await asyncio.sleep(delay)
-            delay = min(max_delay, delay * 2)  # exponential delay
-
-    async def quote_stream(self, symbol, processor):
+        logging.info('start listening %s', url)
+        self.stream = StreamSupervisor(self, url, processor, **supervisor_params)
+        return await self.stream.run()
+
+    async def quote_stream(self, symbol, processor, time_interval=None, on_gap=None, **supervisor_params):
         """
-        Подписка на обновления инструмента
+        Подписка на обновления инструмента, on_gap(bars, ts) - свечи, пропущенные за время переподключения
         """
         url_quotes = self.get_url('feed', [symbol], type='md')
-        return await self.data_stream(url_quotes, processor)
+        return await self.data_stream(url_quotes, processor, symbol=symbol, time_interval=time_interval,
+                                      on_gap=on_gap, **supervisor_params)
 
     # async def trade_stream(self, on_event):
     #     return await self.data_stream(self.url_trades, processor)
@@ -150,7 +175,7 @@ class ExanteApi:
                 event = json.loads(line)
                 events.append(event)
             except JSONDecodeError as e:
-                print("JSONDecodeError", line, data)
+                logging.error('JSONDecodeError %s: %s', line, data)
                 raise e
         return events
 
@@ -189,6 +214,100 @@ class ExanteApi:
         r = await self.client.get(url)
         return await self.process_response(r)
 
+    async def fetch_ohlcv(self, symbol_id, duration, size=60, from_ts=None, to_ts=None):
+        r = await self.get_ohlcv(symbol_id, duration, size=size, from_ts=from_ts, to_ts=to_ts)
+        if r.status != 200:
+            raise ApiError(r)
+        return parse_list(r.data, OHLCBar)
+
+    async def get_ohlcv_arrays(self, symbol_id, duration, size=None, from_ts=None, to_ts=None) -> np.ndarray:
+        """
+        Свечи массивом OHLCV_DTYPE по возрастанию времени, сколько угодно страниц по max_ohlcv_size.
+        С from_ts и to_ts (мс) диапазон режется на страницы и они качаются параллельно,
+        иначе - size последних свечей до to_ts страницами назад, пока api их отдает.
+        Ответ с ошибкой - ApiError, а не пустая история: трейдер перезапросит ее через пару секунд
+        """
+        if from_ts is not None:
+            if to_ts is None:
+                to_ts = int(time.time() * 1000)
+
+            step = self.max_ohlcv_size * duration * 1000
+            semaphore = asyncio.Semaphore(self.ohlcv_concurrency)
+
+            async def fetch(page_from):
+                page_to = min(page_from + step - 1, to_ts)
+                async with semaphore:
+                    r = await self.get_ohlcv(symbol_id, duration, size=self.max_ohlcv_size, from_ts=page_from,
+                                             to_ts=page_to)
+                if r.status != 200:
+                    raise ApiError(r)
+                return ohlcv_array(r.data)
+
+            pages = await asyncio.gather(*(fetch(page_from) for page_from in range(from_ts, to_ts + 1, step)))
+            array = merge_ohlcv(pages)
+            array = array[(array['timestamp'] >= from_ts) & (array['timestamp'] <= to_ts)]
+            return array[-size:] if size else array
+
+        size = size or self.max_ohlcv_size
+        pages = []
+        left = size
+        while left > 0:
+            page_size = min(left, self.max_ohlcv_size)
+            r = await self.get_ohlcv(symbol_id, duration, size=page_size, to_ts=to_ts)
+            if r.status != 200:
+                raise ApiError(r)
+            page = ohlcv_array(r.data)
+            if to_ts is not None:
+                page = page[page['timestamp'] <= to_ts]
+            if not len(page):
+                break
+            pages.append(page)
+            left -= len(page)
+            if len(page) < page_size:
+                # истории больше нет
+                break
+            to_ts = int(page['timestamp'][0]) - 1
+        return merge_ohlcv(pages)[-size:]
+
+    async def get_account_summary(self, currency=None, account_id=None) -> Summary:
+        """
+        summary из кеша на summary_ttl секунд. Одновременные вызовы ждут один общий запрос,
+        place_order и cancel_order сбрасывают кеш. Ответ с ошибкой - ApiError
+        """
+        key = ((account_id or self.account_id).upper(), (currency or self.currency).upper())
+        cached = self._summaries.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+
+        request = self._summary_requests.get(key)
+        if request is None:
+            request = asyncio.ensure_future(self._fetch_summary(key, self._summary_generation))
+            self._summary_requests[key] = request
+
+            def forget(future):
+                if self._summary_requests.get(key) is future:
+                    del self._summary_requests[key]
+            request.add_done_callback(forget)
+        # отмена одного из ждущих не отменяет общий запрос
+        return await asyncio.shield(request)
+
+    async def _fetch_summary(self, key, generation):
+        account_id, currency = key
+        r = await self.get_summary(currency=currency, account_id=account_id)
+        # пустой summary - это "позиции нет", а не "api не ответил"
+        if r.status != 200:
+            raise ApiError(r)
+        summary = Summary(r.data)
+        # ответ на запрос, начатый до ордера, в кеш не кладем
+        if generation == self._summary_generation:
+            self._summaries[key] = (time.monotonic() + self.summary_ttl, summary)
+        return summary
+
+    def invalidate_summary(self):
+        self._summary_generation += 1
+        self._summaries.clear()
+        self._summary_requests.clear()
+
     async def get_active_orders(self):
         url = self.get_url('orders', params=['active'], type='trade')
         r = await self.client.get(url)
@@ -199,55 +318,71 @@ class ExanteApi:
         r = await self.client.get(url, params=params)
         return await self.process_response(r)
 
+    async def fetch_active_orders(self) -> List[Order]:
+        """
+        raise ApiError: пустой список - это "ордеров нет", а не "api не ответил"
+        """
+        r = await self.get_active_orders()
+        if r.status != 200:
+            raise ApiError(r)
+        return parse_list(r.data, Order)
+
+    async def fetch_orders(self, **params) -> List[Order]:
+        r = await self.get_orders(**params)
+        if r.status != 200:
+            raise ApiError(r)
+        return parse_list(r.data, Order)
+
     async def cancel_order(self, order_id):
         url = self.get_url('orders', type='trade', params=[order_id])
         data = {"action": "cancel"}
         r = await self.client.post(url, json=data)
-        return await self.process_response(r)
+        self.invalidate_summary()
+        return await self.process_response(r, payload=data)
 
     async def update_order(self, order_id, data):
         url = self.get_url('orders', type='trade', params=[order_id])
         data = {"action": "replace", "parameters": data}
         r = await self.client.post(url, json=data)
-        return await self.process_response(r)
+        return await self.process_response(r, payload=data)
 
     async def place_order(self, data):
         url = self.get_url('orders', type='trade')
         r = await self.client.post(url, json=data)
-        return await self.process_response(r)
+        self.invalidate_summary()
+        return await self.process_response(r, payload=data)
 
     async def move_to_breakeven(self, symbol):
-        r = await self.get_orders(limit=20)
-        orders = await r.json()
+        orders = await self.fetch_orders(limit=20)
 
         sl_order = None
         tp_order = None
         initial_order = None
         for o in orders:
-            if o['orderParameters']['symbolId'] != symbol:
+            if o.symbol_id != symbol:
                 continue
 
             if initial_order and sl_order and tp_order:
                 break
 
-            if o['orderParameters'].get('stopPrice') and o['orderState']['status'] == 'working':
+            if o.stop_price and o.is_working:
                 sl_order = o
-            elif o['orderParameters'].get('limitPrice') and o['orderState']['status'] == 'working':
+            elif o.limit_price and o.is_working:
                 tp_order = o
-            elif o['orderParameters'].get('orderType') == 'market':
+            elif o.order_type == 'market':
                 initial_order = o
 
         if not initial_order or not sl_order or not tp_order:
             raise PositionOrdersNotFound()
 
-        stop_loss = float(sl_order['orderParameters']['stopPrice'])
-        new_stop_loss = float(initial_order['orderState']['fills'][0]['price']) * 1.0002
+        stop_loss = float(sl_order.stop_price)
+        new_stop_loss = float(initial_order.fill_price) * 1.0002
         if stop_loss < new_stop_loss:
             r = await self.update_order(
-                sl_order['orderId'],
+                sl_order.order_id,
                 {
                     "stopPrice": '%.2f' % new_stop_loss,
-                    "quantity": sl_order['orderParameters']['quantity']
+                    "quantity": sl_order.quantity
                 }
             )
             text = await r.text()
@@ -255,7 +390,12 @@ class ExanteApi:
             assert r.status == 202, error
             return r
 
-    async def open_position(self,symbol, side, quantity, take_profit, stop_loss, account_id=None, duration=None):
+    async def open_position(self, symbol, side, quantity, take_profit, stop_loss, account_id=None,
+                            duration=None, tick_size=None, lot_size=None) -> List[Order]:
+        """
+        quantity, take_profit, stop_loss - float бота, в строки ордера они переводятся здесь
+        с округлением до tick_size и lot_size, см. exante_api/prices.py
+        """
         if account_id is None:
             account_id = self.account_id
         else:
@@ -264,68 +404,71 @@ class ExanteApi:
         if not duration:
             duration = 'good_till_cancel'
 
-        r = await self.place_order({
+        data = {
             "accountId": account_id,
             "symbolId": symbol,
             "side": side,
-            "quantity": str(quantity),
+            "quantity": format_quantity(quantity, lot_size),
             "orderType": "market",
             "duration": duration,
-            "takeProfit": str(take_profit),
-            "stopLoss": str(stop_loss),
-        })
+        }
+        if take_profit is not None:
+            data['takeProfit'] = format_price(take_profit, tick_size)
+        if stop_loss is not None:
+            data['stopLoss'] = format_price(stop_loss, tick_size)
+        r = await self.place_order(data)
+
+        placed_orders = parse_list(r.data, Order)
 
         # костыль, т.к. метод не дает поставить разные duration для stop и market ордеров
         if duration != 'good_till_cancel':
-            placed_orders = await r.json()
+            orders = []
             for o in placed_orders:
-                if o['orderParameters']['orderType'] in ['stop', 'limit']:
+                if o.order_type in ['stop', 'limit']:
                     # отменяем старые ордера
-                    await self.cancel_order(o['orderId'])
+                    await self.cancel_order(o.order_id)
 
                     # ставим новые с правильным duration
                     data = {
                         "duration": "good_till_cancel",
-                        "quantity": o['orderParameters']['quantity'],
+                        "quantity": o.quantity,
                         "accountId": self.account_id,
                         "symbolId": symbol,
-                        "side": o['orderParameters']['side'],
-                        "orderType": o['orderParameters']['orderType'],
+                        "side": o.side,
+                        "orderType": o.order_type,
                     }
 
-                    stop_price = o['orderParameters'].get('stopPrice')
-                    if stop_price:
-                        data['stopPrice'] = stop_price
+                    if o.stop_price:
+                        data['stopPrice'] = str(o.stop_price)
 
-                    limit_price = o['orderParameters'].get('limitPrice')
-                    if limit_price:
-                        data['limitPrice'] = limit_price
+                    if o.limit_price:
+                        data['limitPrice'] = str(o.limit_price)
 
-                    await self.place_order(data)
+                    r = await self.place_order(data)
+                    orders.extend(parse_list(r.data, Order))
+                else:
+                    orders.append(o)
+            placed_orders = orders
 
-    async def get_position(self, symbol, account_id=None):
-        r = await self.get_summary(account_id=account_id, currency='EUR')
-        account_summary = await r.json()
-        position = None
+        # ордера позиции, id стопа нужен TrailingStops
+        return placed_orders
 
-        for pos in account_summary.get('positions', []):
-            if pos['symbolId'] == symbol:
-                position = pos
-                break
+    async def get_position(self, symbol, account_id=None) -> Optional[Position]:
+        summary = await self.get_account_summary(account_id=account_id, currency='EUR')
+        position = summary.positions.get(symbol)
 
-        if position and float(position['quantity']) != 0:
+        if position and position.quantity != 0:
             return position
 
     async def cancel_active_orders(self, symbol):
-        r = await self.get_active_orders()
-        orders = await r.json()
+        orders = await self.fetch_active_orders()
 
         result = []
         for o in orders:
-            if o['orderParameters']['symbolId'] != symbol:
+            if o.symbol_id != symbol:
                 continue
 
-            r = await self.cancel_order(o['orderId'])
+            r = await self.cancel_order(o.order_id)
             result.append(r)
 
         return result
@@ -349,15 +492,15 @@ class ExanteApi:
         if not position:
             raise PositionNotFound()
 
-        if float(position['quantity']) == 0:
+        if position.quantity == 0:
             raise PositionAlreadyClosed()
 
-        if float(position['quantity']) > 0:
+        if position.is_long:
             side = 'sell'
         else:
             side = 'buy'
 
-        quantity = str(abs(float(position['quantity'])))
+        quantity = format_quantity(position.quantity)
 
         # отменяем все открытые ордера
         await self.cancel_active_orders(symbol=symbol)
@@ -396,3 +539,7 @@ class ExanteApi:
         url = self.get_url('feed', params=[symbol, 'last'])
         r = await self.client.get(url)
         return await self.process_response(r)
+
+    async def fetch_last_quote(self, symbol) -> Optional[Quote]:
+        quotes = parse_list((await self.get_last_quote(symbol)).data, Quote)
+        return quotes[0] if quotes else None
@@ -1,6 +1,3 @@
-from decimal import Decimal
-
-
 class Event:
     type = None
     bid = None
@@ -17,7 +14,7 @@ class Event:
 
         if data.get('ask') and data.get('bid'):
             self.type = 'new_price'
-            self.bid = Decimal(data.get('bid')[0]['price'])
-            self.ask = Decimal(data.get('ask')[0]['price'])
+            self.bid = float(data.get('bid')[0]['price'])
+            self.ask = float(data.get('ask')[0]['price'])
             self.spread = self.ask - self.bid
 
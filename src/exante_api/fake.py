@@ -0,0 +1,106 @@
+import json
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+from .client import ExanteApi
+from .journal import API_RESPONSE, read_journal
+
+
+class FakeResponse:
+    """
+    Минимальная замена aiohttp.ClientResponse
+    """
+
+    def __init__(self, method, url, status=200, body=b'[]'):
+        self.method = method
+        self.url = url
+        self.status = status
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def text(self):
+        return self._body.decode()
+
+    async def json(self):
+        return json.loads(self._body)
+
+    def release(self):
+        pass
+
+
+class FakeSession:
+    """
+    Отдает ответы из журнала вместо похода в сеть.
+
+    Ответы хранятся очередью по ключу (method, path), если очередь
+    закончилась - повторяем последний ответ, если ответов не было совсем -
+    пустой список (или пустой объект для summary)
+    """
+
+    def __init__(self):
+        self.closed = False
+        self.requests = []
+        self._responses = defaultdict(deque)
+        self._last = {}
+
+    @staticmethod
+    def _key(method, url):
+        return method.upper(), urlsplit(str(url)).path
+
+    def add_response(self, method, url, status, body: bytes):
+        self._responses[self._key(method, url)].append((status, body))
+
+    def _respond(self, method, url, **kwargs):
+        key = self._key(method, url)
+        self.requests.append((key, kwargs))
+
+        queue = self._responses.get(key)
+        if queue:
+            self._last[key] = queue.popleft()
+
+        if key in self._last:
+            status, body = self._last[key]
+        else:
+            status, body = 200, b'{}' if '/summary/' in key[1] else b'[]'
+
+        return FakeResponse(key[0], url, status, body)
+
+    async def get(self, url, **kwargs):
+        return self._respond('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return self._respond('POST', url, **kwargs)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeExanteApi(ExanteApi):
+    """
+    ExanteApi без сети: все запросы уходят в FakeSession
+    """
+
+    def __init__(self, account_id='FAKE.001', currency='EUR', demo=True, journal=None, summary_ttl=0):
+        # ttl по часам повтора не совпадает с записью, поэтому по умолчанию без кеша,
+        # одновременные запросы все равно объединяются
+        super().__init__(
+            application_id='fake',
+            access_key='fake',
+            demo=demo,
+            account_id=account_id,
+            currency=currency,
+            journal=journal,
+            summary_ttl=summary_ttl,
+        )
+        self._client = FakeSession()
+
+    @classmethod
+    def from_journal(cls, path, **kwargs):
+        api = cls(**kwargs)
+        for record_type, ts, payload in read_journal(path):
+            if record_type == API_RESPONSE:
+                data = json.loads(payload)
+                api.client.add_response(data['method'], data['url'], data['status'], data['body'].encode())
+        return api
@@ -0,0 +1,196 @@
+import json
+import os
+import struct
+import time
+from decimal import Decimal
+
+from bots.base import BaseBot, CloseOpenedDeal
+
+# типы записей журнала
+STREAM = 1  # сырой кусок стрима котировок, как пришел из сокета
+CANDLE = 2  # сформированная свеча, которую отдали боту
+DECISION = 3  # решение бота: сделка, сигнал на закрытие или ничего
+API_REQUEST = 4  # запрос к REST api
+API_RESPONSE = 5  # ответ REST api
+
+RECORD_TYPES = {
+    STREAM: 'stream',
+    CANDLE: 'candle',
+    DECISION: 'decision',
+    API_REQUEST: 'api_request',
+    API_RESPONSE: 'api_response',
+}
+
+# заголовок записи: тип, время записи в мс, длина payload
+HEADER = struct.Struct('<BqI')
+
+
+def _default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    raise TypeError('%s is not JSON serializable' % type(o))
+
+
+def dumps(data) -> bytes:
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+class Journal:
+    """
+    Append-only бинарный журнал трейдера.
+
+    Каждая запись это заголовок HEADER и payload:
+    для STREAM сырые байты стрима, для остальных JSON.
+    Если path не указан, записи копятся в памяти в self.records
+    """
+
+    def __init__(self, path=None, flush_every=100):
+        self.path = path
+        self.records = []
+        self.flush_every = flush_every
+        self._pending = 0
+        self._file = None
+
+        if path:
+            dirname = os.path.dirname(path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._file = open(path, 'ab')
+
+    @classmethod
+    def for_trader(cls, account_name, symbol, directory='journal'):
+        filename = '%s_%s.bin' % (account_name, symbol.replace('/', '_'))
+        return cls(os.path.join(directory, filename))
+
+    def write(self, record_type, payload: bytes, ts=None):
+        if ts is None:
+            ts = int(time.time() * 1000)
+
+        if self._file is None:
+            self.records.append((record_type, ts, payload))
+            return
+
+        self._file.write(HEADER.pack(record_type, ts, len(payload)))
+        self._file.write(payload)
+
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def write_stream(self, data: bytes):
+        self.write(STREAM, data)
+
+    def write_candle(self, candle):
+        self.write(CANDLE, dumps({
+            "timestamp": candle.timestamp,
+            "open": candle.open,
+            "high": candle.high,
+            "low": candle.low,
+            "close": candle.close,
+        }))
+        # свечи редкие, заодно сбрасываем буфер на диск
+        self.flush()
+
+    def write_decision(self, candle_ts, price, deal=None, close=False):
+        data = {"candle_ts": candle_ts, "price": price, "deal": None, "close": close}
+        if deal:
+            data['deal'] = {
+                "side": deal.side,
+                "price": deal.price,
+                "amount": deal.amount,
+                "stop_loss": deal.stop_loss,
+                "take_profit": deal.take_profit,
+            }
+        self.write(DECISION, dumps(data))
+
+    def write_api_request(self, method, url, params=None, payload=None):
+        self.write(API_REQUEST, dumps({
+            "method": method,
+            "url": url,
+            "params": params,
+            "payload": payload,
+        }))
+
+    def write_api_response(self, method, url, status, body: bytes):
+        self.write(API_RESPONSE, dumps({
+            "method": method,
+            "url": url,
+            "status": status,
+            "body": body.decode(errors='replace'),
+        }))
+
+    def flush(self):
+        self._pending = 0
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_journal(path):
+    """
+    Генератор записей (record_type, ts, payload) из файла журнала.
+    Обрезанная последняя запись (процесс убили посреди записи) игнорируется
+    """
+    header_size = HEADER.size
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    view = memoryview(data)
+    offset = 0
+    end = len(data)
+    while offset + header_size <= end:
+        record_type, ts, length = HEADER.unpack_from(view, offset)
+        offset += header_size
+        if offset + length > end:
+            break
+        yield record_type, ts, bytes(view[offset:offset + length])
+        offset += length
+
+
+class JournaledBot(BaseBot):
+    """
+    Обертка над любым ботом, пишет в журнал свечи и решения бота
+    """
+
+    def __init__(self, bot, journal: Journal):
+        self.bot = bot
+        self.journal = journal
+        self.name = bot.name
+
+    def add_candle(self, candle):
+        self.journal.write_candle(candle)
+        self.bot.add_candle(candle)
+
+    async def check_price(self, price):
+        last_candle = self.bot.get_last_candle()
+        candle_ts = last_candle.timestamp if last_candle else None
+
+        try:
+            deal = await self.bot.check_price(price)
+        except CloseOpenedDeal:
+            self.journal.write_decision(candle_ts, price, close=True)
+            raise
+
+        self.journal.write_decision(candle_ts, price, deal=deal)
+        return deal
+
+    async def check_deal(self, current_price, deal):
+        return await self.bot.check_deal(current_price, deal)
+
+    def close(self):
+        self.bot.close()
+
+    @property
+    def historical_ohlcv(self):
+        return self.bot.historical_ohlcv
+
+    @property
+    def last_candle(self):
+        return self.bot.get_last_candle()
+
+    def get_last_candle(self):
+        return self.bot.get_last_candle()
@@ -0,0 +1,146 @@
+"""
+Логи трейдера без блокировки event loop: root logger пишет в очередь (QueueHandler),
+а форматирование и запись в stdout делает отдельный поток (QueueListener).
+
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, symbol=symbol, account=account_name, bot='RsiBot')
+
+Сообщения форматируются лениво: logging.info('rsi %s', value), а не '...' % value - строка
+собирается только для записей, которые прошли уровень и семплирование. В event loop остается
+только подстановка аргументов (снимок объектов на момент вызова), дата, json и traceback -
+в потоке писателя.
+
+fmt='json' - одна json запись на строку с полями контекста (symbol, account, bot),
+в текстовом формате контекст идет перед сообщением: [trader=rsi_bot symbol=EUR/NZD.E.FX ...].
+Контекст задается в setup_logging или bind() и наследуется asyncio задачами.
+
+Частые события (котировки, ошибки на каждом тике) помечаются extra={'sample': 'ключ'}:
+из них пишется первая и каждая sample_every-я запись с тем же ключом, в записи seen - сколько их было.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = "[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d]%(context_text)s %(message)s"
+TEXT_DATEFMT = "%d/%b/%Y %H:%M:%S"
+
+_context = contextvars.ContextVar('log_context', default={})
+_listener = None
+
+
+def bind(**fields):
+    """
+    Поля контекста для записей текущей задачи и задач, созданных после вызова
+    """
+    context = dict(_context.get())
+    context.update(fields)
+    _context.set(context)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        # фильтры handler выполняются в задаче, вызвавшей logging.info, до очереди
+        record.context = _context.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, every=100):
+        super().__init__()
+        self.every = every
+        self.counts = {}
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.every <= 1:
+            return True
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        record.seen = count
+        return count % self.every == 1
+
+
+class AsyncQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # QueueHandler форматирует запись целиком еще в event loop, а очередь у нас в памяти процесса:
+        # фиксируем только текст сообщения, остальное сделает Formatter в потоке писателя
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        # все трейдеры пишут в один stdout, без контекста строку не отнести к трейдеру
+        context = getattr(record, 'context', None)
+        record.context_text = ' [%s]' % ' '.join('%s=%s' % item for item in context.items()) if context else ''
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, 'context', {}))
+        sample = getattr(record, 'sample', None)
+        if sample is not None:
+            data['sample'] = sample
+            data['seen'] = getattr(record, 'seen', 1)
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=logging.INFO, fmt='text', stream=None, sample_every=100, **context):
+    """
+    Заменяет обработчики root logger на очередь с фоновым писателем в stream (stdout).
+    Повторный вызов перенастраивает логи, прежний писатель дописывает очередь и останавливается
+    """
+    global _listener
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(TEXT_FORMAT, TEXT_DATEFMT)
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    handler = AsyncQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_every))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = QueueListener(log_queue, writer)
+    _listener.start()
+    bind(**context)
+    return _listener
+
+
+def stop_logging():
+    """
+    Дописать очередь, вызывается и при выходе из процесса
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,214 @@
+"""
+Ответы Exante API: тело читается сразу и соединение возвращается в пул,
+json разбирается один раз (orjson, если установлен), вложенные orderParameters/orderState
+раскладываются по полям слотовых объектов. raw - исходный словарь для полей, которых тут нет.
+"""
+import json
+from decimal import Decimal
+from typing import List
+
+import numpy as np
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+_NOT_PARSED = object()
+
+# свечи get_ohlcv_arrays: timestamp в мс, как в ответе api
+OHLCV_DTYPE = np.dtype([
+    ('timestamp', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+])
+
+
+def _decimal(value):
+    if value is None or value == '':
+        return None
+    return Decimal(value)
+
+
+class ApiResponse:
+    """
+    Прочитанный ответ: status, read()/text()/json() как у aiohttp, но без соединения
+    """
+    __slots__ = ('method', 'url', 'status', 'body', '_data')
+
+    def __init__(self, method, url, status, body: bytes):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.body = body
+        self._data = _NOT_PARSED
+
+    @property
+    def data(self):
+        if self._data is _NOT_PARSED:
+            self._data = loads(self.body) if self.body else None
+        return self._data
+
+    async def read(self):
+        return self.body
+
+    async def text(self):
+        return self.body.decode()
+
+    async def json(self):
+        return self.data
+
+    def release(self):
+        pass
+
+
+class Order:
+    __slots__ = ('order_id', 'parent_id', 'account_id', 'symbol_id', 'side', 'order_type', 'duration', 'quantity',
+                 'stop_price', 'limit_price', 'status', 'fills', 'place_time', 'raw')
+
+    def __init__(self, data):
+        params = data.get('orderParameters', {})
+        state = data.get('orderState', {})
+        self.order_id = data.get('orderId')
+        self.parent_id = data.get('parentId')
+        self.account_id = data.get('accountId')
+        self.symbol_id = params.get('symbolId')
+        self.side = params.get('side')
+        self.order_type = params.get('orderType')
+        self.duration = params.get('duration')
+        self.quantity = params.get('quantity')  # строкой, как ее ждет update_order
+        self.stop_price = _decimal(params.get('stopPrice'))
+        self.limit_price = _decimal(params.get('limitPrice'))
+        self.status = state.get('status')
+        self.fills = state.get('fills', [])
+        self.place_time = data.get('placeTime')
+        self.raw = data
+
+    @property
+    def is_working(self):
+        return self.status == 'working'
+
+    @property
+    def fill_price(self):
+        if self.fills:
+            return Decimal(self.fills[0]['price'])
+
+    def __repr__(self):
+        return 'Order(%s %s %s %s %s)' % (self.symbol_id, self.side, self.order_type, self.quantity, self.status)
+
+
+class Position:
+    __slots__ = ('symbol_id', 'quantity', 'price', 'average_price', 'currency', 'pnl', 'converted_pnl', 'value',
+                 'converted_value', 'raw')
+
+    def __init__(self, data):
+        self.symbol_id = data['symbolId']
+        self.quantity = Decimal(data.get('quantity') or 0)
+        self.price = _decimal(data.get('price'))
+        # средняя цена входа, у старых ответов ее нет
+        self.average_price = _decimal(data.get('averagePrice')) or self.price
+        self.currency = data.get('currency')
+        self.pnl = _decimal(data.get('pnl'))
+        self.converted_pnl = _decimal(data.get('convertedPnl'))
+        self.value = _decimal(data.get('value'))
+        self.converted_value = _decimal(data.get('convertedValue'))
+        self.raw = data
+
+    @property
+    def is_long(self):
+        return self.quantity > 0
+
+    def __repr__(self):
+        return 'Position(%s %s @ %s)' % (self.symbol_id, self.quantity, self.average_price)
+
+
+class Summary:
+    """
+    positions - {symbolId: Position}, currencies - {код: (остаток, остаток в валюте счета)}
+    """
+    __slots__ = ('account', 'currency', 'timestamp', 'net_asset_value', 'positions', 'currencies', 'raw')
+
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            data = {}
+        self.account = data.get('account')
+        self.currency = data.get('currency')
+        self.timestamp = data.get('timestamp')
+        self.net_asset_value = _decimal(data.get('netAssetValue'))
+        self.positions = {p['symbolId']: Position(p) for p in data.get('positions', [])}
+        self.currencies = {
+            row['code'].upper(): (_decimal(row.get('value')), _decimal(row.get('convertedValue')))
+            for row in data.get('currencies', [])
+        }
+        self.raw = data
+
+
+class Quote:
+    __slots__ = ('symbol_id', 'timestamp', 'bid', 'ask', 'bid_size', 'ask_size', 'raw')
+
+    def __init__(self, data):
+        bid = (data.get('bid') or [{}])[0]
+        ask = (data.get('ask') or [{}])[0]
+        self.symbol_id = data.get('symbolId')
+        self.timestamp = data.get('timestamp')
+        self.bid = _decimal(bid.get('price'))
+        self.ask = _decimal(ask.get('price'))
+        self.bid_size = _decimal(bid.get('size'))
+        self.ask_size = _decimal(ask.get('size'))
+        self.raw = data
+
+    @property
+    def mid(self):
+        return self.ask + (self.bid - self.ask) / 2
+
+
+class OHLCBar:
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, data):
+        self.timestamp = data['timestamp']  # мс
+        self.open = Decimal(data['open'])
+        self.high = Decimal(data['high'])
+        self.low = Decimal(data['low'])
+        self.close = Decimal(data['close'])
+        self.volume = _decimal(data.get('volume'))
+
+
+def parse_list(data, model) -> List:
+    """
+    Список моделей, ответ с ошибкой (словарь вместо списка) - пустой список.
+    Где пустой список что-то значит, статус проверяет вызывающий (см. ExanteApi.fetch_active_orders)
+    """
+    if not isinstance(data, list):
+        return []
+    return [model(row) for row in data]
+
+
+def ohlcv_array(data) -> np.ndarray:
+    """
+    Ответ get_ohlcv -> массив OHLCV_DTYPE по возрастанию времени без повторов.
+    Строки цен разбирает numpy сразу всей колонкой, ответ с ошибкой - пустой массив,
+    статус проверяет get_ohlcv_arrays
+    """
+    if not isinstance(data, list) or not data:
+        return np.empty(0, dtype=OHLCV_DTYPE)
+
+    array = np.empty(len(data), dtype=OHLCV_DTYPE)
+    array['timestamp'] = [row['timestamp'] for row in data]
+    for field in ('open', 'high', 'low', 'close'):
+        array[field] = np.array([row[field] for row in data], dtype=float)
+    array['volume'] = np.array([row.get('volume') or 0 for row in data], dtype=float)
+    return merge_ohlcv([array])
+
+
+def merge_ohlcv(arrays) -> np.ndarray:
+    """
+    Склейка страниц свечей: сортировка по времени, повторы на стыках страниц выкидываем
+    """
+    array = np.concatenate(arrays) if arrays else np.empty(0, dtype=OHLCV_DTYPE)
+    _, index = np.unique(array['timestamp'], return_index=True)
+    return array[index]
@@ -1,75 +1,149 @@
-from datetime import datetime, date, timedelta
-from decimal import Decimal, getcontext
+from datetime import datetime, timedelta
 from collections import OrderedDict
+from itertools import count, islice
 
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from talib._ta_lib import RSI, SMA, EMA, KAMA
 
+from bots import indicators
 from bots.base import CandleStick
+from bots.resample import DAY, Resampler
+
+_series_ids = count()
 
 
 class HistoricalData:
     time_interval = None
-    bids = []
-    asks = []
-    mid_prices = []
-    ohlc_data = OrderedDict()
-    day_ohlc_data = OrderedDict()
     last_ts = None
 
-    def __init__(self, time_interval: int, historical_data: list, sma=None, rsi=None, day_ema=False):
+    def __init__(self, time_interval: int, historical_data, sma=None, rsi=None, day_ema=False):
+        """
+        historical_data - ответ get_ohlcv (список от новых к старым) или массив get_ohlcv_arrays
+        """
         self.time_interval = time_interval
-        self.load_data(historical_data)
+        # свои контейнеры у каждого экземпляра, иначе несколько
+        # HistoricalData в одном процессе пишут в общие свечи
+        self.bids = []
+        self.asks = []
+        self.mid_prices = []
+        self.ohlc_data = OrderedDict()
+        self.days = Resampler(DAY)
+        self.day_ohlc_data = self.days.bars
+        self._high = None
+        self._low = None
+        # ключ серии в кеше индикаторов, версия растет при любом изменении свечей
+        self.series_id = ('historical_data', next(_series_ids))
+        self.version = 0
+        self._arrays = {}
+
+        if isinstance(historical_data, np.ndarray):
+            self.load_array(historical_data)
+        else:
+            self.load_data(historical_data)
         self.sma = sma or []  # [{"len": 50, "color":"red", "width": 2}]
         self.rsi = rsi or {}  # {"len": 14, "color": "purple", "width": "1", "limits": [80, 20]}
         self.day_ema = day_ema
 
     def load_data(self, historical_data: list):
+        self.version += 1
         for row in reversed(historical_data):
             ts = row['timestamp'] // 1000
             if ts not in self.ohlc_data:
                 self.last_ts = ts
 
-                open = Decimal(row['open'])
-                high = Decimal(row['high'])
-                low = Decimal(row['low'])
-                close = Decimal(row['close'])
+                open = float(row['open'])
+                high = float(row['high'])
+                low = float(row['low'])
+                close = float(row['close'])
+                self.ohlc_data[ts] = {
+                    "open": open,
+                    "high": high,
+                    "low": low,
+                    "close": close,
+                }
+
+                self.days.add(ts, open, high, low, close)
+
+    def load_array(self, ohlcv: np.ndarray):
+        """
+        Свечи из get_ohlcv_arrays (по возрастанию времени). Массив close сразу идет в кеш
+        get_close_array, свечи строятся из колонок через tolist, без json строк
+        """
+        self.version += 1
+        empty = not self.ohlc_data
+        timestamps = (ohlcv['timestamp'] // 1000).tolist()
+        columns = [ohlcv[field].tolist() for field in ('open', 'high', 'low', 'close')]
+        for ts, open, high, low, close in zip(timestamps, *columns):
+            if ts not in self.ohlc_data:
+                self.last_ts = ts
                 self.ohlc_data[ts] = {
                     "open": open,
                     "high": high,
                     "low": low,
                     "close": close,
                 }
+                self.days.add(ts, open, high, low, close)
+
+        if empty and len(self.ohlc_data) == len(ohlcv):
+            self._arrays['close'] = (self.version, ohlcv['close'].copy())
+
+    def fill_gap(self, bars: np.ndarray) -> list:
+        """
+        Закрытые свечи биржи за время переподключения стрима (get_ohlcv_arrays, по возрастанию).
+        Недособранная из тиков свеча заменяется свечой биржи, следующий тик начинает новую.
+        Возвращает CandleStick добавленных или замененных свечей
+        """
+        bars = bars[bars['timestamp'] // 1000 >= (self.last_ts or 0)]
+        if not len(bars):
+            return []
+
+        self.version += 1
+        candles = []
+        for ts, open, high, low, close in zip((bars['timestamp'] // 1000).tolist(), bars['open'].tolist(),
+                                              bars['high'].tolist(), bars['low'].tolist(), bars['close'].tolist()):
+            self.ohlc_data[ts] = {
+                "open": open,
+                "high": high,
+                "low": low,
+                "close": close,
+            }
+            self.days.add(ts, open, high, low, close)
+            candles.append(CandleStick(timestamp=ts, open=open, high=high, low=low, close=close))
 
-                d = date.fromtimestamp(ts)
-                self.day_ohlc_data.setdefault(d, {"open": open, "high": high, "low": low, "close": close})
-                self.day_ohlc_data[d]['high'] = max(self.day_ohlc_data[d]['high'], high)
-                self.day_ohlc_data[d]['low'] = min(self.day_ohlc_data[d]['low'], low)
-                self.day_ohlc_data[d]['close'] = close
+        self.last_ts = candles[-1].timestamp
+        self.bids = []
+        self.asks = []
+        self.mid_prices = []
+        self._high = None
+        self._low = None
+        return candles
 
-    def add_data(self, ts, bid: Decimal, ask: Decimal):
+    def add_data(self, ts, bid: float, ask: float):
         ts_interval = ts // (1000 * self.time_interval) * self.time_interval
+        self.version += 1
         if self.last_ts != ts_interval:
             self.bids = []
             self.asks = []
             self.mid_prices = []
+            self._high = None
+            self._low = None
             self.last_ts = ts_interval
 
-        getcontext().prec = 6
         mid_price = bid + (ask - bid) / 2
         self.mid_prices.append(mid_price)
         self.bids.append(bid)
         self.asks.append(ask)
 
+        # high/low свечи считаем на лету, а не max() по всем тикам свечи
+        if self._high is None or mid_price > self._high:
+            self._high = mid_price
+        if self._low is None or mid_price < self._low:
+            self._low = mid_price
+
         self.ohlc_data[ts_interval] = self.get_ohlc()
 
-        d = date.fromtimestamp(ts // 1000)
-        self.day_ohlc_data.setdefault(d, {"open": open, "high": self.high, "low": self.low, "close": self.close})
-        self.day_ohlc_data[d]['high'] = max(self.day_ohlc_data[d]['high'], self.high)
-        self.day_ohlc_data[d]['low'] = min(self.day_ohlc_data[d]['low'], self.low)
-        self.day_ohlc_data[d]['close'] = self.close
+        self.days.add(ts_interval, self.open, self.high, self.low, self.close)
 
     @property
     def open(self):
@@ -87,11 +161,11 @@ class HistoricalData:
 
     @property
     def high(self):
-        return max(self.mid_prices)
+        return self._high
 
     @property
     def low(self):
-        return min(self.mid_prices)
+        return self._low
 
     def get_ohlc(self):
         return {
@@ -186,17 +260,46 @@ class HistoricalData:
 
     def get_last_candle(self):
         # возвращаем последнюю сформированную свечу
-        return self.get_list()[-2]
+        if len(self.ohlc_data) < 2:
+            raise IndexError('no finished candle yet')
+        ts = next(islice(reversed(self.ohlc_data), 1, None))
+        row = self.ohlc_data[ts]
+        return CandleStick(
+            timestamp=ts,
+            open=row['open'],
+            high=row['high'],
+            low=row['low'],
+            close=row['close'],
+        )
+
+    def get_close_array(self):
+        # свечи только добавляются в конец, а меняется последняя,
+        # поэтому после add_data достраиваем хвост, а не весь массив
+        version, array = self._arrays.get('close', (None, np.empty(0)))
+        if version == self.version:
+            return array
+
+        n = len(self.ohlc_data)
+        tail = min(n - len(array) + 1, n)
+        closes = [row['close'] for row in islice(reversed(self.ohlc_data.values()), tail)]
+        array = np.concatenate([array[:n - tail], closes[::-1]])
+        self._arrays['close'] = (self.version, array)
+        return array
+
+    def get_daily_hlc3_array(self):
+        version, array = self._arrays.get('day_hlc3', (None, None))
+        if version != self.version:
+            array = np.array([
+                (c['high'] + c['low'] + c['close']) / 3 for c in self.day_ohlc_data.values()
+            ])
+            self._arrays['day_hlc3'] = (self.version, array)
+        return array
 
     def get_rsi(self, length=14):
-        close_array = [float(c['close']) for c in self.ohlc_data.values()]
-        return RSI(np.array(close_array), length)
+        return indicators.rsi(self.get_close_array(), length, (self.series_id, 'close'), self.version)
 
     def get_sma(self, length=100):
-        close_array = [float(c['close']) for c in self.ohlc_data.values()]
-        return SMA(np.array(close_array), length)
+        return indicators.sma(self.get_close_array(), length, (self.series_id, 'close'), self.version)
 
     def get_daily_ema(self):
-        hlc3_array = [ (float(c['high']) + float(c['low']) + float(c['close'])) / 3 for c in self.day_ohlc_data.values()]
-        # hlc3_array = [ float(c['high']) for c in self.day_ohlc_data.values()]
-        return EMA(np.array(hlc3_array), 14)
+        return indicators.ema(self.get_daily_hlc3_array(), 14, (self.series_id, 'day_hlc3'), self.version)
@@ -0,0 +1,78 @@
+"""
+Курсы валют к валюте счета для локального PnL позиций.
+
+convertedPnl из summary - это (цена - цена входа) * количество * курс валюты инструмента.
+Цену входа и цену знает TrailingStops (ответ на ордер и стрим), курс - эта таблица.
+Одна таблица на счет: summary скачивается раз в ttl секунд на все инструменты,
+а не раз в 5с на каждый.
+"""
+import asyncio
+import logging
+import math
+import time
+
+
+class FxRates:
+    """
+    rates - курсы валюта -> валюта счета, если они известны заранее (бэктест, тесты)
+    """
+
+    def __init__(self, api=None, currency=None, ttl=600, rates=None):
+        self.api = api
+        self.currency = (currency or api.currency).upper()
+        self.ttl = ttl
+        self.rates = {self.currency: 1.0}
+        self.rates.update(rates or {})
+        self.symbol_currencies = {}  # symbol -> валюта инструмента, из позиций summary
+        self.updated_at = -math.inf
+        self._task = None
+
+    def get(self, currency):
+        """
+        Курс currency -> валюта счета, None - пока неизвестен.
+        Устаревшая таблица обновляется в фоне, тик ее не ждет
+        """
+        if self.api is not None and time.monotonic() - self.updated_at >= self.ttl:
+            self._schedule_update()
+        return self.rates.get(currency.upper())
+
+    def _schedule_update(self):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._task = loop.create_task(self.update())
+
+    async def update(self):
+        # время ставим до запроса, чтобы при ошибке не повторять его на каждом тике
+        self.updated_at = time.monotonic()
+        try:
+            summary = await self.api.get_account_summary(currency=self.currency)
+            self.update_from_summary(summary)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('не удалось обновить курсы')
+
+    def update_from_summary(self, summary):
+        """
+        Курсы из остатков по валютам, а для валют без остатка - из позиций
+        """
+        rates = {}
+        for code, (value, converted_value) in summary.currencies.items():
+            if value:
+                rates[code] = float(converted_value) / float(value)
+
+        for position in summary.positions.values():
+            if not position.currency:
+                continue
+            currency = position.currency.upper()
+            self.symbol_currencies[position.symbol_id] = currency
+            if position.value and currency not in rates:
+                rates[currency] = float(position.converted_value) / float(position.value)
+
+        self.rates.update(rates)
+        self.rates[self.currency] = 1.0
+
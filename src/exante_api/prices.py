@@ -0,0 +1,36 @@
+"""
+Числа в боте: котировки, свечи, сделки, индикаторы и money manager - float64,
+Decimal только на границе с биржей, где цена или объем превращается в строку ордера.
+
+Там значение округляется до шага цены (tick_size) или лота (lot_size), поэтому
+хвосты float вроде 1.2345000000000002 в ордер не попадают. Без шага округляем
+до digits знаков - этого хватает, чтобы убрать шум float и не потерять точность котировки.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_DOWN
+
+digits = 10
+
+
+def mid_price(bid, ask) -> float:
+    return bid + (ask - bid) / 2
+
+
+def to_decimal(value, step=None, rounding=ROUND_HALF_EVEN) -> Decimal:
+    """
+    float -> Decimal, кратный step (tick_size, lot_size), если он задан.
+    repr(float) - самая короткая строка, поэтому 1.1 остается Decimal('1.1')
+    """
+    value = Decimal(repr(round(float(value), digits)))
+    if not step:
+        return value
+    step = Decimal(str(step))
+    return (value / step).to_integral_value(rounding) * step
+
+
+def format_price(value, tick_size=None, rounding=ROUND_HALF_EVEN) -> str:
+    return '{:f}'.format(to_decimal(value, tick_size, rounding).normalize())
+
+
+def format_quantity(value, lot_size=None) -> str:
+    # объем округляем вниз, чтобы не превысить рассчитанный риск
+    return format_price(abs(value), lot_size, ROUND_DOWN)
@@ -0,0 +1,434 @@
+"""
+Локальная замена api-demo.exante.eu для нагрузочного тестирования.
+
+Реализует ровно те методы, которые дергает ExanteApi:
+  GET  /md/3.0/feed/{symbol}             - стрим котировок application/x-json-stream
+  GET  /md/3.0/feed/{symbol}/last        - последняя котировка
+  GET  /md/3.0/ohlc/{symbol}/{duration}  - исторические свечи
+  GET  /md/3.0/summary/{account}/{ccy}   - сводка по счету с позициями
+  GET  /trade/3.0/orders                 - последние ордера
+  GET  /trade/3.0/orders/active          - активные ордера
+  POST /trade/3.0/orders                 - новый ордер (market + stopLoss/takeProfit)
+  POST /trade/3.0/orders/{order_id}      - cancel/replace
+
+Ордера исполняются по котировкам того же фида, который отдается в стрим.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+from .journal import STREAM, read_journal
+
+
+def _ms():
+    return int(time.time() * 1000)
+
+
+def random_walk(price, spread, volatility=0.0002, seed=None):
+    """
+    Бесконечный генератор (bid, ask) случайным блужданием
+    """
+    rnd = random.Random(seed)
+    while True:
+        price *= math.exp(rnd.gauss(0, volatility))
+        yield price - spread / 2, price + spread / 2
+
+
+def journal_ticks(path):
+    """
+    Бесконечный генератор (bid, ask) из записанного журнала трейдера
+    """
+    ticks = []
+    for record_type, ts, payload in read_journal(path):
+        if record_type != STREAM:
+            continue
+        for line in payload.decode().split('\n'):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get('bid') and data.get('ask'):
+                ticks.append((float(data['bid'][0]['price']), float(data['ask'][0]['price'])))
+
+    if not ticks:
+        raise ValueError('no quotes in journal %s' % path)
+
+    while True:
+        yield from ticks
+
+
+class SymbolFeed:
+    """
+    Текущая котировка инструмента и подписчики его стрима
+    """
+
+    def __init__(self, symbol, ticks, tick_rate, digits):
+        self.symbol = symbol
+        self.ticks = ticks
+        self.tick_rate = tick_rate
+        self.digits = digits
+        self.bid, self.ask = next(ticks)
+        self.ts = _ms()
+        self.subscribers = set()
+        self.task = None
+
+    @property
+    def mid(self):
+        return (self.bid + self.ask) / 2
+
+    def format(self, price):
+        return '%.*f' % (self.digits, price)
+
+    def quote(self):
+        return {
+            "timestamp": self.ts,
+            "symbolId": self.symbol,
+            "bid": [{"price": self.format(self.bid), "size": "100"}],
+            "ask": [{"price": self.format(self.ask), "size": "100"}],
+        }
+
+    async def run(self, on_tick):
+        delay = 1 / self.tick_rate
+        while True:
+            self.bid, self.ask = next(self.ticks)
+            self.ts = _ms()
+
+            line = (json.dumps(self.quote()) + '\n').encode()
+            for queue in self.subscribers:
+                queue.put_nowait(line)
+
+            on_tick(self)
+            await asyncio.sleep(delay)
+
+
+class ExanteSimulator:
+    def __init__(self, tick_rate=10, latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 start_price=100.0, spread=0.02, digits=2, journal=None, heartbeat=5, stall_after=None, seed=None):
+        """
+        tick_rate - котировок в секунду на инструмент
+        latency, latency_jitter - искусственная задержка REST ответов в секундах
+        error_rate - доля REST запросов, на которые отвечаем 429
+        journal - журнал трейдера, котировки которого проигрываем по кругу
+        stall_after - через сколько секунд соединение стрима замолкает насовсем, даже без heartbeat
+        """
+        self.tick_rate = tick_rate
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.start_price = start_price
+        self.spread = spread
+        self.digits = digits
+        self.journal = journal
+        self.heartbeat = heartbeat
+        self.stall_after = stall_after
+        self.random = random.Random(seed)
+        self.seed = seed
+
+        self.feeds = {}
+        self.orders = {}  # order_id -> order, в порядке создания
+        self.working = {}  # symbol -> {order_id: order}, рабочие stop и limit ордера
+        self.positions = {}  # (account_id, symbol) -> {"quantity": float, "price": float}
+
+        self.stats = {"requests": 0, "too_many_requests": 0, "orders": 0, "fills": 0}
+
+    def get_app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            # в символе может быть '/', например EUR/NZD.E.FX
+            web.get('/md/3.0/feed/{symbol:.+}/last', self.last_quote),
+            web.get('/md/3.0/feed/{symbol:.+}', self.feed),
+            web.get(r'/md/3.0/ohlc/{symbol:.+}/{duration:\d+}', self.ohlc),
+            web.get('/md/3.0/summary/{account_id}/{currency}', self.summary),
+            web.get('/trade/3.0/orders', self.list_orders),
+            web.get('/trade/3.0/orders/active', self.active_orders),
+            web.post('/trade/3.0/orders', self.place_order),
+            web.post('/trade/3.0/orders/{order_id}', self.modify_order),
+        ])
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_cleanup(self, app):
+        for feed in self.feeds.values():
+            if feed.task:
+                feed.task.cancel()
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        self.stats['requests'] += 1
+
+        is_stream = request.headers.get('Accept') == 'application/x-json-stream'
+        if not is_stream:
+            if self.latency or self.latency_jitter:
+                await asyncio.sleep(self.latency + self.random.random() * self.latency_jitter)
+
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats['too_many_requests'] += 1
+                return web.json_response({"message": "Too Many Requests"}, status=429)
+
+        return await handler(request)
+
+    def get_feed(self, symbol):
+        feed = self.feeds.get(symbol)
+        if feed is None:
+            if self.journal:
+                ticks = journal_ticks(self.journal)
+            else:
+                ticks = random_walk(self.start_price, self.spread, seed=self.seed)
+
+            feed = SymbolFeed(symbol, ticks, self.tick_rate, self.digits)
+            feed.task = asyncio.ensure_future(feed.run(self.match_orders))
+            self.feeds[symbol] = feed
+        return feed
+
+    # market data
+
+    async def feed(self, request):
+        feed = self.get_feed(request.match_info['symbol'])
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-json-stream"})
+        await response.prepare(request)
+
+        queue = asyncio.Queue()
+        feed.subscribers.add(queue)
+        started = time.monotonic()
+        try:
+            while True:
+                if self.stall_after is not None and time.monotonic() - started > self.stall_after:
+                    # зависшее соединение: tcp живо, но данных больше нет, пока клиент его не закроет
+                    feed.subscribers.discard(queue)
+                    while request.transport is not None and not request.transport.is_closing():
+                        await asyncio.sleep(0.5)
+                    break
+                try:
+                    line = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    line = (json.dumps({"event": "heartbeat"}) + '\n').encode()
+
+                # отдаем все накопившееся одним куском, как делает настоящий стрим
+                while not queue.empty():
+                    line += queue.get_nowait()
+                try:
+                    await response.write(line)
+                except ConnectionResetError:
+                    # клиент отключился (выход, переподключение после зависания) - это не ошибка сервера
+                    break
+        finally:
+            feed.subscribers.discard(queue)
+
+        return response
+
+    async def last_quote(self, request):
+        feed = self.get_feed(request.match_info['symbol'])
+        return web.json_response([feed.quote()])
+
+    async def ohlc(self, request):
+        """
+        Синтетическая история, которая заканчивается текущей котировкой.
+        Как и настоящий api отдаем от новых свечей к старым
+        """
+        feed = self.get_feed(request.match_info['symbol'])
+        duration = int(request.match_info['duration'])
+        size = min(int(request.query.get('size', 60)), 5000)
+
+        to_ts = int(request.query.get('to', _ms()))
+        last_ts = to_ts // (duration * 1000) * duration * 1000
+
+        rnd = random.Random(last_ts)
+        close = feed.mid
+        candles = []
+        for i in range(size):
+            open = close * math.exp(rnd.gauss(0, 0.001))
+            high = max(open, close) * (1 + abs(rnd.gauss(0, 0.0005)))
+            low = min(open, close) * (1 - abs(rnd.gauss(0, 0.0005)))
+            candles.append({
+                "timestamp": last_ts - i * duration * 1000,
+                "open": feed.format(open),
+                "high": feed.format(high),
+                "low": feed.format(low),
+                "close": feed.format(close),
+                "volume": "0",
+            })
+            close = open
+
+        return web.json_response(candles)
+
+    # trade
+
+    async def summary(self, request):
+        account_id = request.match_info['account_id']
+        positions = []
+        for (position_account_id, symbol), position in self.positions.items():
+            if position_account_id != account_id:
+                continue
+
+            feed = self.get_feed(symbol)
+            pnl = (feed.mid - position['price']) * position['quantity']
+            positions.append({
+                "symbolId": symbol,
+                "quantity": str(position['quantity']),
+                "price": feed.format(position['price']),
+                "currentPrice": feed.format(feed.mid),
+                "currency": request.match_info['currency'],
+                "pnl": '%.2f' % pnl,
+                "convertedPnl": '%.2f' % pnl,
+            })
+
+        return web.json_response({
+            "account": account_id,
+            "currency": request.match_info['currency'],
+            "timestamp": _ms(),
+            "positions": positions,
+        })
+
+    async def list_orders(self, request):
+        limit = int(request.query.get('limit', 50))
+        orders = list(reversed(list(self.orders.values())))[:limit]
+        return web.json_response(orders)
+
+    async def active_orders(self, request):
+        orders = [o for o in self.orders.values() if o['orderState']['status'] == 'working']
+        return web.json_response(orders)
+
+    def create_order(self, data, parent_id=None):
+        order = {
+            "orderId": str(uuid.uuid4()),
+            "placeTime": _ms(),
+            "accountId": data['accountId'],
+            "parentId": parent_id,
+            "orderParameters": {
+                "symbolId": data['symbolId'],
+                "side": data['side'],
+                "quantity": str(data['quantity']),
+                "orderType": data['orderType'],
+                "duration": data.get('duration', 'day'),
+            },
+            "orderState": {"status": "working", "fills": []},
+        }
+        for key in ['stopPrice', 'limitPrice']:
+            if data.get(key):
+                order['orderParameters'][key] = str(data[key])
+
+        self.orders[order['orderId']] = order
+        if data['orderType'] in ('stop', 'limit'):
+            self.working.setdefault(data['symbolId'], {})[order['orderId']] = order
+        self.stats['orders'] += 1
+        return order
+
+    def cancel(self, order):
+        order['orderState']['status'] = 'cancelled'
+        self.working.get(order['orderParameters']['symbolId'], {}).pop(order['orderId'], None)
+
+    async def place_order(self, request):
+        data = await request.json()
+        feed = self.get_feed(data['symbolId'])
+
+        order = self.create_order(data)
+        placed = [order]
+        if data['orderType'] == 'market':
+            self.fill(order, feed.ask if data['side'] == 'buy' else feed.bid)
+
+            # stopLoss/takeProfit превращаются в отдельные ордера в обратную сторону
+            opposite_side = 'sell' if data['side'] == 'buy' else 'buy'
+            for key, order_type, price_key in [('stopLoss', 'stop', 'stopPrice'),
+                                               ('takeProfit', 'limit', 'limitPrice')]:
+                if data.get(key) and data[key] != 'None':
+                    placed.append(self.create_order({
+                        "accountId": data['accountId'],
+                        "symbolId": data['symbolId'],
+                        "side": opposite_side,
+                        "quantity": data['quantity'],
+                        "orderType": order_type,
+                        "duration": data.get('duration', 'day'),
+                        price_key: data[key],
+                    }, parent_id=order['orderId']))
+
+        return web.json_response(placed, status=201)
+
+    async def modify_order(self, request):
+        order = self.orders.get(request.match_info['order_id'])
+        if not order:
+            return web.json_response({"message": "Order not found"}, status=404)
+
+        if order['orderState']['status'] != 'working':
+            return web.json_response({"message": "Order is not working"}, status=400)
+
+        data = await request.json()
+        if data.get('action') == 'cancel':
+            self.cancel(order)
+        elif data.get('action') == 'replace':
+            for key, value in data.get('parameters', {}).items():
+                order['orderParameters'][key] = str(value)
+        else:
+            return web.json_response({"message": "Unknown action"}, status=400)
+
+        return web.json_response(order, status=202)
+
+    def fill(self, order, price):
+        params = order['orderParameters']
+        quantity = float(params['quantity'])
+        if params['side'] == 'sell':
+            quantity = -quantity
+
+        order['orderState']['status'] = 'filled'
+        self.working.get(params['symbolId'], {}).pop(order['orderId'], None)
+        order['orderState']['fills'].append({
+            "price": '%.8f' % price,
+            "quantity": params['quantity'],
+            "time": _ms(),
+        })
+        self.stats['fills'] += 1
+
+        key = (order['accountId'], params['symbolId'])
+        position = self.positions.setdefault(key, {"quantity": 0.0, "price": price})
+        new_quantity = position['quantity'] + quantity
+        if position['quantity'] == 0 or (position['quantity'] > 0) == (quantity > 0):
+            # увеличиваем позицию, усредняем цену
+            position['price'] = (position['price'] * position['quantity'] + price * quantity) / new_quantity
+        elif new_quantity and (new_quantity > 0) != (position['quantity'] > 0):
+            # перевернулись
+            position['price'] = price
+        position['quantity'] = new_quantity
+
+        if abs(new_quantity) < 1e-12:
+            del self.positions[key]
+
+        # OCO: исполнился stop или limit - снимаем второй ордер той же сделки
+        if order['parentId']:
+            for o in list(self.working.get(params['symbolId'], {}).values()):
+                if o['parentId'] == order['parentId']:
+                    self.cancel(o)
+
+    def match_orders(self, feed):
+        for order in list(self.working.get(feed.symbol, {}).values()):
+            if order['orderState']['status'] != 'working':
+                # уже сняли как OCO на этом же тике
+                continue
+
+            params = order['orderParameters']
+            if params['orderType'] == 'stop':
+                stop_price = float(params['stopPrice'])
+                if params['side'] == 'sell' and feed.bid <= stop_price:
+                    self.fill(order, feed.bid)
+                elif params['side'] == 'buy' and feed.ask >= stop_price:
+                    self.fill(order, feed.ask)
+            elif params['orderType'] == 'limit':
+                limit_price = float(params['limitPrice'])
+                if params['side'] == 'sell' and feed.bid >= limit_price:
+                    self.fill(order, feed.bid)
+                elif params['side'] == 'buy' and feed.ask <= limit_price:
+                    self.fill(order, feed.ask)
+
+
+async def start_simulator(simulator: ExanteSimulator, host='127.0.0.1', port=8090):
+    """
+    Запускает сервер в текущем event loop, возвращает runner для runner.cleanup()
+    """
+    runner = web.AppRunner(simulator.get_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
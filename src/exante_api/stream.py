@@ -0,0 +1,264 @@
+"""
+Стрим котировок под присмотром: мертвый или молчащий фид замечаем за stale_after секунд,
+а не по sock_read таймауту в 30с.
+
+Живость соединения - любые байты, в том числе heartbeat. Если активное соединение молчит
+дольше stale_after, открываем резервное, а старое закрываем только когда резервное
+отдало первые данные - позиция не остается без котировок на время переподключения.
+Дубли на стыке соединений (котировки старше последней) отбрасываются.
+
+После переподключения пропущенные закрытые свечи забираются через get_ohlcv_arrays
+и отдаются в on_gap(bars, ts) до первой новой котировки.
+
+Ошибки processor логируются и не рвут соединение, ошибки соединения - переподключение
+с экспоненциальной задержкой. metrics() - возраст котировок и отставание фида по инструментам.
+"""
+import asyncio
+import logging
+import math
+import time
+
+import aiohttp
+
+
+class SymbolHealth:
+    __slots__ = ('last_tick', 'last_ts', 'ticks', 'lag_ms', 'max_lag_ms')
+
+    def __init__(self):
+        self.last_tick = None  # time.monotonic() последней котировки
+        self.last_ts = None  # timestamp биржи последней котировки, мс
+        self.ticks = 0
+        self.lag_ms = 0.0  # локальное время получения минус время биржи
+        self.max_lag_ms = 0.0
+
+
+class StreamConnection:
+    __slots__ = ('number', 'task', 'started', 'last_data', 'chunks')
+
+    def __init__(self, number):
+        self.number = number
+        self.task = None
+        self.started = time.monotonic()
+        self.last_data = None  # time.monotonic() последних байт
+        self.chunks = 0
+
+
+class StreamSupervisor:
+    """
+    processor(event) - как у data_stream, symbol и time_interval нужны для догрузки свечей,
+    on_gap(bars, ts) - пропущенные закрытые свечи (массив OHLCV_DTYPE) перед котировкой ts (мс)
+    """
+
+    def __init__(self, api, url, processor, symbol=None, time_interval=None, on_gap=None, stale_after=10.0,
+                 check_interval=0.5, min_delay=0.5, max_delay=30, metrics_interval=60):
+        self.api = api
+        self.url = url
+        self.processor = processor
+        self.symbol = symbol
+        self.time_interval = time_interval
+        self.on_gap = on_gap
+        self.stale_after = stale_after
+        self.check_interval = check_interval
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.metrics_interval = metrics_interval
+
+        self.active = None
+        self.standby = None
+        self.symbols = {}  # symbol -> SymbolHealth
+        self.stats = {"connections": 0, "failovers": 0, "stale": 0, "errors": 0, "processor_errors": 0,
+                      "duplicates": 0, "gaps": 0, "gap_bars": 0}
+
+        self._numbers = 0
+        self._delay = min_delay
+        self._next_attempt = 0.0
+        self._resumed = False  # первая котировка после переподключения - проверить пропуск свечей
+        self._last_ts = None  # timestamp последней отданной котировки
+        self._metrics_at = time.monotonic()
+        # события обрабатываются по одному: переключение соединений не прерывает processor
+        self._lock = asyncio.Lock()
+
+    async def run(self):
+        self.active = self._connect()
+        try:
+            while True:
+                await asyncio.sleep(self.check_interval)
+                self._check()
+                if self.metrics_interval and time.monotonic() - self._metrics_at >= self.metrics_interval:
+                    self._metrics_at = time.monotonic()
+                    logging.info('stream %s: %s', self.url, self.metrics())
+        finally:
+            for connection in (self.active, self.standby):
+                if connection is not None:
+                    connection.task.cancel()
+
+    def _connect(self):
+        self._numbers += 1
+        self.stats['connections'] += 1
+        connection = StreamConnection(self._numbers)
+        connection.task = asyncio.ensure_future(self._listen(connection))
+        return connection
+
+    def _check(self):
+        now = time.monotonic()
+        active = self.active
+
+        if self.standby is not None:
+            standby = self.standby
+            if standby.task.done() or now - standby.started > self.stale_after:
+                # резервное тоже не дало данных - пробуем следующее после задержки
+                standby.task.cancel()
+                self.standby = None
+                self._backoff(now)
+            return
+
+        if active.task.done():
+            reason = 'closed'
+        elif now - (active.last_data or active.started) > self.stale_after:
+            reason = 'stale'
+        else:
+            return
+
+        if now < self._next_attempt:
+            return
+        if reason == 'stale':
+            self.stats['stale'] += 1
+        logging.warning('stream %s #%s %s, opening standby', self.url, active.number, reason)
+        self.standby = self._connect()
+
+    def _backoff(self, now):
+        self._next_attempt = now + self._delay
+        self._delay = min(self.max_delay, self._delay * 2)
+
+    def _promote(self, connection):
+        old = self.active
+        self.active = connection
+        self.standby = None
+        self._delay = self.min_delay
+        self._next_attempt = 0.0
+        self._resumed = self._last_ts is not None
+        if old is not None and old is not connection:
+            # под self._lock: старое соединение сейчас не внутри processor
+            self.stats['failovers'] += 1
+            old.task.cancel()
+            logging.warning('stream %s switched #%s -> #%s', self.url, old.number, connection.number)
+
+    async def _listen(self, connection):
+        # sock_read не ставим: молчание соединения отслеживает _check
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10)
+        try:
+            async with self.api.client.get(self.url, headers=self.api.stream_headers, timeout=timeout) as resp:
+                if resp.status != 200:
+                    logging.error('stream %s #%s status %s', self.url, connection.number, resp.status)
+                    return
+                async for data in resp.content.iter_any():
+                    connection.last_data = time.monotonic()
+                    connection.chunks += 1
+                    async with self._lock:
+                        if connection is not self.active:
+                            if connection is not self.standby:
+                                return
+                            self._promote(connection)
+                        await self._on_data(data)
+        except asyncio.CancelledError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats['errors'] += 1
+            logging.warning('stream %s #%s: %r', self.url, connection.number, e)
+
+    async def _on_data(self, data):
+        if self.api.journal is not None:
+            self.api.journal.write_stream(data)
+
+        for event in self.api.parse_stream_lines(data):
+            ts = event.get('timestamp')
+            is_tick = bool(event.get('bid') and event.get('ask'))
+            if is_tick and ts is not None:
+                if self._last_ts is not None and (ts < self._last_ts or self._resumed and ts == self._last_ts):
+                    # котировка, которую уже отдало прошлое соединение
+                    self.stats['duplicates'] += 1
+                    logging.debug('stream %s duplicate %s', self.url, ts, extra={'sample': 'stream_duplicate'})
+                    continue
+                if self._resumed:
+                    self._resumed = False
+                    await self._fill_gap(ts)
+                self._on_tick(event.get('symbolId') or self.symbol, ts)
+
+            try:
+                await self.processor(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats['processor_errors'] += 1
+                # падающий на каждом тике processor не должен забить лог
+                logging.exception('on event error:', extra={'sample': 'on_event_error'})
+
+    def _on_tick(self, symbol, ts):
+        health = self.symbols.get(symbol)
+        if health is None:
+            health = self.symbols[symbol] = SymbolHealth()
+        health.last_tick = time.monotonic()
+        health.last_ts = ts
+        health.ticks += 1
+        health.lag_ms = time.time() * 1000 - ts
+        health.max_lag_ms = max(health.max_lag_ms, health.lag_ms)
+        self._last_ts = ts
+
+    async def _fill_gap(self, ts):
+        """
+        Свечи с последней котировки до свечи котировки ts, если между ними была граница свечи
+        """
+        if self.on_gap is None or not self.time_interval or self.symbol is None:
+            return
+        step = self.time_interval * 1000
+        gap_from = self._last_ts // step * step
+        gap_to = ts // step * step
+        if gap_to <= gap_from:
+            return
+        try:
+            bars = await self.api.get_ohlcv_arrays(self.symbol, self.time_interval, from_ts=gap_from,
+                                                   to_ts=gap_to - 1)
+            self.stats['gaps'] += 1
+            self.stats['gap_bars'] += len(bars)
+            await self.on_gap(bars, ts)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('gap fill error:')
+
+    def metrics(self):
+        """
+        Состояние фида: возраст последней котировки и отставание по инструментам, счетчики соединений
+        """
+        now = time.monotonic()
+        active = self.active
+        return {
+            "connection": active.number if active else None,
+            "data_age": round(now - (active.last_data or active.started), 3) if active else math.inf,
+            "standby": self.standby is not None,
+            "symbols": {
+                symbol: {
+                    "tick_age": round(now - health.last_tick, 3),
+                    "lag_ms": round(health.lag_ms, 1),
+                    "max_lag_ms": round(health.max_lag_ms, 1),
+                    "ticks": health.ticks,
+                }
+                for symbol, health in self.symbols.items()
+            },
+            **self.stats,
+        }
+
+
+def candle_gap_filler(historical_data, bot):
+    """
+    on_gap для трейдера: пропущенные свечи в historical_data и в бота.
+    Последнюю из них бот получит в Processor.on_event на первой новой свече, вместе с check_price,
+    по более ранним сигналы уже устарели, поэтому они только дописываются в историю бота
+    """
+    async def on_gap(bars, ts):
+        candles = historical_data.fill_gap(bars)
+        for candle in candles[:-1]:
+            bot.add_candle(candle)
+        if candles:
+            logging.warning('gap filled: %s candles before %s', len(candles), ts)
+    return on_gap
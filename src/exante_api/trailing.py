@@ -0,0 +1,252 @@
+"""
+Безубыток и трейлинг стопа по стриму котировок, без опроса REST.
+
+Открытые позиции живут в памяти, на каждом тике - несколько сравнений float.
+update_order уходит только если стоп надо сдвинуть хотя бы на tick_size,
+не чаще раза в debounce секунд на позицию и не пока ждем ответ на прошлый запрос.
+Без api двигается только стоп в памяти (и deal.stop_loss) - так же работает бэктест.
+
+breakeven_profit задан в валюте счета, как convertedPnl: прибыль в валюте инструмента
+переводится по курсу из rates (exante_api.pnl.FxRates), без rates курс 1.
+"""
+import asyncio
+import logging
+import math
+import time
+from decimal import ROUND_CEILING, ROUND_FLOOR
+
+from bots.base import Signal
+from .prices import format_quantity, to_decimal
+
+
+class TrailingPosition:
+    __slots__ = ('symbol', 'is_long', 'entry', 'quantity', 'amount', 'stop', 'take_profit', 'order_id', 'best',
+                 'last', 'sent_at', 'task', 'deal', 'currency')
+
+    def __init__(self, symbol, is_long, entry, quantity, stop, order_id=None, deal=None, currency=None,
+                 take_profit=None):
+        self.symbol = symbol
+        self.is_long = is_long
+        self.entry = entry
+        self.quantity = abs(float(quantity))
+        self.amount = format_quantity(self.quantity)  # для update_order
+        self.stop = stop
+        self.take_profit = take_profit
+        self.order_id = order_id
+        self.best = entry  # лучшая цена с открытия
+        self.last = entry  # цена закрытия позиции на последнем тике
+        self.sent_at = -math.inf
+        self.task = None
+        self.deal = deal
+        self.currency = currency  # валюта инструмента, None - валюта счета
+
+
+class TrailingStops:
+    """
+    breakeven_profit - прибыль позиции (в валюте счета), после которой стоп
+                       переносится в цену входа плюс breakeven_offset (доля цены)
+    trail - расстояние стопа от лучшей цены, None - только безубыток
+    rates - FxRates, общая на все инструменты счета, currencies - {symbol: валюта инструмента}
+    """
+
+    def __init__(self, api=None, tick_size=0.01, breakeven_profit=None, breakeven_offset=0.0002, trail=None,
+                 debounce=1.0, rates=None, currencies=None):
+        self.api = api
+        self.tick_size = float(tick_size)
+        self.breakeven_profit = breakeven_profit
+        self.breakeven_offset = breakeven_offset
+        self.trail = trail
+        self.debounce = debounce
+        self.rates = rates
+        self.currencies = dict(currencies or {})
+        self.positions = {}
+        self.updates = 0  # сколько раз двигали стоп
+
+    def track(self, symbol, side, price, quantity, stop_loss, order_id=None, deal=None, currency=None,
+              take_profit=None):
+        if currency is None:
+            currency = self.currencies.get(symbol)
+            if currency is None and self.rates is not None:
+                currency = self.rates.symbol_currencies.get(symbol)
+        self.positions[symbol] = TrailingPosition(
+            symbol,
+            side == Signal.BUY.value,
+            float(price),
+            quantity,
+            float(stop_loss) if stop_loss else (-math.inf if side == Signal.BUY.value else math.inf),
+            order_id,
+            deal,
+            currency,
+            float(take_profit) if take_profit else None,
+        )
+
+    def track_deal(self, symbol, deal, orders=None):
+        """
+        orders - ответ open_position, из него берем id стоп ордера
+        """
+        order_id = None
+        for o in orders or []:
+            if o.order_type == 'stop':
+                order_id = o.order_id
+        self.track(symbol, deal.side, deal.price, deal.amount, deal.stop_loss, order_id, deal,
+                   take_profit=deal.take_profit)
+
+    async def restore(self, symbol):
+        """
+        Позиция, открытая до перезапуска трейдера: пара запросов при старте вместо опроса
+        """
+        position = await self.api.get_position(symbol)
+        if not position:
+            return
+
+        order_id = stop_loss = take_profit = None
+        for o in await self.api.fetch_active_orders():
+            if o.symbol_id == symbol and o.stop_price:
+                order_id, stop_loss = o.order_id, o.stop_price
+            elif o.symbol_id == symbol and o.limit_price:
+                take_profit = o.limit_price
+
+        side = Signal.BUY.value if position.is_long else Signal.SELL.value
+        self.track(symbol, side, position.average_price, abs(position.quantity), stop_loss, order_id,
+                   currency=position.currency, take_profit=take_profit)
+
+    def untrack(self, symbol):
+        position = self.positions.pop(symbol, None)
+        if position is not None and position.task is not None:
+            position.task.cancel()
+
+    def _target(self, p):
+        """
+        Куда должен стоять стоп при лучшей цене p.best, None - никуда не двигаем
+        """
+        profit = p.best - p.entry if p.is_long else p.entry - p.best
+        target = None
+        if self.breakeven_profit is not None and self._convert(profit * p.quantity, p) >= self.breakeven_profit:
+            offset = p.entry * self.breakeven_offset
+            target = p.entry + offset if p.is_long else p.entry - offset
+        if self.trail is not None and profit > 0:
+            trailed = p.best - self.trail if p.is_long else p.best + self.trail
+            if target is None or (trailed > target if p.is_long else trailed < target):
+                target = trailed
+        return target
+
+    def _convert(self, amount, p):
+        """
+        Сумма в валюте инструмента -> валюта счета, -inf пока курс неизвестен
+        """
+        if self.rates is None or p.currency is None:
+            return amount
+        rate = self.rates.get(p.currency)
+        return -math.inf if rate is None else amount * rate
+
+    def pnl(self, symbol):
+        """
+        Нереализованный PnL позиции в валюте счета по последнему тику, None - позиции нет или нет курса
+        """
+        p = self.positions.get(symbol)
+        if p is None:
+            return None
+        pnl = self._convert((p.last - p.entry if p.is_long else p.entry - p.last) * p.quantity, p)
+        return None if pnl == -math.inf else pnl
+
+    def on_tick(self, symbol, bid, ask, ts=None):
+        """
+        Новый стоп, если его надо двигать, иначе None.
+        ts - время тика в секундах, по нему считается debounce (бэктест), без него - по часам
+        """
+        p = self.positions.get(symbol)
+        if p is None:
+            return
+
+        # long закрывается по bid, short по ask
+        price = float(bid) if p.is_long else float(ask)
+        if p.is_long and price <= p.stop or not p.is_long and price >= p.stop:
+            # стоп исполнила биржа
+            self.untrack(symbol)
+            return
+        if p.take_profit is not None and (p.is_long and price >= p.take_profit
+                                          or not p.is_long and price <= p.take_profit):
+            # исполнился тейк, стоп из пары биржа отменила
+            self.untrack(symbol)
+            return
+
+        p.last = price
+        if p.is_long and price > p.best or not p.is_long and price < p.best:
+            p.best = price
+
+        target = self._target(p)
+        if target is None:
+            return
+        move = target - p.stop if p.is_long else p.stop - target
+        if move < self.tick_size * 0.999:
+            return
+        stop = self._round(target, p.is_long)
+        if abs(float(stop) - p.stop) < self.tick_size / 2:
+            # после округления до тика стоп остался на месте
+            return
+
+        if p.task is not None and not p.task.done():
+            # ждем ответа на прошлый update_order
+            return
+        now = time.monotonic() if ts is None else ts
+        if now - p.sent_at < self.debounce:
+            return
+        p.sent_at = now
+
+        if self.api is None:
+            self._set_stop(p, stop)
+        else:
+            p.task = asyncio.get_running_loop().create_task(self._move(p, stop))
+        return stop
+
+    def _round(self, price, is_long):
+        # стоп округляем в сторону от цены, чтобы не придвинуть его ближе, чем надо,
+        # допуск - чтобы 100.6 - 0.5 = 100.0999.. во float не стало 100.09
+        epsilon = self.tick_size * 1e-6
+        price = price + epsilon if is_long else price - epsilon
+        return to_decimal(price, self.tick_size, ROUND_FLOOR if is_long else ROUND_CEILING)
+
+    def _set_stop(self, p, stop):
+        p.stop = float(stop)
+        if p.deal is not None:
+            p.deal.stop_loss = float(stop)
+        self.updates += 1
+
+    async def _find_stop_order(self, symbol):
+        """
+        id рабочего стопа или None, ошибка api - ApiError, а не "стопа нет"
+        """
+        for o in await self.api.fetch_active_orders():
+            if o.symbol_id == symbol and o.stop_price and o.is_working:
+                return o.order_id
+
+    def _drop(self, p):
+        # стопа нет (позицию закрыл тейк или руками) - двигать нечего
+        logging.warning('%s стоп ордер не найден, позиция больше не отслеживается', p.symbol)
+        if self.positions.get(p.symbol) is p:
+            del self.positions[p.symbol]
+
+    async def _move(self, p, stop):
+        try:
+            if p.order_id is None:
+                p.order_id = await self._find_stop_order(p.symbol)
+                if p.order_id is None:
+                    self._drop(p)
+                    return
+
+            r = await self.api.update_order(p.order_id, {
+                "stopPrice": str(stop),
+                "quantity": p.amount,
+            })
+            if r.status != 202:
+                logging.error('%s update_order %s: %s', p.symbol, r.status, await r.text())
+                # стоп мог уже не работать: переспрашиваем биржу, а не повторяем update_order каждые debounce
+                p.order_id = await self._find_stop_order(p.symbol)
+                if p.order_id is None:
+                    self._drop(p)
+                return
+            self._set_stop(p, stop)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('%s не удалось сдвинуть стоп', p.symbol)
@@ -0,0 +1,39 @@
+"""
+Локальный симулятор Exante API.
+
+python exante_simulator.py --port 8090 --tick-rate 20 --latency 0.05 --error-rate 0.01
+
+Трейдеры и тестеры подключаются через ExanteApi(..., endpoint_url='http://127.0.0.1:8090')
+"""
+import argparse
+
+from aiohttp import web
+
+from exante_api.simulator import ExanteSimulator
+
+parser = argparse.ArgumentParser(description='Exante API simulator')
+parser.add_argument('--host', dest='host', action='store', default='127.0.0.1')
+parser.add_argument('--port', dest='port', action='store', type=int, default=8090)
+parser.add_argument('--tick-rate', dest='tick_rate', action='store', type=float, default=10,
+                    help='quotes per second per symbol')
+parser.add_argument('--latency', dest='latency', action='store', type=float, default=0.0,
+                    help='REST latency in seconds')
+parser.add_argument('--latency-jitter', dest='latency_jitter', action='store', type=float, default=0.0)
+parser.add_argument('--error-rate', dest='error_rate', action='store', type=float, default=0.0,
+                    help='share of REST requests answered with 429')
+parser.add_argument('--start-price', dest='start_price', action='store', type=float, default=100.0)
+parser.add_argument('--spread', dest='spread', action='store', type=float, default=0.02)
+parser.add_argument('--digits', dest='digits', action='store', type=int, default=2)
+parser.add_argument('--journal', dest='journal', action='store', required=False,
+                    help='replay quotes from a trader journal instead of a random walk')
+parser.add_argument('--stall-after', dest='stall_after', action='store', type=float, required=False,
+                    help='stream connections go silent after N seconds')
+parser.add_argument('--seed', dest='seed', action='store', type=int, required=False)
+
+
+if __name__ == '__main__':
+    args = vars(parser.parse_args())
+    host = args.pop('host')
+    port = args.pop('port')
+    simulator = ExanteSimulator(**args)
+    web.run_app(simulator.get_app(), host=host, port=port)
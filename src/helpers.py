@@ -1,28 +1,25 @@
-from decimal import Decimal
-
 import numpy as np
 
 from bots.base import Signal
 
 
 def get_trend_for(data: list) -> int:
-    for row in data:
-        if np.isnan(row):
-            return 0
-
-    trend_up = bool(data == sorted(data))
-    trend_down = bool(data == sorted(data, reverse=True))
+    # одна разность соседних значений вместо двух сортировок
+    data = np.asarray(data, dtype=float)
+    if np.isnan(data).any():
+        return 0
 
-    if trend_up:
+    diff = np.diff(data)
+    if (diff >= 0).all():
         return Signal.BUY
-    elif trend_down:
+    elif (diff <= 0).all():
         return Signal.SELL
     else:
         return 0
 
 
-def get_mid_price(bid, ask):
-    return Decimal(ask) + (Decimal(bid) - Decimal(ask)) / 2
+def get_mid_price(bid, ask) -> float:
+    return float(ask) + (float(bid) - float(ask)) / 2
 
 
 async def send_admin_message(message, prefix=None):
@@ -0,0 +1,187 @@
+"""
+Нагрузочный тест: N трейдеров против локального симулятора Exante API.
+
+python load_test.py --trader arkk_sma --traders 50 --duration 60 --tick-rate 50
+
+Каждый трейдер это свой ExanteApi (отдельный счет), HistoricalData, бот и Processor
+из модуля трейдера. В конце печатается пропускная способность и хвосты задержек.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from exante_api import ExanteApi, HistoricalData
+from exante_api.simulator import ExanteSimulator, start_simulator
+from exante_api.stream import candle_gap_filler
+from replay_journal import load_trader, make_bot, make_processor
+
+import settings
+
+parser = argparse.ArgumentParser(description='load test')
+parser.add_argument('--trader', dest='trader', action='store', required=True,
+                    help='trader name from settings/traders.json, e.g. arkk_sma')
+parser.add_argument('--config', dest='config', action='store', default=settings.TRADERS_CONFIG)
+parser.add_argument('--traders', dest='traders', action='store', type=int, default=10)
+parser.add_argument('--duration', dest='duration', action='store', type=float, default=30)
+parser.add_argument('--url', dest='url', action='store', required=False,
+                    help='running simulator url, by default simulator is started in-process')
+parser.add_argument('--port', dest='port', action='store', type=int, default=8090)
+parser.add_argument('--tick-rate', dest='tick_rate', action='store', type=float, default=10)
+parser.add_argument('--latency', dest='latency', action='store', type=float, default=0.0)
+parser.add_argument('--latency-jitter', dest='latency_jitter', action='store', type=float, default=0.0)
+parser.add_argument('--error-rate', dest='error_rate', action='store', type=float, default=0.0)
+parser.add_argument('--stall-after', dest='stall_after', action='store', type=float, required=False,
+                    help='stream connections go silent after N seconds, to exercise failover')
+parser.add_argument('--stale-after', dest='stale_after', action='store', type=float, default=10.0,
+                    help='seconds without stream data before failover')
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Stats:
+    def __init__(self):
+        self.events = 0
+        self.tick_latency = []  # от timestamp котировки до конца on_event, мс
+        self.on_event_time = []  # время обработки события, мс
+        self.rest_latency = []  # мс
+        self.rest_statuses = {}
+        self.apis = []  # для счетчиков стримов в конце теста
+
+    def get_trace_config(self):
+        async def on_request_start(session, ctx, params):
+            ctx.started = time.perf_counter()
+
+        async def on_request_end(session, ctx, params):
+            if params.response.headers.get('Content-Type') == 'application/x-json-stream':
+                # стрим живет все время теста, это не запрос
+                return
+            self.rest_latency.append((time.perf_counter() - ctx.started) * 1000)
+            status = params.response.status
+            self.rest_statuses[status] = self.rest_statuses.get(status, 0) + 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def wrap(self, on_event):
+        async def timed_on_event(data):
+            started = time.perf_counter()
+            await on_event(data)
+            finished = time.perf_counter()
+
+            self.events += 1
+            self.on_event_time.append((finished - started) * 1000)
+            if data.get('timestamp'):
+                self.tick_latency.append(time.time() * 1000 - data['timestamp'])
+
+        return timed_on_event
+
+    def stream_stats(self):
+        totals = {}
+        for api in self.apis:
+            if api.stream is None:
+                continue
+            for key, value in api.stream.stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+async def run_trader(trader, i, url, stats, stale_after):
+    api = ExanteApi(
+        application_id='load',
+        access_key='load',
+        demo=True,
+        account_id='LOAD%04d' % i,
+        currency='EUR',
+        endpoint_url=url,
+    )
+    api._client = aiohttp.ClientSession(auth=api.get_auth(), trace_configs=[stats.get_trace_config()])
+    stats.apis.append(api)
+
+    try:
+        data = await api.get_ohlcv_arrays(trader['symbol'], trader['time_interval'], size=1000)
+        historical_data = HistoricalData(trader['time_interval'], data)
+        bot = make_bot(trader, historical_data)
+        processor = make_processor(trader, historical_data, bot, api)
+        await api.quote_stream(trader['symbol'], stats.wrap(processor.on_event), time_interval=trader['time_interval'],
+                               on_gap=candle_gap_filler(historical_data, bot), stale_after=stale_after,
+                               metrics_interval=None)
+    finally:
+        await api.close()
+
+
+async def main(trader, traders, duration, config=settings.TRADERS_CONFIG, url=None, port=8090, stale_after=10.0,
+               **simulator_params):
+    logging.getLogger().setLevel(logging.WARNING)
+
+    trader = load_trader(trader, config)
+
+    runner = None
+    simulator = None
+    if not url:
+        simulator = ExanteSimulator(**simulator_params)
+        runner = await start_simulator(simulator, port=port)
+        url = 'http://127.0.0.1:%d' % port
+
+    stats = Stats()
+    tasks = [asyncio.ensure_future(run_trader(trader, i, url, stats, stale_after)) for i in range(traders)]
+    started = time.perf_counter()
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=duration)
+        for task in done:
+            if task.exception():
+                logging.error('trader failed: %r', task.exception())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        if runner:
+            await runner.cleanup()
+    elapsed = time.perf_counter() - started
+
+    print("""
+    traders: {traders}
+    elapsed: {elapsed:.1f}s
+    events: {events} ({events_rate:.0f}/s)
+    tick latency ms: p50={tick_p50:.2f} p95={tick_p95:.2f} p99={tick_p99:.2f} max={tick_max:.2f}
+    on_event ms: p50={event_p50:.3f} p99={event_p99:.3f} max={event_max:.3f}
+    rest requests: {rest} ({rest_rate:.1f}/s) statuses={statuses}
+    rest latency ms: p50={rest_p50:.2f} p95={rest_p95:.2f} p99={rest_p99:.2f} max={rest_max:.2f}
+    streams: {stream_stats}
+    """.format(
+        traders=traders,
+        elapsed=elapsed,
+        events=stats.events,
+        events_rate=stats.events / elapsed,
+        tick_p50=percentile(stats.tick_latency, 50),
+        tick_p95=percentile(stats.tick_latency, 95),
+        tick_p99=percentile(stats.tick_latency, 99),
+        tick_max=max(stats.tick_latency, default=0),
+        event_p50=percentile(stats.on_event_time, 50),
+        event_p99=percentile(stats.on_event_time, 99),
+        event_max=max(stats.on_event_time, default=0),
+        rest=len(stats.rest_latency),
+        rest_rate=len(stats.rest_latency) / elapsed,
+        statuses=stats.rest_statuses,
+        rest_p50=percentile(stats.rest_latency, 50),
+        rest_p95=percentile(stats.rest_latency, 95),
+        rest_p99=percentile(stats.rest_latency, 99),
+        rest_max=max(stats.rest_latency, default=0),
+        stream_stats=stats.stream_stats(),
+    ))
+    if simulator:
+        print('simulator: %s' % simulator.stats)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    asyncio.run(main(**vars(args)))
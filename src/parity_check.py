@@ -0,0 +1,231 @@
+"""
+Сверка живого и тестового пути бота на одном потоке тиков.
+
+python parity_check.py --trader stock_sma_bot --journal journal/demo_2_URA.ARCA.bin
+python parity_check.py --trader stock_sma_bot --ticks ticks_URA.ARCA.npy --history history_URA.ARCA
+
+Живой путь - Processor.on_event трейдера: бот получает historical_data.get_last_candle()
+и mid цену тика, с которого началась новая свеча. Тестовый путь - как в tester_*.py:
+bot.add_candle(candle), затем check_price(candle.close). Оба бота стартуют с одной истории
+и получают тики одновременно, решения сравниваются по каждой свече, время путей меряется отдельно.
+
+--exchange-bars: тестовый путь берет свечи из --history (как тестеры, свечи биржи),
+а не собирает их из тиков, так видно расхождение свечей биржи и свечей трейдера.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+
+from backtest.ticks import load_ticks
+from bots.base import CandleStick, CloseOpenedDeal
+from exante_api import Event, HistoricalData
+from exante_api.fake import FakeExanteApi
+from exante_api.journal import Journal, JournaledBot, read_journal, STREAM, CANDLE, DECISION
+from replay_journal import load_trader, make_bot, make_processor
+
+import settings
+
+parser = argparse.ArgumentParser(description='live/backtest parity check')
+parser.add_argument('--trader', dest='trader', action='store', required=True,
+                    help='trader name from settings/traders.json, e.g. stock_sma_bot')
+parser.add_argument('--config', dest='config', action='store', default=settings.TRADERS_CONFIG)
+parser.add_argument('--journal', dest='journal', action='store',
+                    help='trader journal: stream and api responses')
+parser.add_argument('--ticks', dest='ticks', action='store', help='ticks .npy, see backtest.ticks')
+parser.add_argument('--history', dest='history', action='store', help='history file as in tester_*.py')
+parser.add_argument('--exchange-bars', dest='exchange_bars', action='store_true')
+parser.add_argument('--history-size', dest='history_size', action='store', type=int, default=1000)
+parser.add_argument('--verbose', dest='verbose', action='store_true')
+
+
+def load_history(path, first_ts=None):
+    with open(path, 'r') as json_file:
+        data = json.load(json_file)
+    if first_ts is not None:
+        # только свечи до первого тика, история от новых к старым
+        data = [row for row in data if row['timestamp'] < first_ts]
+    return data
+
+
+def events_from_ticks(ticks):
+    """
+    Тики в формате событий стрима, как их отдает ExanteApi.parse_stream_lines
+    """
+    for ts, bid, ask in zip(ticks['ts'].tolist(), ticks['bid'].tolist(), ticks['ask'].tolist()):
+        yield {"timestamp": ts, "bid": [{"price": repr(bid)}], "ask": [{"price": repr(ask)}]}
+
+
+def events_from_journal(api, path):
+    for record_type, ts, payload in read_journal(path):
+        if record_type == STREAM:
+            yield from api.parse_stream_lines(payload)
+
+
+def get_signals(records):
+    """
+    {candle_ts: (сигнал, цена)}, сигнал - сторона сделки, close или None
+    """
+    signals = {}
+    for record_type, ts, payload in records:
+        if record_type == DECISION:
+            data = json.loads(payload)
+            signal = 'close' if data['close'] else data['deal'] and data['deal']['side']
+            signals[data['candle_ts']] = (signal, float(data['price']))
+    return signals
+
+
+def get_candles(records):
+    candles = {}
+    for record_type, ts, payload in records:
+        if record_type == CANDLE:
+            data = json.loads(payload)
+            candles[data['timestamp']] = tuple(float(data[k]) for k in ('open', 'high', 'low', 'close'))
+    return candles
+
+
+class TesterPath:
+    """
+    Тестовый путь на тех же тиках: свеча закрылась -> add_candle, check_price(candle.close).
+    bars - {ts: CandleStick} свечи биржи вместо собранных из тиков
+    """
+
+    def __init__(self, bot, historical_data: HistoricalData, bars=None):
+        self.bot = bot
+        self.historical_data = historical_data
+        self.bars = bars
+        self.candles_count = 0
+        self.elapsed = 0.0
+
+    async def on_event(self, data):
+        e = Event(data)
+        if e.type != 'new_price':
+            return
+
+        started = time.perf_counter()
+        historical_data = self.historical_data
+        last_ts = historical_data.last_ts
+        historical_data.add_data(e.ts, e.bid, e.ask)
+
+        # свеча закрывается по тому же условию, что и в Processor
+        if last_ts and last_ts != historical_data.last_ts:
+            candle = historical_data.get_last_candle()
+            if self.bars is not None:
+                candle = self.bars.get(candle.timestamp)
+
+            if candle is not None:
+                self.candles_count += 1
+                self.bot.add_candle(candle)
+                try:
+                    await self.bot.check_price(candle.close)
+                except CloseOpenedDeal:
+                    pass
+
+        self.elapsed += time.perf_counter() - started
+
+
+async def main(trader, config=settings.TRADERS_CONFIG, journal=None, ticks=None, history=None, exchange_bars=False, history_size=1000,
+               verbose=False):
+    if not journal and not ticks:
+        parser.error('--journal or --ticks is required')
+    if (ticks or exchange_bars) and not history:
+        parser.error('--history is required with --ticks and --exchange-bars')
+
+    trader = load_trader(trader, config)
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if journal:
+        api = FakeExanteApi.from_journal(journal)
+    else:
+        api = FakeExanteApi()
+
+    try:
+        if ticks:
+            ticks = load_ticks(ticks)
+            events = list(events_from_ticks(ticks))
+            data = load_history(history, first_ts=int(ticks['ts'][0]))
+        else:
+            events = list(events_from_journal(api, journal))
+            r = await api.get_ohlcv(trader['symbol'], trader['time_interval'], size=history_size)
+            data = await r.json()
+
+        bars = None
+        if exchange_bars:
+            bars = {
+                row['timestamp'] // 1000: CandleStick(row['timestamp'] // 1000, row['open'], row['high'],
+                                                      row['low'], row['close'])
+                for row in load_history(history)
+            }
+
+        live_journal = Journal()
+        live_data = HistoricalData(trader['time_interval'], data)
+        processor = make_processor(trader, live_data, JournaledBot(make_bot(trader, live_data), live_journal), api)
+
+        tester_journal = Journal()
+        tester_data = HistoricalData(trader['time_interval'], data)
+        tester = TesterPath(JournaledBot(make_bot(trader, tester_data), tester_journal), tester_data, bars)
+
+        live_elapsed = 0.0
+        for e in events:
+            started = time.perf_counter()
+            await processor.on_event(e)
+            live_elapsed += time.perf_counter() - started
+
+            await tester.on_event(e)
+    finally:
+        await api.close()
+
+    live = get_signals(live_journal.records)
+    tested = get_signals(tester_journal.records)
+    common = sorted(set(live) & set(tested))
+    mismatches = [ts for ts in common if live[ts][0] != tested[ts][0]]
+    price_diff = np.abs(np.array([live[ts][1] - tested[ts][1] for ts in common], dtype=float))
+
+    live_candles = get_candles(live_journal.records)
+    tested_candles = get_candles(tester_journal.records)
+    candle_mismatches = sum(
+        1 for ts in set(live_candles) & set(tested_candles) if live_candles[ts] != tested_candles[ts]
+    )
+
+    print("""
+    events: {events_count}
+    candles: {live_count} live, {tested_count} tester, {common} common
+    live: {live_elapsed:.3f}s, {live_rate:.0f} events/s
+    tester: {tester_elapsed:.3f}s, {tester_per_candle:.3f} ms/candle
+    signals: {live_signals} live, {tested_signals} tester
+    signal mismatches: {mismatches}
+    candle mismatches: {candle_mismatches}
+    price diff: mean {price_mean:.6f}, max {price_max:.6f}
+    """.format(
+        events_count=len(events),
+        live_count=len(live),
+        tested_count=len(tested),
+        common=len(common),
+        live_elapsed=live_elapsed,
+        live_rate=len(events) / live_elapsed if live_elapsed else 0,
+        tester_elapsed=tester.elapsed,
+        tester_per_candle=tester.elapsed / tester.candles_count * 1000 if tester.candles_count else 0,
+        live_signals=sum(1 for signal, price in live.values() if signal),
+        tested_signals=sum(1 for signal, price in tested.values() if signal),
+        mismatches=len(mismatches),
+        candle_mismatches=candle_mismatches,
+        price_mean=price_diff.mean() if len(price_diff) else 0,
+        price_max=price_diff.max() if len(price_diff) else 0,
+    ))
+
+    # после первого расхождения боты с состоянием (RSI полосы) могут разойтись и дальше
+    for ts in mismatches[:20]:
+        print('%s: live=%s @ %.5f, tester=%s @ %.5f' % (
+            datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M'),
+            live[ts][0], live[ts][1], tested[ts][0], tested[ts][1],
+        ))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    asyncio.run(main(**vars(args)))
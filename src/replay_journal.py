@@ -0,0 +1,122 @@
+"""
+Прогоняет журнал трейдера через Processor.on_event и бота на максимальной скорости.
+
+python replay_journal.py --trader arkk_sma --journal journal/demo_2_ARKK.ARCA.bin
+
+REST запросы обслуживает FakeExanteApi ответами из того же журнала,
+решения бота сравниваются с записанными в журнале.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from exante_api import HistoricalData
+from exante_api.fake import FakeExanteApi
+from exante_api.journal import Journal, JournaledBot, read_journal, STREAM, DECISION
+
+import settings
+import trader as runner
+from bots import registry
+
+parser = argparse.ArgumentParser(description='journal replay')
+parser.add_argument('--trader', dest='trader', action='store', required=True,
+                    help='trader name from settings/traders.json, e.g. arkk_sma')
+parser.add_argument('--config', dest='config', action='store', default=settings.TRADERS_CONFIG)
+parser.add_argument('--journal', dest='journal', action='store', required=True)
+parser.add_argument('--history-size', dest='history_size', action='store', type=int, default=1000)
+parser.add_argument('--verbose', dest='verbose', action='store_true')
+
+
+async def send_admin_message_stub(message, prefix=None):
+    pass
+
+
+def load_trader(name, config=settings.TRADERS_CONFIG):
+    """
+    Конфиг трейдера, в телеграм при реплее и тестах ничего не шлем
+    """
+    runner.send_admin_message = send_admin_message_stub
+    return runner.load_config(config)[name]
+
+
+def make_bot(trader, historical_data):
+    return registry.make_bot(trader['bot'], historical_data.get_list())
+
+
+def make_processor(trader, historical_data, bot, api):
+    return runner.Processor(trader, historical_data, bot=bot, api=api)
+
+
+def get_decisions(records):
+    """
+    {candle_ts: (close, side)}
+    """
+    decisions = {}
+    for record_type, ts, payload in records:
+        if record_type == DECISION:
+            data = json.loads(payload)
+            decisions[data['candle_ts']] = (data['close'], data['deal'] and data['deal']['side'])
+    return decisions
+
+
+async def main(trader, journal, config=settings.TRADERS_CONFIG, history_size=1000, verbose=False):
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    trader = load_trader(trader, config)
+
+    api = FakeExanteApi.from_journal(journal)
+    replay_journal = Journal()
+
+    try:
+        data = await api.get_ohlcv_arrays(trader['symbol'], trader['time_interval'], size=history_size)
+        historical_data = HistoricalData(trader['time_interval'], data)
+        bot = JournaledBot(make_bot(trader, historical_data), replay_journal)
+        processor = make_processor(trader, historical_data, bot, api)
+
+        chunks = [payload for record_type, ts, payload in read_journal(journal) if record_type == STREAM]
+
+        events_count = 0
+        started = time.perf_counter()
+        for chunk in chunks:
+            for e in api.parse_stream_lines(chunk):
+                events_count += 1
+                await processor.on_event(e)
+        elapsed = time.perf_counter() - started
+    finally:
+        await api.close()
+
+    original = get_decisions(read_journal(journal))
+    replayed = get_decisions(replay_journal.records)
+    mismatches = sorted(
+        (candle_ts, original.get(candle_ts), replayed.get(candle_ts))
+        for candle_ts in set(original) & set(replayed)
+        if original[candle_ts] != replayed[candle_ts]
+    )
+
+    print("""
+    events: {events_count}
+    elapsed: {elapsed:.3f}s
+    events/s: {rate:.0f}
+    api requests: {requests}
+    decisions: {original} original, {replayed} replayed
+    mismatches: {mismatches}
+    """.format(
+        events_count=events_count,
+        elapsed=elapsed,
+        rate=events_count / elapsed if elapsed else 0,
+        requests=len(api.client.requests),
+        original=len(original),
+        replayed=len(replayed),
+        mismatches=len(mismatches),
+    ))
+
+    for candle_ts, o, r in mismatches[:20]:
+        print('candle %s: original=%s replayed=%s' % (candle_ts, o, r))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    asyncio.run(main(**vars(args)))
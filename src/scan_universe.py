@@ -0,0 +1,188 @@
+"""
+Сканер инструментов из таблицы symbols (заполняет import_symbols.py): на каждой свече
+забирает последние свечи всех инструментов, считает стратегию сразу по всем
+(bots/strategy_bot/scanner.py) и публикует кандидатов по убыванию score.
+
+python scan_universe.py --spec stock_sma_bot --symbol-type STOCK --exchange ARCA
+python scan_universe.py --spec rsi_bot --symbols URA.ARCA,ARKK.ARCA,BOTZ.NASDAQ,COPX.ARCA
+python scan_universe.py --spec rsi_bot --symbols URA.ARCA,ARKK.ARCA --url http://127.0.0.1:8090 --once
+
+Кандидаты пишутся в candidates_file (для трейдеров и ноутбуков) и в лог,
+первые top - в телеграм, если send_telegram.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import aiohttp
+
+from bots.strategy_bot.scanner import Scanner
+from bots.strategy_bot.specs import SPECS
+from exante_api import ExanteApi
+from exante_api.client import TooManyRequests
+from exante_api.log import setup_logging
+from helpers import send_admin_message
+
+import settings
+
+account_name = 'demo_2'
+time_interval = 300
+window = 300  # свечей на инструмент
+concurrency = 20  # одновременных запросов get_ohlcv
+retries = 3
+close_delay = 5  # секунд после закрытия свечи, чтобы биржа ее отдала
+candidates_file = 'scanner_candidates.json'
+top = 20
+send_telegram = False
+# ранжирование по умолчанию - размер последней свечи относительно цены
+default_score = ["abs", ["/", ["-", "close", ["lag", "close", 1]], ["lag", "close", 1]]]
+db = {
+    "host": "localhost",
+    "database": "exante",
+    "user": "user2",
+    "password": "user2",
+}
+
+setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+parser = argparse.ArgumentParser(description='universe scanner')
+parser.add_argument('--spec', dest='spec', action='store', default='stock_sma_bot', choices=sorted(SPECS))
+parser.add_argument('--symbols', dest='symbols', action='store', help='comma separated, instead of symbols table')
+parser.add_argument('--symbol-type', dest='symbol_type', action='store', help='e.g. STOCK, FUND, FX_SPOT')
+parser.add_argument('--exchange', dest='exchange', action='store')
+parser.add_argument('--currency', dest='currency', action='store')
+parser.add_argument('--limit', dest='limit', action='store', type=int)
+parser.add_argument('--url', dest='url', action='store', help='api url, e.g. local simulator')
+parser.add_argument('--once', dest='once', action='store_true', help='scan the last closed candle and exit')
+
+
+def load_universe(symbol_type=None, exchange=None, currency=None, limit=None):
+    # psycopg2 нужен только для таблицы symbols
+    import psycopg2
+
+    sql = "SELECT symbol_id FROM symbols WHERE true"
+    args = []
+    for column, value in (('symbol_type', symbol_type), ('exchange', exchange), ('currency', currency)):
+        if value:
+            sql += " AND %s = %%s" % column
+            args.append(value)
+    sql += " ORDER BY symbol_id"
+    if limit:
+        sql += " LIMIT %s"
+        args.append(limit)
+
+    conn = psycopg2.connect(**db)
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, args)
+        # bpchar дополнен пробелами
+        return [row[0].strip() for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+async def fetch_ohlcv(api, symbols, size):
+    """
+    {symbol: свечи} по всем инструментам, не больше concurrency запросов сразу
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(symbol):
+        async with semaphore:
+            for attempt in range(retries):
+                try:
+                    r = await api.get_ohlcv(symbol, time_interval, size=size)
+                    if r.status != 200:
+                        logging.warning('%s get_ohlcv %s', symbol, r.status)
+                        return symbol, []
+                    return symbol, await r.json()
+                except TooManyRequests:
+                    await asyncio.sleep(2 ** attempt)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.warning('%s get_ohlcv %r', symbol, e)
+                    await asyncio.sleep(1)
+            return symbol, []
+
+    return dict(await asyncio.gather(*(fetch(symbol) for symbol in symbols)))
+
+
+def last_closed_ts(now=None):
+    now = time.time() if now is None else now
+    return int(now) // time_interval * time_interval - time_interval
+
+
+async def publish(spec_name, ts, candidates, elapsed):
+    logging.info('%s %s: %s candidates, %.2fs', spec_name, ts, len(candidates), elapsed)
+    for c in candidates[:top]:
+        logging.info('  %-20s %-5s score=%.5f price=%s', c['symbol'], c['signal'].value, c['score'], c['price'])
+
+    data = {
+        "spec": spec_name,
+        "timestamp": ts,
+        "candidates": [{**c, "signal": c['signal'].value} for c in candidates],
+    }
+    tmp = candidates_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    # файл читают другие процессы, подменяем атомарно
+    os.replace(tmp, candidates_file)
+
+    if send_telegram and candidates:
+        await send_admin_message('\n'.join(
+            '%s %s %.5f' % (c['symbol'], c['signal'].value, c['score']) for c in candidates[:top]
+        ), '#scanner #%s' % spec_name)
+
+
+async def main(spec, symbols=None, symbol_type=None, exchange=None, currency=None, limit=None, url=None,
+               once=False):
+    if symbols:
+        symbols = [s.strip() for s in symbols.split(',') if s.strip()]
+    else:
+        symbols = load_universe(symbol_type, exchange, currency, limit)
+    if not symbols:
+        parser.error('empty universe')
+
+    spec_name = spec
+    spec = {**SPECS[spec_name]}
+    spec.setdefault('score', default_score)
+    scanner = Scanner(symbols, spec, time_interval, window=window)
+    logging.info('%s symbols, %.1f MB', len(symbols), scanner.nbytes / 1e6)
+
+    api = ExanteApi(**settings.ACCOUNTS[account_name], endpoint_url=url)
+    try:
+        started = time.perf_counter()
+        ts = last_closed_ts()
+        scanner.start(ts)
+        for symbol, ohlcv in (await fetch_ohlcv(api, symbols, window + 1)).items():
+            scanner.load(symbol, ohlcv)
+        scanner.warmup()
+        logging.info('warmup %.2fs', time.perf_counter() - started)
+
+        if once:
+            await publish(spec_name, ts, scanner.scan(), time.perf_counter() - started)
+            return
+
+        while True:
+            # следующая свеча закрывается через interval после своего начала
+            await asyncio.sleep(max(0, ts + 2 * time_interval + close_delay - time.time()))
+            ts = last_closed_ts()
+
+            started = time.perf_counter()
+            bars = {}
+            # size=2: закрытая свеча и текущая незакрытая
+            for symbol, ohlcv in (await fetch_ohlcv(api, symbols, 2)).items():
+                for row in ohlcv:
+                    if row['timestamp'] // 1000 == ts:
+                        bars[symbol] = row
+            scanner.push(ts, bars)
+            await publish(spec_name, ts, scanner.scan(), time.perf_counter() - started)
+    finally:
+        await api.close()
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    asyncio.run(main(**vars(args)))
@@ -1,6 +1,15 @@
+import os
+
 TELEGRAM_TOKEN = None
 TELEGRAM_CHAT_ID = None
 
+# text или json, см. exante_api/log.py
+LOG_LEVEL = 'INFO'
+LOG_FORMAT = 'text'
+
+# трейдеры trader.py: инструменты, счета, боты
+TRADERS_CONFIG = os.path.join(os.path.dirname(__file__), 'traders.json')
+
 
 ACCOUNTS = {
     'demo_1': {
@@ -1,5 +1,4 @@
 import asyncio
-from decimal import Decimal
 
 from pymongo import MongoClient
 from slugify import slugify
@@ -9,6 +8,8 @@ from bots.base import CloseOpenedDeal, Signal
 from bots.elder_bot.bot import ElderBot
 from bots.multibot.bot import MultiBot
 from bots.stupid_bot.money_manager import SimpleMoneyManager
+from backtest.chart import export_chart
+from backtest.metrics import TradeLog, candles_to_array, report, format_report
 from exante_api import ExanteApi, HistoricalData
 
 api = ExanteApi(**settings.ACCOUNTS['demo_2'])
@@ -19,6 +20,8 @@ symbol = 'URA.ARCA'
 time_interval = 300
 max_candles = 10000
 show_plot = True
+# html/png вместо fig.show(): прореженные свечи и сделки одним трейсом, без браузера
+chart_file = None  # 'chart_%s.html' % symbol.replace('/', '_')
 
 MONGO_HOST = 'localhost'
 MONGO_PORT = 27017
@@ -46,21 +49,26 @@ class Tester:
         self.annotations = []
         self.take_profit_deals = 0
         self.stop_loss_deals = 0
-        self.profit = Decimal(0)
-        self.loss = Decimal(0)
-        self.drawdown = Decimal(0)
-        self.all_drawdowns = []
+        self.profit = 0.0
+        self.loss = 0.0
+        self.trade_log = TradeLog()
 
     def get_profit_factor(self):
-        return '%.2f' % float(self.profit / self.loss) if self.loss else 0
+        return float(self.profit / self.loss) if self.loss else 0
 
     def get_total_profit(self):
         return self.profit - self.loss
 
     def get_max_drawdown(self):
-        return max(self.all_drawdowns) if self.all_drawdowns else 0
+        # от пика до дна по закрытым сделкам
+        return report(self.trade_log.to_array())['max_drawdown']
 
-    def _handle_deal_profit(self, deal_profit, date, price):
+    def _handle_new_deal(self, deal, date, ts):
+        self.trade_log.open(deal, ts)
+        self._add_deal_to_chart(deal, date)
+
+    def _handle_deal_profit(self, deal_profit, date, price, ts):
+        self.trade_log.close(deal_profit, ts, price)
         if deal_profit >= 0:
             self.annotations.append(
                 dict(
@@ -72,8 +80,6 @@ class Tester:
             )
             self.take_profit_deals += 1
             self.profit += deal_profit
-            self.all_drawdowns.append(self.drawdown)
-            self.drawdown = Decimal(0)
         else:
             self.annotations.append(
                 dict(
@@ -85,7 +91,6 @@ class Tester:
             )
             self.stop_loss_deals += 1
             self.loss += abs(deal_profit)
-            self.drawdown += abs(deal_profit)
 
     def _add_deal_to_chart(self, deal, date):
         # наносим на график
@@ -136,7 +141,6 @@ class Tester:
             # fig.show()
             # exit()
 
-            fig = historical_data.get_plotly_figure()
             open_deal = None
 
             for candle in historical_data.get_list():
@@ -149,7 +153,7 @@ class Tester:
                     if profit is not None:
                         # закрываем сделку и наносим на график
                         open_deal = None
-                        self._handle_deal_profit(profit, dt, price)
+                        self._handle_deal_profit(profit, dt, price, candle.timestamp)
 
                 # добавляем свечку к историческим данным
                 bot.add_candle(candle)
@@ -167,32 +171,35 @@ class Tester:
                                 profit = open_deal.close(price)
                                 if profit is not None:
                                     # закрываем сделку и наносим на график
-                                    self._handle_deal_profit(profit, dt, price)
+                                    self._handle_deal_profit(profit, dt, price, candle.timestamp)
 
                                 open_deal = possible_deal
-                                self._add_deal_to_chart(open_deal, dt)
+                                self._handle_new_deal(open_deal, dt, candle.timestamp)
                             else:
                                 # сделка в ту же сторону что и уже открытая
                                 # @TODO возможно есть смысл переоткрыть сделку
                                 pass
                         else:
                             open_deal = possible_deal
-                            self._add_deal_to_chart(open_deal, dt)
+                            self._handle_new_deal(open_deal, dt, candle.timestamp)
                 except CloseOpenedDeal:
                     if open_deal:
                         profit = open_deal.close(price)
                         if profit is not None:
                             # закрываем сделку и наносим на график
-                            self._handle_deal_profit(profit, dt, price)
+                            self._handle_deal_profit(profit, dt, price, candle.timestamp)
                         open_deal = None
 
-            fig.update_layout(annotations=self.annotations)
-            if show_plot:
+            if chart_file:
+                export_chart(chart_file, historical_data, self.trade_log.trades)
+            elif show_plot:
+                fig = historical_data.get_plotly_figure()
+                fig.update_layout(annotations=self.annotations)
                 fig.show()
             print("""
             take_profit_deals: {take_profit_deals}
             stop_loss_deals: {stop_loss_deals}
-            profit_factor: {profit_factor}
+            profit_factor: {profit_factor:.2f}
             profit: {profit:.2f}
             loss: {loss:.2f}
             total profit: {total_profit:.2f}$
@@ -206,6 +213,8 @@ class Tester:
                 total_profit=self.get_total_profit(),
                 max_drawdown=self.get_max_drawdown(),
             ))
+            stats = report(self.trade_log.to_array(), candles_to_array(historical_data.ohlc_data))
+            print(format_report(stats))
         finally:
             await api.close()
 
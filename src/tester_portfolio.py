@@ -0,0 +1,79 @@
+import time
+from datetime import datetime
+
+from backtest.portfolio import BotConfig, run_portfolio, aggregate
+from bots.base import Signal
+from bots.stock_sma_bot.bot import StockSmaBot
+
+symbols = [
+    'URA.ARCA',
+    'ARKK.ARCA',
+    'BOTZ.NASDAQ',
+    'COPX.ARCA',
+]
+time_interval = 300
+bot_config = BotConfig(
+    bot_class=StockSmaBot,
+    money_manager={
+        "order_amount": 100,
+        "diff": 0.2,
+        "stop_loss_factor": 2,
+        "take_profit_factor": 8,
+    },
+    bot_params={
+        "trend_len": 2,
+        "is_short_allowed": False,
+        "only_main_session": True,
+        "close_signal": Signal.CLOSE,
+    },
+)
+# None - окна train только прогревают бота, иначе подбираем параметры на каждом окне
+param_grid = None
+# param_grid = {
+#     "trend_len": [1, 2, 3],
+#     "low_sma_value": [20, 30],
+# }
+train_size = 1000  # свечей
+test_size = 500
+processes = None  # по числу ядер
+
+
+def main():
+    started = time.perf_counter()
+    results = run_portfolio(
+        symbols=symbols,
+        config=bot_config,
+        time_interval=time_interval,
+        train_size=train_size,
+        test_size=test_size,
+        param_grid=param_grid,
+        processes=processes,
+    )
+    elapsed = time.perf_counter() - started
+
+    for r in results:
+        print('{symbol:<14} {start} - {end}  trades={trades:<4} profit={profit:>10.2f} {params}'.format(
+            symbol=r['symbol'],
+            start=datetime.fromtimestamp(r['start_ts']).strftime('%Y-%m-%d %H:%M'),
+            end=datetime.fromtimestamp(r['end_ts']).strftime('%Y-%m-%d %H:%M'),
+            trades=len(r['trades']),
+            profit=r['profit'] - r['loss'],
+            params=r['bot_params'] if param_grid else '',
+        ))
+
+    stats = aggregate(results)
+    print("""
+    windows: {windows} ({cached} from cache), {elapsed:.1f}s
+    trades: {trades}
+    profit_factor: {profit_factor:.2f}
+    profit: {profit:.2f}
+    loss: {loss:.2f}
+    total profit: {total_profit:.2f}$
+    max_drawdown: {max_drawdown:.2f}
+    exposure: {exposure:.1%}
+    per symbol: {per_symbol}
+    """.format(windows=len(results), elapsed=elapsed, **stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,190 +1,145 @@
 import asyncio
 import json
-from decimal import Decimal
+from datetime import datetime
 
 import settings
 from bots.rsi_bot.bot import RsiBot
-from bots.stupid_bot.money_manager import SimpleMoneyManager
+from backtest.chart import export_chart
+from backtest.checkpoint import CheckpointStore, run_cached
+from backtest.engine import CandleBacktest
+from backtest.metrics import candles_to_array, report, format_report, trades_to_array
+from backtest.portfolio import BotConfig, merge_history
 from exante_api import ExanteApi, HistoricalData
 
 api = ExanteApi(**settings.ACCOUNTS['demo_2'])
 symbol = 'EUR/NZD.E.FX'
 time_interval = 300
-money_manager = SimpleMoneyManager(
-    order_amount=100000,
-    diff=Decimal(0.001),
-    stop_loss_factor=2,
-    take_profit_factor=10,
-    trailing_stop=False
+config = BotConfig(
+    bot_class=RsiBot,
+    money_manager=dict(
+        order_amount=100000,
+        diff=0.001,
+        stop_loss_factor=2,
+        take_profit_factor=10,
+        trailing_stop=False
+    ),
+    bot_params={
+        'upper_band': 80,
+        'lower_band': 20,
+    },
 )
-bot_params = {
-    'upper_band': 80,
-    'lower_band': 20,
-}
-bot_class = RsiBot
-max_candles = 5000
+# None - вся накопленная история; последние max_candles - окно сдвигается с каждым обновлением
+# файла, и кеш бэктеста считает все заново
+max_candles = None
+# новые свечи дописываются к файлу, а не заменяют его
 update_file = False
 show_plot = True
+# результат и состояние бота в backtest_cache/checkpoints, см. backtest/checkpoint.py
+use_cache = True
+# html/png вместо fig.show(): прореженные свечи и сделки одним трейсом, без браузера
+chart_file = None  # 'chart_%s.html' % symbol.replace('/', '_')
 
 
 class Tester:
     def __init__(self):
         self.annotations = []
-        self.take_profit_deals = 0
-        self.stop_loss_deals = 0
-        self.profit = Decimal(0)
-        self.loss = Decimal(0)
-        self.drawdown = Decimal(0)
-        self.all_drawdowns = []
-
-    def get_profit_factor(self):
-        return '%.2f' % float(self.profit / self.loss) if self.loss else 0
-
-    def get_total_profit(self):
-        return self.profit - self.loss
+        self.backtest = None
 
     def get_max_drawdown(self):
-        return max(self.all_drawdowns) if self.all_drawdowns else 0
-
-    def _handle_deal_profit(self, deal_profit, date, price):
-        if deal_profit >= 0:
-            self.annotations.append(
-                dict(
-                    x=date, y=price, xref='x', yref='y',
-                    showarrow=True, xanchor='center', text='+%.2f' % deal_profit,
-                    font=dict(color="green", size=16), arrowcolor="green",
-                    arrowhead=1, hovertext=str(deal_profit)
-                )
-            )
-            self.take_profit_deals += 1
-            self.profit += deal_profit
-            self.all_drawdowns.append(self.drawdown)
-            self.drawdown = Decimal(0)
-        else:
-            self.annotations.append(
-                dict(
-                    x=date, y=price, xref='x', yref='y',
-                    showarrow=True, xanchor='center', text='-%.2f' % deal_profit,
-                    font=dict(color="red"), arrowcolor="red",
-                    arrowhead=1, hovertext=str(deal_profit)
-                )
-            )
-            self.stop_loss_deals += 1
-            self.loss += abs(deal_profit)
-            self.drawdown += abs(deal_profit)
+        # от пика до дна по закрытым сделкам
+        return report(trades_to_array(self.backtest.trades))['max_drawdown']
 
-    def _add_deal_to_chart(self, deal, date):
-        # наносим на график
+    def _add_trade_to_chart(self, trade):
+        # наносим на график вход, stop loss и take profit
+        date = datetime.fromtimestamp(trade['entry_ts']).strftime('%Y-%m-%d %H:%M:%S.%f')
         self.annotations.append(
             dict(
                 x=date, y=1, xref='x', yref='paper',
-                showarrow=True, xanchor='left', text=str(deal)
+                showarrow=True, xanchor='left',
+                text='%s %s @ %s' % (trade['side'], trade['amount'], trade['entry_price'])
             )
         )
-        # рисуем stop loss и take profit
         self.annotations.append(
             dict(
-                x=date, y=deal.stop_loss, xref='x', yref='y',
+                x=date, y=trade['stop_loss'], xref='x', yref='y',
                 showarrow=True, xanchor='center', text='sl',
                 font=dict(color="red"), arrowcolor="red",
-                arrowhead=2, hovertext=str(deal.stop_loss)
+                arrowhead=2, hovertext=str(trade['stop_loss'])
             )
         )
         self.annotations.append(
             dict(
-                x=date, y=deal.take_profit, xref='x', yref='y',
+                x=date, y=trade['take_profit'], xref='x', yref='y',
                 showarrow=True, xanchor='center', text='tp',
                 font=dict(color="green"), arrowcolor="green",
-                arrowhead=2, hovertext=str(deal.take_profit)
+                arrowhead=2, hovertext=str(trade['take_profit'])
+            )
+        )
+
+        # и выход с результатом
+        profit = trade['profit']
+        color = "green" if profit >= 0 else "red"
+        self.annotations.append(
+            dict(
+                x=datetime.fromtimestamp(trade['exit_ts']).strftime('%Y-%m-%d %H:%M:%S.%f'),
+                y=trade['exit_price'], xref='x', yref='y',
+                showarrow=True, xanchor='center', text='%+.2f' % profit,
+                font=dict(color=color, size=16) if profit >= 0 else dict(color=color), arrowcolor=color,
+                arrowhead=1, hovertext=str(profit)
             )
         )
 
     async def do(self):
         try:
-            filename = 'history_%s' % symbol.replace('/', '_')
+            filename = 'data/history_eur_nzd.json'
             if update_file:
                 r = await api.get_ohlcv(symbol, time_interval, size=5000)
-                data = await r.json()
-
-                with open('data/history_eur_nzd.json', 'w+') as output_file:
-                    json.dump(data, output_file)
+                data = merge_history(filename, await r.json())
             else:
-                with open("data/history_eur_nzd.json", 'r') as json_file:
+                with open(filename, 'r') as json_file:
                     data = json.load(json_file)
 
-            data = data[:max_candles]
+            if max_candles:
+                data = data[:max_candles]
             historical_data = HistoricalData(time_interval, data)
 
-            # инициируем бота которого будем тестировать
-            bot = bot_class(
-                money_manager=money_manager,
-                historical_ohlcv=[],
-                **bot_params
-            )
-
-            fig = historical_data.get_plotly_figure()
-            open_deal = None
-
-            for candle in historical_data.get_list():
-                price = candle.close
-                dt = candle.formatted_date
-
-                # проверяем открытую сделку
-                if open_deal:
-                    profit = open_deal.check(candle)
-                    if profit is not None:
-                        # закрываем сделку и наносим на график
-                        open_deal = None
-                        self._handle_deal_profit(profit, dt, price)
-
-                # добавляем свечку к историческим данным
-                bot.add_candle(candle)
-
-                # проверяем есть ли сигнал на сделку
-                possible_deal = await bot.check_price(price)
-                # есть сделка
-                if possible_deal:
-                    # если уже есть открытая сделка
-                    if open_deal:
-                        # если новая сделка в другую сторону
-                        if open_deal.side != possible_deal.side:
-                            # то закрываем старую сделку и открываем новую
-                            profit = open_deal.close(price)
-                            if profit is not None:
-                                # закрываем сделку и наносим на график
-                                self._handle_deal_profit(profit, dt, price)
-
-                            open_deal = possible_deal
-                            self._add_deal_to_chart(open_deal, dt)
-                        else:
-                            # сделка в ту же сторону что и уже открытая
-                            # @TODO возможно есть смысл переоткрыть сделку
-                            pass
-                    else:
-                        open_deal = possible_deal
-                        self._add_deal_to_chart(open_deal, dt)
-
-            fig.update_layout(annotations=self.annotations)
-            if show_plot:
+            # тот же конфиг по тем же свечам не пересчитывается, новые свечи - от последнего чекпоинта,
+            # так что смена только настроек графика ничего не считает заново
+            if use_cache:
+                self.backtest = await run_cached(config, historical_data.get_list(), store=CheckpointStore())
+                print('candles from cache: %d/%d' % (self.backtest.resumed_from, len(data)))
+            else:
+                self.backtest = await CandleBacktest(config.make_bot()).run(historical_data.get_list())
+            backtest = self.backtest
+
+            if chart_file:
+                export_chart(chart_file, historical_data, backtest.trades)
+            elif show_plot:
+                for trade in backtest.trades:
+                    self._add_trade_to_chart(trade)
+                fig = historical_data.get_plotly_figure()
+                fig.update_layout(annotations=self.annotations)
                 fig.show()
 
             print("""
             take_profit_deals: {take_profit_deals}
             stop_loss_deals: {stop_loss_deals}
-            profit_factor: {profit_factor}
+            profit_factor: {profit_factor:.2f}
             profit: {profit:.2f}
             loss: {loss:.2f}
             total profit: {total_profit:.2f}$
             max_drawdown: {max_drawdown:.2f}
             """.format(
-                take_profit_deals=self.take_profit_deals,
-                stop_loss_deals=self.stop_loss_deals,
-                profit_factor=self.get_profit_factor(),
-                profit=self.profit,
-                loss=self.loss,
-                total_profit=self.get_total_profit(),
+                take_profit_deals=backtest.take_profit_deals,
+                stop_loss_deals=backtest.stop_loss_deals,
+                profit_factor=backtest.get_profit_factor(),
+                profit=backtest.profit,
+                loss=backtest.loss,
+                total_profit=backtest.get_total_profit(),
                 max_drawdown=self.get_max_drawdown(),
             ))
+            stats = report(trades_to_array(backtest.trades), candles_to_array(historical_data.ohlc_data))
+            print(format_report(stats))
         finally:
             await api.close()
 
@@ -0,0 +1,77 @@
+"""
+Сверка декларативной стратегии с ботом-классом на истории:
+сигналы по каждой свече у бота-класса, потокового StrategyBot и пакетного precompute,
+плюс время каждого прогона
+"""
+import asyncio
+import json
+import time
+
+from bots.base import CloseOpenedDeal, Signal
+from bots.stock_sma_bot.bot import StockSmaBot
+from bots.strategy_bot import StrategyBot
+from bots.strategy_bot.specs import STOCK_SMA_BOT
+from bots.stupid_bot.money_manager import SimpleMoneyManager
+from exante_api import HistoricalData
+
+symbol = 'URA.ARCA'
+time_interval = 300
+money_manager = SimpleMoneyManager(
+    order_amount=100,
+    diff=0.2,
+    stop_loss_factor=2,
+    take_profit_factor=8,
+)
+bot_params = {
+    "trend_len": 2,
+    "is_short_allowed": False,
+    "only_main_session": True
+}
+max_candles = 5000
+bot_class = StockSmaBot
+spec = STOCK_SMA_BOT
+
+
+async def get_signals(bot, candles):
+    signals = []
+    for candle in candles:
+        bot.add_candle(candle)
+        try:
+            deal = await bot.check_price(candle.close)
+            signals.append(deal.side if deal else None)
+        except CloseOpenedDeal:
+            signals.append(Signal.CLOSE.value)
+    return signals
+
+
+async def timed(name, coro):
+    started = time.perf_counter()
+    result = await coro
+    print('%s: %.3f s' % (name, time.perf_counter() - started))
+    return result
+
+
+async def main():
+    with open('history_%s' % symbol.replace('/', '_'), 'r') as json_file:
+        data = json.load(json_file)
+    candles = HistoricalData(time_interval, data[:max_candles]).get_list()
+
+    expected = await timed(bot_class.name, get_signals(bot_class(money_manager, [], **bot_params), candles))
+    streaming = await timed('strategy streaming', get_signals(
+        StrategyBot(money_manager, [], spec=spec, **bot_params), candles))
+
+    bot = StrategyBot(money_manager, [], spec=spec, **bot_params)
+    started = time.perf_counter()
+    bot.precompute(candles)
+    print('strategy precompute: %.3f s' % (time.perf_counter() - started))
+    vectorized = await timed('strategy vectorized', get_signals(bot, candles))
+
+    for name, signals in (('streaming', streaming), ('vectorized', vectorized)):
+        diff = [i for i, (a, b) in enumerate(zip(expected, signals)) if a != b]
+        print('%s: %d signals, %d differ' % (name, sum(1 for s in signals if s), len(diff)))
+        for i in diff[:10]:
+            print('  %s %s != %s' % (candles[i].formatted_date, signals[i], expected[i]))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,10 +1,11 @@
 import asyncio
 import json
-from decimal import Decimal
 
 import settings
 from bots.stupid_bot import StupidBot
 from bots.stupid_bot.money_manager import SimpleMoneyManager
+from backtest.chart import export_chart
+from backtest.metrics import TradeLog, candles_to_array, report, format_report
 from exante_api import ExanteApi, HistoricalData
 
 account = settings.ACCOUNTS['demo_1']
@@ -12,6 +13,8 @@ account = settings.ACCOUNTS['demo_1']
 api = ExanteApi(**account)
 symbol = 'BTC.USD'
 time_interval = 300
+# html/png вместо fig.show(): прореженные свечи и сделки одним трейсом, без браузера
+chart_file = None  # 'chart_%s.html' % symbol.replace('/', '_')
 
 
 class Tester:
@@ -19,21 +22,26 @@ class Tester:
         self.annotations = []
         self.take_profit_deals = 0
         self.stop_loss_deals = 0
-        self.profit = Decimal(0)
-        self.loss = Decimal(0)
-        self.drawdown = Decimal(0)
-        self.all_drawdowns = []
+        self.profit = 0.0
+        self.loss = 0.0
+        self.trade_log = TradeLog()
 
     def get_profit_factor(self):
-        return '%.2f' % float(self.profit / self.loss) if self.loss else 0
+        return float(self.profit / self.loss) if self.loss else 0
 
     def get_total_profit(self):
         return self.profit - self.loss
 
     def get_max_drawdown(self):
-        return max(self.all_drawdowns) if self.all_drawdowns else 0
+        # от пика до дна по закрытым сделкам
+        return report(self.trade_log.to_array())['max_drawdown']
 
-    def _handle_deal_profit(self, deal_profit, date, price):
+    def _handle_new_deal(self, deal, date, ts):
+        self.trade_log.open(deal, ts)
+        self._add_deal_to_chart(deal, date)
+
+    def _handle_deal_profit(self, deal_profit, date, price, ts):
+        self.trade_log.close(deal_profit, ts, price)
         if deal_profit >= 0:
             self.annotations.append(
                 dict(
@@ -45,8 +53,6 @@ class Tester:
             )
             self.take_profit_deals += 1
             self.profit += deal_profit
-            self.all_drawdowns.append(self.drawdown)
-            self.drawdown = Decimal(0)
         else:
             self.annotations.append(
                 dict(
@@ -58,7 +64,6 @@ class Tester:
             )
             self.stop_loss_deals += 1
             self.loss += abs(deal_profit)
-            self.drawdown += abs(deal_profit)
 
     def _add_deal_to_chart(self, deal, date):
         # наносим на график
@@ -110,7 +115,7 @@ class Tester:
             bot = StupidBot(
                 money_manager=SimpleMoneyManager(
                     order_amount=0.45,
-                    diff=Decimal(100),
+                    diff=100,
                     stop_loss_factor=2.0,
                     take_profit_factor=7,
                     trailing_stop=False
@@ -119,7 +124,9 @@ class Tester:
                 **params
             )
 
-            fig = historical_data.get_plotly_figure()
+            # сигналы по всем свечам сразу, на свече - только поиск в словаре
+            bot.precompute(historical_data.get_list())
+
             open_deal = None
 
             for candle in historical_data.get_list():
@@ -132,7 +139,7 @@ class Tester:
                     if profit is not None:
                         # закрываем сделку и наносим на график
                         open_deal = None
-                        self._handle_deal_profit(profit, dt, price)
+                        self._handle_deal_profit(profit, dt, price, candle.timestamp)
 
                 # добавляем свечку к историческим данным
                 bot.add_candle(candle)
@@ -149,24 +156,28 @@ class Tester:
                             profit = open_deal.close(price)
                             if profit is not None:
                                 # закрываем сделку и наносим на график
-                                self._handle_deal_profit(profit, dt, price)
+                                self._handle_deal_profit(profit, dt, price, candle.timestamp)
 
                             open_deal = possible_deal
-                            self._add_deal_to_chart(open_deal, dt)
+                            self._handle_new_deal(open_deal, dt, candle.timestamp)
                         else:
                             # сделка в ту же сторону что и уже открытая
                             # @TODO возможно есть смысл переоткрыть сделку
                             pass
                     else:
                         open_deal = possible_deal
-                        self._add_deal_to_chart(open_deal, dt)
-
-            fig.update_layout(annotations=self.annotations)
-            fig.show()
+                        self._handle_new_deal(open_deal, dt, candle.timestamp)
+
+            if chart_file:
+                export_chart(chart_file, historical_data, self.trade_log.trades)
+            else:
+                fig = historical_data.get_plotly_figure()
+                fig.update_layout(annotations=self.annotations)
+                fig.show()
             print("""
             take_profit_deals: {take_profit_deals}
             stop_loss_deals: {stop_loss_deals}
-            profit_factor: {profit_factor}
+            profit_factor: {profit_factor:.2f}
             profit: {profit:.2f}
             loss: {loss:.2f}
             total profit: {total_profit:.2f}$
@@ -180,6 +191,8 @@ class Tester:
                 total_profit=self.get_total_profit(),
                 max_drawdown=self.get_max_drawdown(),
             ))
+            stats = report(self.trade_log.to_array(), candles_to_array(historical_data.ohlc_data))
+            print(format_report(stats))
         finally:
             await api.close()
 
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import time
+
+from backtest.metrics import candles_to_array, format_report, report, trades_to_array
+from backtest.ticks import TickBacktest, load_ticks, save_ticks, ticks_from_journal
+from bots.stock_sma_bot.bot import StockSmaBot
+from bots.stupid_bot.money_manager import SimpleMoneyManager
+from exante_api import HistoricalData
+from exante_api.trailing import TrailingStops
+
+symbol = 'URA.ARCA'
+time_interval = 300
+money_manager = SimpleMoneyManager(
+    order_amount=100,
+    diff=0.2,
+    stop_loss_factor=2,
+    take_profit_factor=8,
+)
+bot_params = {
+    "trend_len": 2,
+    "is_short_allowed": False,
+    "only_main_session": True
+}
+bot_class = StockSmaBot
+slippage = 0.01
+# безубыток/трейлинг как в трейдере, None - стоп не двигаем
+trailing = TrailingStops(tick_size=0.01, breakeven_profit=100)
+# свечи до первого тика, чтобы у индикаторов была история
+history_file = 'history_%s' % symbol.replace('/', '_')
+ticks_file = 'ticks_%s.npy' % symbol.replace('/', '_')
+# если указан журнал трейдера, тики берем из него и сохраняем в ticks_file
+journal_file = None
+
+
+async def main():
+    if journal_file:
+        save_ticks(ticks_file, ticks_from_journal(journal_file))
+    ticks = load_ticks(ticks_file)
+
+    data = []
+    if os.path.exists(history_file):
+        with open(history_file, 'r') as json_file:
+            data = json.load(json_file)
+        # только свечи до первого тика, история от новых к старым
+        first_ts = int(ticks['ts'][0])
+        data = [row for row in data if row['timestamp'] < first_ts]
+
+    historical_data = HistoricalData(time_interval, data)
+    bot = bot_class(
+        money_manager=money_manager,
+        historical_ohlcv=historical_data.get_list(),
+        **bot_params
+    )
+
+    started = time.perf_counter()
+    tester = await TickBacktest(bot, historical_data, slippage=slippage, trailing=trailing).run(ticks)
+    elapsed = time.perf_counter() - started
+
+    print("""
+    ticks: {ticks} ({ticks_per_minute:.0f} ticks/min)
+    candles: {candles}
+    take_profit_deals: {take_profit_deals}
+    stop_loss_deals: {stop_loss_deals}
+    profit_factor: {profit_factor:.2f}
+    profit: {profit:.2f}
+    loss: {loss:.2f}
+    total profit: {total_profit:.2f}$
+    stop moves: {stop_moves}
+    """.format(
+        ticks=tester.ticks_count,
+        ticks_per_minute=tester.ticks_count / elapsed * 60 if elapsed else 0,
+        candles=tester.candles_count,
+        take_profit_deals=tester.take_profit_deals,
+        stop_loss_deals=tester.stop_loss_deals,
+        profit_factor=tester.get_profit_factor(),
+        profit=tester.profit,
+        loss=tester.loss,
+        total_profit=tester.get_total_profit(),
+        stop_moves=trailing.updates if trailing else 0,
+    ))
+    stats = report(trades_to_array(tester.trades), candles_to_array(historical_data.ohlc_data))
+    print(format_report(stats))
+    print('done')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
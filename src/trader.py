@@ -0,0 +1,367 @@
+"""
+Все трейдеры в одном процессе: инструменты, счета, боты и money manager - в settings/traders.json
+(или yaml, если установлен PyYAML), боты по имени из bots/registry.py.
+
+python trader.py [--config settings/traders.json] [--only rsi_bot,forex]
+
+Конфиг перечитывается, когда меняется файл (проверка раз в reload_interval секунд) или по SIGHUP:
+- параметры бота и money manager - бот пересобирается по уже загруженной истории,
+  стрим и история не трогаются;
+- breakeven_profit, tick_size, duration, reverse, main_session - применяются сразу;
+- symbol, account, time_interval, history_size - перезапуск только этого трейдера;
+- новые трейдеры запускаются, удаленные и enabled: false - останавливаются.
+Битый конфиг логируется, трейдеры продолжают работать со старым.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+
+from bots.base import CloseOpenedDeal
+from bots.registry import make_bot
+from exante_api import ExanteApi, Event, HistoricalData
+from exante_api.client import TooManyRequests, PositionAlreadyClosed, PositionNotFound
+from exante_api.journal import Journal, JournaledBot
+from exante_api.log import setup_logging, bind
+from exante_api.pnl import FxRates
+from exante_api.stream import candle_gap_filler
+from exante_api.trailing import TrailingStops
+from helpers import get_mid_price, send_admin_message
+
+import settings
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULTS = {
+    "enabled": True,
+    "time_interval": 300,
+    "history_size": 1000,
+    "currency": None,  # валюта инструмента, breakeven_profit - в валюте счета
+    "tick_size": 0.01,
+    "duration": None,  # duration ордеров, None - по умолчанию api
+    "main_session": False,  # закрытие по сигналу и безубыток только в основную сессию
+    "reverse": False,  # сделка в другую сторону закрывает открытую позицию
+    "breakeven_profit": None,
+}
+# без них трейдер не поменять на лету: другой стрим или другая история
+RESTART_KEYS = ('symbol', 'account', 'time_interval', 'history_size')
+
+parser = argparse.ArgumentParser(description='trader')
+parser.add_argument('--config', dest='config', action='store', default=settings.TRADERS_CONFIG)
+parser.add_argument('--only', dest='only', action='store', required=False,
+                    help='comma separated trader names from config')
+parser.add_argument('--reload-interval', dest='reload_interval', action='store', type=float, default=5)
+
+
+def load_config(path):
+    """
+    {имя трейдера: конфиг с дефолтами}
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError('PyYAML is not installed, use json config')
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    traders = {}
+    for name, config in data['traders'].items():
+        config = {**DEFAULTS, **config}
+        for key in ('symbol', 'account', 'bot'):
+            if key not in config:
+                raise ValueError('%s: %s is required' % (name, key))
+        config['name'] = name
+        traders[name] = config
+
+    # один журнал и одна позиция на инструмент счета
+    seen = {}
+    for name, config in traders.items():
+        if config['enabled']:
+            key = (config['account'], config['symbol'])
+            if key in seen:
+                raise ValueError('%s and %s trade %s on %s' % (seen[key], name, key[1], key[0]))
+            seen[key] = name
+    return traders
+
+
+def get_prefix(config):
+    return '#exante #%s #%s' % (config['symbol'], config['account'])
+
+
+def is_main_session(candle):
+    # 16:30 - 23:00
+    if not candle:
+        return False
+    hour, minute = candle.datetime.hour, candle.datetime.minute
+    return not (hour < 16 or (hour == 16 and minute < 30) or hour >= 23)
+
+
+class Processor:
+    def __init__(self, config, historical_data: HistoricalData, bot, api: ExanteApi, rates: FxRates = None):
+        self.config = config
+        self.symbol = config['symbol']
+        self.historical_data = historical_data
+        self.bot = bot
+        self.api = api
+        self.rates = rates
+        # PnL позиции считается локально по тикам и курсу из rates, REST - только чтобы сдвинуть стоп
+        self.trailing = TrailingStops(api, tick_size=config['tick_size'], breakeven_profit=config['breakeven_profit'],
+                                      rates=rates, currencies={self.symbol: config['currency']})
+
+    def reload(self, config):
+        """
+        Новые параметры без перезапуска стрима, бот пересобирается по текущей истории
+        """
+        if config['bot'] != self.config['bot']:
+            bot = make_bot(config['bot'], self.historical_data.get_list(), self.api, self.rates, config['currency'])
+            if isinstance(self.bot, JournaledBot):
+                # обертку держит и candle_gap_filler
+                old, self.bot.bot = self.bot.bot, bot
+                self.bot.name = bot.name
+            else:
+                old, self.bot = self.bot, bot
+            old.close()
+        self.trailing.breakeven_profit = config['breakeven_profit']
+        self.trailing.tick_size = float(config['tick_size'])
+        if config['currency']:
+            self.trailing.currencies[self.symbol] = config['currency']
+        self.config = config
+
+    def in_session(self):
+        return not self.config['main_session'] or is_main_session(self.bot.get_last_candle())
+
+    async def on_event(self, data):
+        e = Event(data)
+        if e.type != 'new_price':
+            return
+
+        # пришла новая цена
+        last_ts = self.historical_data.last_ts
+        # добавляем ее в исторические данные
+        self.historical_data.add_data(e.ts, e.bid, e.ask)
+
+        if last_ts and last_ts != self.historical_data.last_ts:
+            logging.info('свеча сформирована: %s', self.historical_data.get_last_candle().raw_data)
+            # начала формироваться новая цена
+            self.bot.add_candle(self.historical_data.get_last_candle())
+
+            price = get_mid_price(bid=e.bid, ask=e.ask)
+            try:
+                deal = await self.bot.check_price(price)
+                if deal:
+                    await self.open_deal(deal)
+            except CloseOpenedDeal:
+                logging.info('close signal')
+                if self.in_session():
+                    await self.close_position()
+
+        # безубыток по тикам
+        if self.in_session():
+            self.trailing.on_tick(self.symbol, e.bid, e.ask)
+
+    async def open_deal(self, deal):
+        logging.info('new deal: %s', deal)
+        try:
+            position = await self.api.get_position(self.symbol)
+        except (PositionAlreadyClosed, PositionNotFound):
+            position = None
+
+        if position and self.config['reverse']:
+            position_side = 'sell' if position.quantity < 0 else 'buy'
+            # закрываем позицию только если она открыта в противоположную сторону
+            if position_side != deal.side:
+                try:
+                    await self.api.close_position(self.symbol, position=position, duration=self.config['duration'])
+                except (PositionAlreadyClosed, PositionNotFound):
+                    # нечего закрывать, все ок
+                    pass
+                self.trailing.untrack(self.symbol)
+                # даем время позиции закрыться
+                await asyncio.sleep(0.5)
+                position = None
+
+        # открываем новую позицию
+        if not position:
+            orders = await self.api.open_position(
+                symbol=self.symbol,
+                side=deal.side,
+                quantity=deal.amount,
+                take_profit=deal.take_profit,
+                stop_loss=deal.stop_loss,
+                duration=self.config['duration'],
+                tick_size=self.config['tick_size'],
+            )
+            self.trailing.track_deal(self.symbol, deal, orders)
+
+            await send_admin_message("{symbol} new deal {side}: \namount={amount} \ntp={take_profit} \nsl={stop_loss}".format(
+                symbol=self.symbol,
+                side=deal.side,
+                amount=deal.amount,
+                take_profit=deal.take_profit,
+                stop_loss=deal.stop_loss,
+            ), prefix=get_prefix(self.config))
+
+    async def close_position(self):
+        try:
+            position = await self.api.get_position(self.symbol)
+        except (PositionAlreadyClosed, PositionNotFound):
+            position = None
+        if position:
+            await self.api.close_position(self.symbol, position=position, duration=self.config['duration'])
+            self.trailing.untrack(self.symbol)
+            # даем время позиции закрыться
+            await asyncio.sleep(0.5)
+            await send_admin_message('%s close position signal' % self.symbol, prefix=get_prefix(self.config))
+
+
+class Trader:
+    """
+    Один инструмент на одном счете: история, бот и стрим, переподключение при ошибках
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.name = config['name']
+        self.processor = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def update(self, config):
+        """
+        Новый конфиг трейдера, перезапуск - только если сменился стрим или история
+        """
+        restart = any(config[key] != self.config[key] for key in RESTART_KEYS)
+        self.config = config
+        if restart:
+            logging.info('%s: restart', self.name)
+            await self.stop()
+            self.start()
+        elif self.processor is not None:
+            self.processor.reload(config)
+            logging.info('%s: config reloaded', self.name)
+
+    async def run(self):
+        config = self.config
+        symbol, account_name, time_interval = config['symbol'], config['account'], config['time_interval']
+        prefix = get_prefix(config)
+        bind(trader=self.name, symbol=symbol, account=account_name, bot=config['bot']['class'])
+        # журнал стрима, запросов и решений бота, см. replay_journal.py
+        journal = Journal.for_trader(account_name, symbol)
+
+        try:
+            while True:
+                api = ExanteApi(**settings.ACCOUNTS[account_name], journal=journal)
+                bot = None
+
+                try:
+                    data = await api.get_ohlcv_arrays(symbol, time_interval, size=config['history_size'])
+                    historical_data = HistoricalData(time_interval, data)
+                    logging.info('исторические данные загружены: %d', len(data))
+
+                    # курсы валют для PnL и объема, дальше обновляются в фоне раз в ttl
+                    rates = FxRates(api)
+                    await rates.update()
+                    # инициируем бота которым будем торговать
+                    bot = make_bot(self.config['bot'], historical_data.get_list(), api, rates, config['currency'])
+                    # процессор будет обрабатывать все события из стрима
+                    self.processor = Processor(self.config, historical_data, bot=JournaledBot(bot, journal), api=api,
+                                               rates=rates)
+                    # позиция могла остаться с прошлого запуска
+                    await self.processor.trailing.restore(symbol)
+                    # открываем стрим и слушаем
+                    logging.info('открываем стрим')
+                    await api.quote_stream(symbol, self.processor.on_event, time_interval=time_interval,
+                                           on_gap=candle_gap_filler(historical_data, self.processor.bot))
+                except TooManyRequests:
+                    # иногда бросает get_ohlcv, надо просто подождать
+                    logging.error('TooManyRequests')
+                    await send_admin_message("TooManyRequests", prefix)
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.exception('неведомая хуйня:')
+                    await send_admin_message("неведомая хуйня: %s" % e, prefix)
+                    await asyncio.sleep(3)
+                finally:
+                    if self.processor is not None:
+                        self.processor.bot.close()
+                    elif bot is not None:
+                        bot.close()
+                    self.processor = None
+                    await api.close()
+        finally:
+            journal.close()
+
+
+class Runner:
+    def __init__(self, path, only=None, reload_interval=5):
+        self.path = path
+        self.only = only
+        self.reload_interval = reload_interval
+        self.traders = {}
+        self.mtime = None
+
+    async def run(self):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        except (NotImplementedError, AttributeError):
+            # windows
+            pass
+
+        await self.reload()
+        try:
+            while True:
+                await asyncio.sleep(self.reload_interval)
+                if os.path.getmtime(self.path) != self.mtime:
+                    await self.reload()
+        finally:
+            await asyncio.gather(*(trader.stop() for trader in self.traders.values()))
+
+    async def reload(self):
+        self.mtime = os.path.getmtime(self.path)
+        try:
+            configs = load_config(self.path)
+        except Exception:
+            logging.exception('config %s is broken, keep running with previous one', self.path)
+            return
+
+        configs = {
+            name: config for name, config in configs.items()
+            if config['enabled'] and (not self.only or name in self.only)
+        }
+
+        for name in list(self.traders):
+            if name not in configs:
+                logging.info('%s: stop', name)
+                await self.traders.pop(name).stop()
+
+        for name, config in configs.items():
+            trader = self.traders.get(name)
+            if trader is None:
+                logging.info('%s: start %s %s', name, config['symbol'], config['account'])
+                trader = self.traders[name] = Trader(config)
+                trader.start()
+            elif config != trader.config:
+                await trader.update(config)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+    runner = Runner(args.config, only=args.only and args.only.split(','), reload_interval=args.reload_interval)
+    asyncio.run(runner.run())